@@ -56,12 +56,39 @@ IGDB_CLIENT_ID: Final = os.environ.get(
 IGDB_CLIENT_SECRET: Final = os.environ.get(
     "IGDB_CLIENT_SECRET", os.environ.get("CLIENT_SECRET", "")
 )
+IGDB_RATE_LIMIT: Final = float(
+    os.environ.get("IGDB_RATE_LIMIT", 4)  # Requests per second
+)
 
 # STEAMGRIDDB
 STEAMGRIDDB_API_KEY: Final = os.environ.get("STEAMGRIDDB_API_KEY", "")
 
 # MOBYGAMES
 MOBYGAMES_API_KEY: Final = os.environ.get("MOBYGAMES_API_KEY", "")
+MOBYGAMES_RATE_LIMIT: Final = float(
+    os.environ.get("MOBYGAMES_RATE_LIMIT", 1)  # Requests per second
+)
+
+# METADATA
+METADATA_CACHE_ENABLED: Final = str_to_bool(
+    os.environ.get("METADATA_CACHE_ENABLED", "true")
+)
+METADATA_CACHE_MAX_ENTRY_SIZE: Final = int(
+    os.environ.get("METADATA_CACHE_MAX_ENTRY_SIZE", 512 * 1024)  # In bytes
+)
+METADATA_CACHE_MAX_SIZE: Final = int(
+    os.environ.get("METADATA_CACHE_MAX_SIZE", 64 * 1024 * 1024)  # In bytes
+)
+METADATA_MISS_BACKOFF_BASE: Final = int(
+    os.environ.get("METADATA_MISS_BACKOFF_BASE", 60 * 60 * 24)  # 1 day
+)
+METADATA_MISS_BACKOFF_MAX: Final = int(
+    os.environ.get("METADATA_MISS_BACKOFF_MAX", 60 * 60 * 24 * 30)  # 30 days
+)
+# Similarity above which a title is matched locally, above 1 to always search
+METADATA_LOCAL_MATCH_THRESHOLD: Final = float(
+    os.environ.get("METADATA_LOCAL_MATCH_THRESHOLD", 0.9)
+)
 
 # AUTH
 ROMM_AUTH_SECRET_KEY: Final = os.environ.get(
@@ -86,6 +113,41 @@ OIDC_TLS_CACERTFILE: Final = os.environ.get("OIDC_TLS_CACERTFILE", None)
 
 # SCANS
 SCAN_TIMEOUT: Final = int(os.environ.get("SCAN_TIMEOUT", 60 * 60 * 4))  # 4 hours
+SCAN_HASHING_WORKERS: Final = int(
+    os.environ.get("SCAN_HASHING_WORKERS", os.cpu_count() or 1)
+)
+SCAN_HASHING_WORKER_MAX_MEMORY: Final = int(
+    os.environ.get("SCAN_HASHING_WORKER_MAX_MEMORY", 0)  # In MB, 0 means unlimited
+)
+SCAN_FAST_IDENTIFY: Final = str_to_bool(
+    os.environ.get("SCAN_FAST_IDENTIFY", "false")  # Defer md5/sha1 of zip and 7z roms
+)
+SCAN_DISC_FINGERPRINTS: Final = str_to_bool(
+    os.environ.get("SCAN_DISC_FINGERPRINTS", "true")  # Don't rehash touched disc images
+)
+SCAN_ROM_HEADERS: Final = str_to_bool(
+    os.environ.get("SCAN_ROM_HEADERS", "true")  # Read serials from rom headers
+)
+SCAN_ARCHIVE_BACKEND: Final = os.environ.get(
+    "SCAN_ARCHIVE_BACKEND", "python"  # python, 7z or libarchive
+)
+SCAN_ROMS_CONCURRENCY: Final = max(
+    int(os.environ.get("SCAN_ROMS_CONCURRENCY", 10)), 1  # Roms identified at once
+)
+SCAN_ARTWORK_CONCURRENCY: Final = max(
+    int(os.environ.get("SCAN_ARTWORK_CONCURRENCY", 16)), 1  # Artwork downloads at once
+)
+SCAN_ARTWORK_CONCURRENCY_PER_HOST: Final = max(
+    int(os.environ.get("SCAN_ARTWORK_CONCURRENCY_PER_HOST", 6)), 1
+)
+
+# IMAGES
+IMAGE_PROCESSING_WORKERS: Final = max(
+    int(os.environ.get("IMAGE_PROCESSING_WORKERS", 2)), 1
+)
+IMAGE_PROCESSING_MAX_PENDING: Final = max(
+    int(os.environ.get("IMAGE_PROCESSING_MAX_PENDING", 32)), 1  # Queued and running
+)
 
 # TASKS
 ENABLE_RESCAN_ON_FILESYSTEM_CHANGE: Final = str_to_bool(
@@ -1,8 +1,6 @@
 import json
-from io import BytesIO
 from shutil import rmtree
 
-from anyio import Path
 from config import RESOURCES_BASE_PATH
 from decorators.auth import protected_route
 from endpoints.responses import MessageResponse
@@ -14,12 +12,12 @@ from exceptions.endpoint_exceptions import (
 )
 from fastapi import Request, UploadFile
 from handler.auth.constants import Scope
-from handler.database import db_collection_handler
+from handler.database import db_collection_handler, db_resource_handler
 from handler.filesystem import fs_resource_handler
 from handler.filesystem.base_handler import CoverSize
+from handler.image_handler import image_handler
 from logger.logger import log
 from models.collection import Collection
-from PIL import Image
 from sqlalchemy.inspection import inspect
 from utils.router import APIRouter
 
@@ -65,14 +63,11 @@ async def add_collection(
             artwork_path,
         ) = await fs_resource_handler.build_artwork_path(_added_collection, file_ext)
 
-        artwork_content = BytesIO(await artwork.read())
-        file_location_small = Path(f"{artwork_path}/small.{file_ext}")
-        file_location_large = Path(f"{artwork_path}/big.{file_ext}")
-        with Image.open(artwork_content) as img:
-            img.save(file_location_large)
-            fs_resource_handler.resize_cover_to_small(
-                img, save_path=file_location_small
-            )
+        await image_handler.store_artwork(
+            await artwork.read(),
+            cover_path=f"{artwork_path}/big.{file_ext}",
+            small_cover_path=f"{artwork_path}/small.{file_ext}",
+        )
     else:
         path_cover_s, path_cover_l = await fs_resource_handler.get_cover(
             overwrite=True,
@@ -185,14 +180,11 @@ async def update_collection(
             cleaned_data["path_cover_l"] = path_cover_l
             cleaned_data["path_cover_s"] = path_cover_s
 
-            artwork_content = BytesIO(await artwork.read())
-            file_location_small = Path(f"{artwork_path}/small.{file_ext}")
-            file_location_large = Path(f"{artwork_path}/big.{file_ext}")
-            with Image.open(artwork_content) as img:
-                img.save(file_location_large)
-                fs_resource_handler.resize_cover_to_small(
-                    img, save_path=file_location_small
-                )
+            await image_handler.store_artwork(
+                await artwork.read(),
+                cover_path=f"{artwork_path}/big.{file_ext}",
+                small_cover_path=f"{artwork_path}/small.{file_ext}",
+            )
 
             cleaned_data.update({"url_cover": ""})
         else:
@@ -211,7 +203,16 @@ async def update_collection(
                     {"path_cover_s": path_cover_s, "path_cover_l": path_cover_l}
                 )
 
-    return db_collection_handler.update_collection(id, cleaned_data)
+    updated_collection = db_collection_handler.update_collection(id, cleaned_data)
+
+    # Remove the store resources the collection no longer references
+    fs_resource_handler.remove_resources(
+        db_resource_handler.get_unreferenced_resources(
+            fs_resource_handler.get_stored_resources(collection)
+        )
+    )
+
+    return updated_collection
 
 
 @protected_route(router.delete, "/collections/{id}", [Scope.COLLECTIONS_WRITE])
@@ -243,5 +244,10 @@ async def delete_collections(request: Request, id: int) -> MessageResponse:
         rmtree(f"{RESOURCES_BASE_PATH}/{collection.fs_resources_path}")
     except FileNotFoundError:
         log.error(f"Couldn't find resources to delete for {collection.name}")
+    fs_resource_handler.remove_resources(
+        db_resource_handler.get_unreferenced_resources(
+            fs_resource_handler.get_stored_resources(collection)
+        )
+    )
 
     return {"msg": f"{collection.name} deleted successfully!"}
@@ -6,7 +6,8 @@ from fastapi import File, HTTPException, Request, UploadFile, status
 from fastapi.responses import FileResponse
 from handler.auth.constants import Scope
 from handler.database import db_firmware_handler, db_platform_handler
-from handler.filesystem import fs_firmware_handler
+from handler.filesystem import fs_firmware_handler, fs_hash_cache_handler
+from handler.filesystem.hash_cache_handler import FIRMWARE_HASHES_CACHE_KEY
 from handler.scan_handler import scan_firmware
 from logger.logger import log
 from utils.router import APIRouter
@@ -204,6 +205,10 @@ async def delete_firmware(
                 fs_firmware_handler.remove_file(
                     file_name=firmware.file_name, file_path=firmware.file_path
                 )
+                fs_hash_cache_handler.invalidate(
+                    FIRMWARE_HASHES_CACHE_KEY,
+                    [f"{LIBRARY_BASE_PATH}/{firmware.full_path}"],
+                )
             except FileNotFoundError as exc:
                 error = f"Firmware file {firmware.file_name} not found for platform {firmware.platform_slug}"
                 log.error(error)
@@ -7,8 +7,8 @@ from exceptions.endpoint_exceptions import PlatformNotFoundInDatabaseException
 from exceptions.fs_exceptions import PlatformAlreadyExistsException
 from fastapi import Request
 from handler.auth.constants import Scope
-from handler.database import db_platform_handler
-from handler.filesystem import fs_platform_handler
+from handler.database import db_platform_handler, db_resource_handler
+from handler.filesystem import fs_platform_handler, fs_resource_handler
 from handler.metadata.igdb_handler import IGDB_PLATFORM_LIST
 from handler.scan_handler import scan_platform
 from logger.logger import log
@@ -158,6 +158,19 @@ async def delete_platforms(request: Request, id: int) -> MessageResponse:
         raise PlatformNotFoundInDatabaseException(id)
 
     log.info(f"Deleting {platform.name} [{platform.fs_slug}] from database")
-    db_platform_handler.delete_platform(id)
+    deleted_platform = db_platform_handler.delete_platform(id)
+
+    # Remove the store resources only the roms of the platform referenced
+    if deleted_platform:
+        fs_resource_handler.remove_resources(
+            db_resource_handler.get_unreferenced_resources(
+                set().union(
+                    *(
+                        fs_resource_handler.get_stored_resources(r)
+                        for r in deleted_platform.roms
+                    )
+                )
+            )
+        )
 
     return {"msg": f"{platform.name} - [{platform.fs_slug}] deleted successfully!"}
@@ -1,7 +1,6 @@
 import binascii
 from base64 import b64encode
 from datetime import datetime, timezone
-from io import BytesIO
 from shutil import rmtree
 from typing import Annotated
 from urllib.parse import quote
@@ -21,13 +20,23 @@ from exceptions.fs_exceptions import RomAlreadyExistsException
 from fastapi import HTTPException, Query, Request, UploadFile, status
 from fastapi.responses import Response
 from handler.auth.constants import Scope
-from handler.database import db_collection_handler, db_platform_handler, db_rom_handler
-from handler.filesystem import fs_resource_handler, fs_rom_handler
+from handler.database import (
+    db_collection_handler,
+    db_platform_handler,
+    db_resource_handler,
+    db_rom_handler,
+)
+from handler.filesystem import (
+    fs_hash_cache_handler,
+    fs_resource_handler,
+    fs_rom_handler,
+)
 from handler.filesystem.base_handler import CoverSize
+from handler.filesystem.hash_cache_handler import ROM_HASHES_CACHE_KEY
+from handler.image_handler import image_handler
 from handler.metadata import meta_igdb_handler, meta_moby_handler
 from logger.logger import log
 from models.rom import Rom, RomUser
-from PIL import Image
 from starlette.requests import ClientDisconnect
 from starlette.responses import FileResponse
 from streaming_form_data import StreamingFormDataParser
@@ -384,6 +393,21 @@ async def update_rom(
             },
         )
 
+        # Let the next scans search the rom again
+        await meta_igdb_handler.miss_cache.clear_file(
+            rom.platform.igdb_id, rom.file_name
+        )
+        await meta_moby_handler.miss_cache.clear_file(
+            rom.platform.moby_id, rom.file_name
+        )
+
+        # Remove the store resources the rom no longer references
+        fs_resource_handler.remove_resources(
+            db_resource_handler.get_unreferenced_resources(
+                fs_resource_handler.get_stored_resources(rom)
+            )
+        )
+
         return DetailedRomSchema.from_orm_with_request(
             db_rom_handler.get_rom(id), request
         )
@@ -451,6 +475,13 @@ async def update_rom(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=exc
         ) from exc
 
+    if new_file_name != rom.file_name:
+        fs_hash_cache_handler.move(
+            ROM_HASHES_CACHE_KEY,
+            f"{LIBRARY_BASE_PATH}/{rom.file_path}/{rom.file_name}",
+            f"{LIBRARY_BASE_PATH}/{rom.file_path}/{new_file_name}",
+        )
+
     cleaned_data.update(
         {
             "file_name": new_file_name,
@@ -479,14 +510,11 @@ async def update_rom(
                 {"path_cover_s": path_cover_s, "path_cover_l": path_cover_l}
             )
 
-            artwork_content = BytesIO(await artwork.read())
-            file_location_small = Path(f"{artwork_path}/small.{file_ext}")
-            file_location_large = Path(f"{artwork_path}/big.{file_ext}")
-            with Image.open(artwork_content) as img:
-                img.save(file_location_large)
-                fs_resource_handler.resize_cover_to_small(
-                    img, save_path=file_location_small
-                )
+            await image_handler.store_artwork(
+                await artwork.read(),
+                cover_path=f"{artwork_path}/big.{file_ext}",
+                small_cover_path=f"{artwork_path}/small.{file_ext}",
+            )
 
             cleaned_data.update({"url_cover": ""})
         else:
@@ -505,6 +533,17 @@ async def update_rom(
 
     db_rom_handler.update_rom(id, cleaned_data)
 
+    # Rematched or renamed roms are searched again by the next scans
+    await meta_igdb_handler.miss_cache.clear_file(rom.platform.igdb_id, rom.file_name)
+    await meta_moby_handler.miss_cache.clear_file(rom.platform.moby_id, rom.file_name)
+
+    # Remove the store resources the rom no longer references
+    fs_resource_handler.remove_resources(
+        db_resource_handler.get_unreferenced_resources(
+            fs_resource_handler.get_stored_resources(rom)
+        )
+    )
+
     return DetailedRomSchema.from_orm_with_request(db_rom_handler.get_rom(id), request)
 
 
@@ -550,6 +589,11 @@ async def delete_roms(
             rmtree(f"{RESOURCES_BASE_PATH}/{rom.fs_resources_path}")
         except FileNotFoundError:
             log.error(f"Couldn't find resources to delete for {rom.name}")
+        fs_resource_handler.remove_resources(
+            db_resource_handler.get_unreferenced_resources(
+                fs_resource_handler.get_stored_resources(rom)
+            )
+        )
 
         if id in delete_from_fs:
             log.info(f"Deleting {rom.file_name} from filesystem")
@@ -557,6 +601,9 @@ async def delete_roms(
                 fs_rom_handler.remove_file(
                     file_name=rom.file_name, file_path=rom.file_path
                 )
+                fs_hash_cache_handler.invalidate(
+                    ROM_HASHES_CACHE_KEY, [f"{LIBRARY_BASE_PATH}/{rom.full_path}"]
+                )
             except FileNotFoundError as exc:
                 error = f"Rom file {rom.file_name} not found for platform {rom.platform_slug}"
                 log.error(error)
@@ -1,12 +1,21 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+import asyncio
+from collections import defaultdict
+from dataclasses import asdict, dataclass
 from itertools import batched
 from typing import Any, Final
+from uuid import uuid4
 
 import emoji
 import socketio  # type: ignore
-from config import REDIS_URL, SCAN_TIMEOUT
+from config import (
+    LIBRARY_BASE_PATH,
+    REDIS_URL,
+    SCAN_FAST_IDENTIFY,
+    SCAN_ROMS_CONCURRENCY,
+    SCAN_TIMEOUT,
+)
 from endpoints.responses.platform import PlatformSchema
 from endpoints.responses.rom import SimpleRomSchema
 from exceptions.fs_exceptions import (
@@ -15,28 +24,65 @@ from exceptions.fs_exceptions import (
     RomsNotFoundException,
 )
 from exceptions.socket_exceptions import ScanStoppedException
-from handler.database import db_firmware_handler, db_platform_handler, db_rom_handler
+from handler.database import (
+    db_firmware_handler,
+    db_platform_handler,
+    db_resource_handler,
+    db_rom_handler,
+)
 from handler.filesystem import (
     fs_firmware_handler,
+    fs_hash_cache_handler,
     fs_platform_handler,
     fs_resource_handler,
     fs_rom_handler,
 )
+from handler.filesystem.hash_cache_handler import (
+    FIRMWARE_HASHES_CACHE_KEY,
+    ROM_HASHES_CACHE_KEY,
+)
 from handler.filesystem.roms_handler import FSRom
-from handler.redis_handler import high_prio_queue, redis_client
-from handler.scan_handler import ScanType, scan_firmware, scan_platform, scan_rom
+from handler.metadata import meta_dat_handler, meta_igdb_handler, meta_moby_handler
+from handler.metadata.igdb_multiquery import ctx_igdb_multiquery
+from handler.metadata.miss_cache import ctx_metadata_skip_known_misses
+from handler.metadata.response_cache import ctx_metadata_cache_bypass
+from handler.redis_handler import high_prio_queue, low_prio_queue, redis_client
+from handler.scan_handler import (
+    ScanType,
+    get_firmware_hashes,
+    get_rom_files_delta,
+    get_rom_hashes,
+    scan_firmware,
+    scan_platform,
+    scan_rom,
+    should_hash_rom,
+)
 from handler.socket_handler import socket_handler
 from logger.formatter import LIGHTYELLOW
 from logger.formatter import highlight as hl
 from logger.logger import log
 from models.platform import Platform
 from models.rom import Rom
-from rq import Worker
-from rq.job import Job
-from sqlalchemy.inspection import inspect
-from utils.context import initialize_context
+from rq import Worker, get_current_job
+from rq.exceptions import NoSuchJobError
+from rq.job import Dependency, Job, JobStatus
+from utils.context import initialize_context, set_context_var
 
 STOP_SCAN_FLAG: Final = "scan:stop"
+SCAN_STATS_KEY: Final = "scan:stats"
+# Id of the last job queued to scan each platform
+SCAN_PLATFORM_JOB_KEY: Final = "scan:platform_job"
+SCAN_JOB_FUNC_NAMES: Final = {
+    "endpoints.sockets.scan.scan_platforms",
+    "endpoints.sockets.scan.scan_platform_job",
+    "endpoints.sockets.scan.finish_scan_platforms",
+}
+SCAN_JOB_PENDING_STATUSES: Final = {
+    JobStatus.QUEUED,
+    JobStatus.DEFERRED,
+    JobStatus.SCHEDULED,
+    JobStatus.STARTED,
+}
 
 
 @dataclass
@@ -49,6 +95,11 @@ class ScanStats:
     metadata_roms: int = 0
     scanned_firmware: int = 0
     added_firmware: int = 0
+    # Changes found by delta scans
+    delta_new_roms: int = 0
+    delta_changed_roms: int = 0
+    delta_unchanged_roms: int = 0
+    delta_removed_roms: int = 0
 
     def __add__(self, other: Any) -> ScanStats:
         if not isinstance(other, ScanStats):
@@ -62,6 +113,10 @@ class ScanStats:
             metadata_roms=self.metadata_roms + other.metadata_roms,
             scanned_firmware=self.scanned_firmware + other.scanned_firmware,
             added_firmware=self.added_firmware + other.added_firmware,
+            delta_new_roms=self.delta_new_roms + other.delta_new_roms,
+            delta_changed_roms=self.delta_changed_roms + other.delta_changed_roms,
+            delta_unchanged_roms=self.delta_unchanged_roms + other.delta_unchanged_roms,
+            delta_removed_roms=self.delta_removed_roms + other.delta_removed_roms,
         )
 
 
@@ -70,13 +125,28 @@ def _get_socket_manager() -> socketio.AsyncRedisManager:
     return socketio.AsyncRedisManager(str(REDIS_URL), write_only=True)
 
 
-def _should_scan_rom(scan_type: ScanType, rom: Rom | None, roms_ids: list[str]) -> bool:
+def _is_scan_stopped(scan_id: str) -> bool:
+    return bool(redis_client.exists(f"{STOP_SCAN_FLAG}:{scan_id}"))
+
+
+def _stop_scans(scan_ids: set[str]) -> None:
+    # Flags expire with the scan, so a scan that never finishes can't stop later ones
+    with redis_client.pipeline() as pipe:
+        for scan_id in scan_ids:
+            pipe.set(f"{STOP_SCAN_FLAG}:{scan_id}", 1, ex=SCAN_TIMEOUT)
+        pipe.execute()
+
+
+def _should_scan_rom(
+    scan_type: ScanType, rom: Rom | None, fs_rom: FSRom, roms_ids: list[str]
+) -> bool:
     """Decide if a rom should be scanned or not
 
     Args:
         scan_type (str): Type of scan to be performed.
+        rom (Rom, optional): Rom stored in the database, if any.
+        fs_rom (FSRom): Rom found in the filesystem.
         roms_ids (list[str], optional): List of selected roms to be scanned.
-        metadata_sources (list[str], optional): List of metadata sources to be used
     """
 
     # This logic is tricky so only touch it if you know what you're doing"""
@@ -84,6 +154,10 @@ def _should_scan_rom(scan_type: ScanType, rom: Rom | None, roms_ids: list[str])
         (scan_type in {ScanType.NEW_PLATFORMS, ScanType.QUICK} and not rom)
         or (scan_type == ScanType.COMPLETE)
         or (scan_type == ScanType.HASHES)
+        or (
+            scan_type == ScanType.DELTA
+            and (not rom or get_rom_files_delta(rom.files, fs_rom["files"]))
+        )
         or (
             rom
             and (
@@ -107,14 +181,16 @@ async def scan_platforms(
     scan_type: ScanType = ScanType.QUICK,
     roms_ids: list[str] | None = None,
     metadata_sources: list[str] | None = None,
+    force_rehash: bool = False,
 ):
-    """Scan all the listed platforms and fetch metadata from different sources
+    """Split a scan into one job per platform, so it can run across all the workers
 
     Args:
         platform_slugs (list[str]): List of platform slugs to be scanned
         scan_type (str): Type of scan to be performed. Defaults to "quick".
         roms_ids (list[str], optional): List of selected roms to be scanned. Defaults to [].
         metadata_sources (list[str], optional): List of metadata sources to be used. Defaults to all sources.
+        force_rehash (bool, optional): Ignore the hash cache and read every file again. Defaults to False.
     """
 
     if not roms_ids:
@@ -125,6 +201,14 @@ async def scan_platforms(
 
     sm = _get_socket_manager()
 
+    # The scan is named after its job, so it can be stopped before it's split
+    current_job = get_current_job()
+    scan_id = current_job.id if current_job else uuid4().hex
+    if _is_scan_stopped(scan_id):
+        log.info(emoji.emojize(":stop_sign: Scan stopped manually"))
+        await sm.emit("scan:done", ScanStats().__dict__)
+        return
+
     try:
         fs_platforms: list[str] = fs_platform_handler.get_platforms()
     except FolderStructureNotMatchException as e:
@@ -132,13 +216,6 @@ async def scan_platforms(
         await sm.emit("scan:done_ko", e.message)
         return
 
-    scan_stats = ScanStats()
-
-    async def stop_scan():
-        log.info(emoji.emojize(":stop_sign: Scan stopped manually"))
-        await sm.emit("scan:done", scan_stats.__dict__)
-        redis_client.delete(STOP_SCAN_FLAG)
-
     try:
         platform_list = [
             db_platform_handler.get_platform(s).fs_slug for s in platform_ids
@@ -154,48 +231,308 @@ async def scan_platforms(
         else:
             log.info(f"Found {len(platform_list)} platforms in the file system")
 
-        for platform_slug in platform_list:
-            scan_stats += await _identify_platform(
+        platform_jobs = [
+            _enqueue_platform_job(
+                scan_id,
+                platform_slug,
+                scan_type,
+                fs_platforms,
+                roms_ids,
+                metadata_sources,
+                force_rehash,
+            )
+            for platform_slug in platform_list
+        ]
+
+        if not platform_jobs:
+            await sm.emit("scan:done", ScanStats().__dict__)
+            return
+
+        # Runs once every platform job is done, even if some of them failed
+        high_prio_queue.enqueue(
+            finish_scan_platforms,
+            scan_id,
+            fs_platforms,
+            [job.id for job in platform_jobs],
+            depends_on=Dependency(jobs=platform_jobs, allow_failure=True),
+            job_timeout=SCAN_TIMEOUT,
+        )
+    except Exception as e:
+        log.error(e)
+        # Catch all exceptions and emit error to the client
+        await sm.emit("scan:done_ko", str(e))
+        return
+
+
+def _enqueue_platform_job(scan_id: str, platform_slug: str, *args: Any) -> Job:
+    """Enqueue the scan of a platform, to run after the last one queued for it
+
+    Scans of the same platform run one at a time, instead of purging and storing
+    the same roms at once. A scan waiting for another one is deferred by RQ, so
+    it doesn't hold a worker while it waits.
+
+    Args:
+        scan_id (str): Id of the scan the platform is part of
+        platform_slug (str): Slug of the platform to be scanned
+    """
+
+    job_id = uuid4().hex
+    # Swapped atomically, so scans queued at the same time are chained too
+    previous_job_id = redis_client.set(
+        f"{SCAN_PLATFORM_JOB_KEY}:{platform_slug}", job_id, get=True
+    )
+    previous_job = None
+    if previous_job_id:
+        try:
+            previous_job = Job.fetch(previous_job_id.decode(), connection=redis_client)
+        except NoSuchJobError:
+            pass
+
+    # Jobs that already ended can't be depended on, RQ would defer this one forever
+    if previous_job and previous_job.get_status() not in SCAN_JOB_PENDING_STATUSES:
+        previous_job = None
+
+    job = high_prio_queue.enqueue(
+        scan_platform_job,
+        scan_id,
+        platform_slug,
+        *args,
+        job_id=job_id,
+        depends_on=(
+            Dependency(jobs=[previous_job], allow_failure=True)
+            if previous_job
+            else None
+        ),
+        job_timeout=SCAN_TIMEOUT,  # Timeout (default of 4 hours)
+    )
+
+    # The previous job may have ended before this one was registered as waiting
+    # for it, in which case it won't enqueue this one
+    if (
+        previous_job
+        and previous_job.get_status() not in SCAN_JOB_PENDING_STATUSES
+        and job.get_status() == JobStatus.DEFERRED
+    ):
+        high_prio_queue.deferred_job_registry.remove(job)
+        high_prio_queue.enqueue_job(job)
+
+    return job
+
+
+@initialize_context()
+async def scan_platform_job(
+    scan_id: str,
+    platform_slug: str,
+    scan_type: ScanType,
+    fs_platforms: list[str],
+    roms_ids: list[str],
+    metadata_sources: list[str],
+    force_rehash: bool = False,
+) -> None:
+    """Scan a single platform and add its stats to the stats of the scan
+
+    Args:
+        scan_id (str): Id of the scan the platform is part of
+        platform_slug (str): Slug of the platform to be scanned
+    """
+
+    if _is_scan_stopped(scan_id):
+        log.info(f"Scan of {platform_slug} stopped")
+        return
+
+    fs_hash_cache_handler.reset_stats()
+    for metadata_handler in (meta_igdb_handler, meta_moby_handler):
+        metadata_handler.rate_limiter.reset_stats()
+
+    # Import the DAT files added or changed since the last scan
+    await asyncio.to_thread(meta_dat_handler.update_index)
+
+    try:
+        # Concurrent IGDB searches are batched, complete rescans refresh the cached
+        # metadata responses, and unidentified rescans don't retry the searches
+        # that recently found nothing
+        async with (
+            set_context_var(ctx_igdb_multiquery, True),
+            set_context_var(ctx_metadata_cache_bypass, scan_type == ScanType.COMPLETE),
+            set_context_var(
+                ctx_metadata_skip_known_misses,
+                scan_type == ScanType.UNIDENTIFIED and not roms_ids,
+            ),
+        ):
+            scan_stats = await _identify_platform(
+                scan_id=scan_id,
                 platform_slug=platform_slug,
                 scan_type=scan_type,
                 fs_platforms=fs_platforms,
                 roms_ids=roms_ids,
                 metadata_sources=metadata_sources,
-                socket_manager=sm,
+                socket_manager=_get_socket_manager(),
+                force_rehash=force_rehash,
             )
-
-        # Only purge platforms if there are some platforms remaining in the library
-        # This protects against accidental deletion of entries when
-        # the folder structure is not correct or the drive is not mounted
-        if len(fs_platforms) > 0:
-            purged_platforms = db_platform_handler.purge_platforms(fs_platforms)
-            if len(purged_platforms) > 0:
-                log.info("Purging platforms not found in the filesystem:")
-                for p in purged_platforms:
-                    log.info(f" - {p.slug}")
-
-        log.info(emoji.emojize(":check_mark: Scan completed "))
-        await sm.emit("scan:done", scan_stats.__dict__)
     except ScanStoppedException:
-        await stop_scan()
+        log.info(f"Scan of {platform_slug} stopped")
         return
     except Exception as e:
-        log.error(e)
-        # Catch all exceptions and emit error to the client
-        await sm.emit("scan:done_ko", str(e))
+        log.error(f"Error scanning {platform_slug}: {e}")
+        # Fail the job, so the platforms are not purged when the scan finishes
+        raise
+
+    log.info(
+        f"  Hash cache: {fs_hash_cache_handler.stats.hits} hits, {fs_hash_cache_handler.stats.misses} misses"
+    )
+    for metadata_handler in (meta_igdb_handler, meta_moby_handler):
+        rate_limiter = metadata_handler.rate_limiter
+        if rate_limiter.stats.requests:
+            log.info(
+                f"  {rate_limiter.provider} rate limit: {rate_limiter.stats.requests} requests, "
+                f"{rate_limiter.stats.throttled} throttled for {rate_limiter.stats.wait_time:.1f}s "
+                f"(max {rate_limiter.stats.max_wait_time:.1f}s), "
+                f"{rate_limiter.stats.retry_afters} retried after a 429"
+            )
+    _add_scan_stats(scan_id, scan_stats)
+
+
+@initialize_context()
+async def finish_scan_platforms(
+    scan_id: str, fs_platforms: list[str], platform_job_ids: list[str]
+) -> None:
+    """Purge missing platforms and report the merged stats once every platform job is done
+
+    Args:
+        scan_id (str): Id of the finished scan
+        fs_platforms (list[str]): Platforms found in the filesystem
+        platform_job_ids (list[str]): Ids of the platform jobs of the scan
+    """
+
+    sm = _get_socket_manager()
+    scan_stats = _pop_scan_stats(scan_id)
+
+    if _is_scan_stopped(scan_id):
+        log.info(emoji.emojize(":stop_sign: Scan stopped manually"))
+        await sm.emit("scan:done", scan_stats.__dict__)
+        redis_client.delete(f"{STOP_SCAN_FLAG}:{scan_id}")
+        return
+
+    failed_platforms = [
+        job.args[1]
+        for job in Job.fetch_many(platform_job_ids, connection=redis_client)
+        if job and job.is_failed
+    ]
+    if failed_platforms:
+        await sm.emit(
+            "scan:done_ko", f"Failed to scan platforms: {', '.join(failed_platforms)}"
+        )
         return
 
+    # Only purge platforms if there are some platforms remaining in the library
+    # This protects against accidental deletion of entries when
+    # the folder structure is not correct or the drive is not mounted
+    if len(fs_platforms) > 0:
+        purged_platforms = db_platform_handler.purge_platforms(fs_platforms)
+        if len(purged_platforms) > 0:
+            log.info("Purging platforms not found in the filesystem:")
+            for p in purged_platforms:
+                log.info(f" - {p.slug}")
+            fs_resource_handler.remove_resources(
+                db_resource_handler.get_unreferenced_resources(
+                    set().union(
+                        *(
+                            fs_resource_handler.get_stored_resources(r)
+                            for p in purged_platforms
+                            for r in p.roms
+                        )
+                    )
+                )
+            )
+
+    # Remove the resources that were too recent to be removed during the scan
+    fs_resource_handler.remove_resources(
+        db_resource_handler.get_unreferenced_resources(
+            fs_resource_handler.pop_pending_resources()
+        )
+    )
+
+    log.info(emoji.emojize(":check_mark: Scan completed "))
+    await sm.emit("scan:done", scan_stats.__dict__)
+
+    if SCAN_FAST_IDENTIFY:
+        low_prio_queue.enqueue(hash_deferred_roms, job_timeout=SCAN_TIMEOUT)
+
+
+async def hash_deferred_roms() -> None:
+    """Calculate the md5 and sha1 hashes skipped by fast identify scans"""
+
+    deferred_roms = fs_hash_cache_handler.pop_deferred_rom_hashes()
+    if not deferred_roms:
+        return
+
+    log.info(f"Calculating deferred hashes of {len(deferred_roms)} roms")
+
+    async def _hash_deferred_rom(platform: Platform, rom: Rom) -> None:
+        try:
+            rom_hashes = await get_rom_hashes(platform, rom.file_name)
+            db_rom_handler.update_rom(rom.id, rom_hashes)
+        except Exception as e:
+            # Hashed again by the next run, instead of keeping partial hashes
+            log.error(f"  Error hashing rom {rom.file_name}: {e}")
+            fs_hash_cache_handler.defer_rom_hashes(
+                f"{LIBRARY_BASE_PATH}/{rom.full_path}", platform.id, rom.file_name
+            )
+
+    for deferred_roms_batch in batched(deferred_roms, 200):
+        tasks = []
+        for deferred_rom in deferred_roms_batch:
+            platform = db_platform_handler.get_platform(deferred_rom["platform_id"])
+            if not platform:
+                continue
+
+            rom = db_rom_handler.get_roms_by_filename(
+                platform_id=platform.id, file_names={deferred_rom["file_name"]}
+            ).get(deferred_rom["file_name"])
+            if rom:
+                tasks.append(_hash_deferred_rom(platform, rom))
+
+        await asyncio.gather(*tasks)
+
+    log.info("Deferred hashes calculated")
+
+
+def _add_scan_stats(scan_id: str, scan_stats: ScanStats) -> None:
+    """Merge the stats of a platform job into the stats of the scan"""
+
+    stats_key = f"{SCAN_STATS_KEY}:{scan_id}"
+    with redis_client.pipeline() as pipe:
+        for stat_name, value in asdict(scan_stats).items():
+            pipe.hincrby(stats_key, stat_name, value)
+        pipe.expire(stats_key, SCAN_TIMEOUT)
+        pipe.execute()
+
+
+def _pop_scan_stats(scan_id: str) -> ScanStats:
+    stats_key = f"{SCAN_STATS_KEY}:{scan_id}"
+    stats = redis_client.hgetall(stats_key)
+    redis_client.delete(stats_key)
+
+    return ScanStats(
+        **{
+            (k.decode() if isinstance(k, bytes) else k): int(v)
+            for k, v in stats.items()
+        }
+    )
+
 
 async def _identify_platform(
+    scan_id: str,
     platform_slug: str,
     scan_type: ScanType,
     fs_platforms: list[str],
     roms_ids: list[str],
     metadata_sources: list[str],
     socket_manager: socketio.AsyncRedisManager,
+    force_rehash: bool = False,
 ) -> ScanStats:
     # Stop the scan if the flag is set
-    if redis_client.get(STOP_SCAN_FLAG):
+    if _is_scan_stopped(scan_id):
         raise ScanStoppedException()
 
     scan_stats = ScanStats()
@@ -244,11 +581,20 @@ async def _identify_platform(
     else:
         log.info(f"  {len(fs_firmware)} firmware files found")
 
-    for fs_fw in fs_firmware:
-        scan_stats += await _identify_firmware(
-            platform=platform,
-            fs_fw=fs_fw,
+    # Firmware is hashed in parallel in the hashing workers
+    firmware_scan_stats = await asyncio.gather(
+        *(
+            _identify_firmware(
+                scan_id=scan_id,
+                platform=platform,
+                fs_fw=fs_fw,
+                force_rehash=force_rehash,
+            )
+            for fs_fw in fs_firmware
         )
+    )
+    for fw_scan_stats in firmware_scan_stats:
+        scan_stats += fw_scan_stats
 
     # Scanning roms
     try:
@@ -266,22 +612,90 @@ async def _identify_platform(
     else:
         log.info(f"  {len(fs_roms)} roms found in the file system")
 
+    # Let roms similar to the ones already matched be matched locally
+    await _index_matched_titles(platform)
+
+    # Bound the number of roms being identified at once across all batches
+    semaphore = asyncio.Semaphore(SCAN_ROMS_CONCURRENCY)
+
     for fs_roms_batch in batched(fs_roms, 200):
         rom_by_filename_map = db_rom_handler.get_roms_by_filename(
             platform_id=platform.id,
             file_names={fs_rom["file_name"] for fs_rom in fs_roms_batch},
         )
 
-        for fs_rom in fs_roms_batch:
-            scan_stats += await _identify_rom(
-                platform=platform,
-                fs_rom=fs_rom,
-                rom=rom_by_filename_map.get(fs_rom["file_name"]),
+        if scan_type == ScanType.DELTA:
+            _summarize_delta(
+                scan_stats=scan_stats,
+                fs_roms=fs_roms_batch,
+                rom_by_filename_map=rom_by_filename_map,
+            )
+
+        rom_hashes_by_filename = await _get_roms_hashes(
+            scan_id=scan_id,
+            platform=platform,
+            fs_roms=fs_roms_batch,
+            rom_by_filename_map=rom_by_filename_map,
+            scan_type=scan_type,
+            roms_ids=roms_ids,
+            force_rehash=force_rehash,
+        )
+
+        identify_rom_tasks = [
+            asyncio.create_task(
+                _identify_rom_bounded(
+                    semaphore=semaphore,
+                    scan_id=scan_id,
+                    platform=platform,
+                    fs_rom=fs_rom,
+                    rom=rom_by_filename_map.get(fs_rom["file_name"]),
+                    scan_type=scan_type,
+                    roms_ids=roms_ids,
+                    metadata_sources=metadata_sources,
+                    rom_hashes=rom_hashes_by_filename.get(fs_rom["file_name"]),
+                    force_rehash=force_rehash,
+                )
+            )
+            for fs_rom in fs_roms_batch
+        ]
+
+        # Collect the results in filesystem order so progress events stay ordered
+        scanned_roms: list[Rom] = []
+        for idx, identify_rom_task in enumerate(identify_rom_tasks):
+            rom_scan_stats, scanned_rom = await identify_rom_task
+            scan_stats += rom_scan_stats
+            if scanned_rom:
+                scanned_roms.append(scanned_rom)
+
+            # Roms are stored and reported as soon as they're identified, along
+            # with the following ones that are already identified too
+            next_task = (
+                identify_rom_tasks[idx + 1]
+                if idx + 1 < len(identify_rom_tasks)
+                else None
+            )
+            if not scanned_roms or (next_task and next_task.done()):
+                continue
+
+            stored_roms = await _store_scanned_roms(
+                semaphore=semaphore,
+                scanned_roms=scanned_roms,
+                rom_by_filename_map=rom_by_filename_map,
                 scan_type=scan_type,
-                roms_ids=roms_ids,
-                metadata_sources=metadata_sources,
-                socket_manager=socket_manager,
             )
+            for stored_rom in stored_roms:
+                await _emit_scanned_rom(
+                    socket_manager=socket_manager,
+                    platform=platform,
+                    rom=stored_rom,
+                )
+            scanned_roms = []
+
+    # Don't purge anything if the scan was stopped before all roms were checked,
+    # but keep the stats of the roms that were
+    if _is_scan_stopped(scan_id):
+        log.info(f"Scan of {platform_slug} stopped")
+        return scan_stats
 
     # Only purge entries if there are some file remaining in the library
     # This protects against accidental deletion of entries when
@@ -290,10 +704,32 @@ async def _identify_platform(
         purged_roms = db_rom_handler.purge_roms(
             platform.id, [rom["file_name"] for rom in fs_roms]
         )
+        if scan_type == ScanType.DELTA:
+            scan_stats.delta_removed_roms = len(purged_roms)
         if len(purged_roms) > 0:
             log.info("Purging roms not found in the filesystem:")
             for r in purged_roms:
                 log.info(f" - {r.file_name}")
+            fs_hash_cache_handler.invalidate(
+                ROM_HASHES_CACHE_KEY,
+                [f"{LIBRARY_BASE_PATH}/{r.full_path}" for r in purged_roms],
+            )
+            fs_resource_handler.remove_resources(
+                db_resource_handler.get_unreferenced_resources(
+                    set().union(
+                        *(
+                            fs_resource_handler.get_stored_resources(r)
+                            for r in purged_roms
+                        )
+                    )
+                )
+            )
+
+    if scan_type == ScanType.DELTA:
+        log.info(
+            f"  Delta: {scan_stats.delta_new_roms} new, {scan_stats.delta_changed_roms} changed, "
+            f"{scan_stats.delta_removed_roms} removed, {scan_stats.delta_unchanged_roms} unchanged roms"
+        )
 
     # Same protection for firmware
     if len(fs_firmware) > 0:
@@ -304,26 +740,54 @@ async def _identify_platform(
             log.info("Purging firmware not found in the filesystem:")
             for f in purged_firmware:
                 log.info(f" - {f}")
+            fs_hash_cache_handler.invalidate(
+                FIRMWARE_HASHES_CACHE_KEY,
+                [f"{LIBRARY_BASE_PATH}/{f.full_path}" for f in purged_firmware],
+            )
 
     return scan_stats
 
 
+async def _index_matched_titles(platform: Platform) -> None:
+    """Add the names of the matched roms of a platform to the local title indexes"""
+    igdb_titles: defaultdict[int, list[str]] = defaultdict(list)
+    moby_titles: defaultdict[int, list[str]] = defaultdict(list)
+    for igdb_id, moby_id, name in db_rom_handler.get_matched_rom_titles(platform.id):
+        if igdb_id:
+            igdb_titles[igdb_id].append(name)
+        if moby_id:
+            moby_titles[moby_id].append(name)
+
+    if platform.igdb_id and igdb_titles:
+        await meta_igdb_handler.title_index.add_titles(platform.igdb_id, igdb_titles)
+    if platform.moby_id and moby_titles:
+        await meta_moby_handler.title_index.add_titles(platform.moby_id, moby_titles)
+
+
 async def _identify_firmware(
+    scan_id: str,
     platform: Platform,
     fs_fw: str,
+    force_rehash: bool = False,
 ) -> ScanStats:
     scan_stats = ScanStats()
 
     # Break early if the flag is set
-    if redis_client.get(STOP_SCAN_FLAG):
+    if _is_scan_stopped(scan_id):
         return scan_stats
 
     firmware = db_firmware_handler.get_firmware_by_filename(platform.id, fs_fw)
+    file_hashes = await get_firmware_hashes(
+        platform=platform,
+        file_name=fs_fw,
+        force_rehash=force_rehash,
+    )
 
     scanned_firmware = scan_firmware(
         platform=platform,
         file_name=fs_fw,
         firmware=firmware,
+        file_hashes=file_hashes,
     )
 
     scan_stats.scanned_firmware += 1
@@ -333,34 +797,142 @@ async def _identify_firmware(
     return scan_stats
 
 
+def _summarize_delta(
+    scan_stats: ScanStats,
+    fs_roms: tuple[FSRom, ...],
+    rom_by_filename_map: dict[str, Rom],
+) -> None:
+    """Count the new, changed and unchanged roms of a batch in a delta scan"""
+
+    for fs_rom in fs_roms:
+        rom = rom_by_filename_map.get(fs_rom["file_name"])
+        if not rom:
+            scan_stats.delta_new_roms += 1
+            continue
+
+        rom_files_delta = get_rom_files_delta(rom.files, fs_rom["files"])
+        if rom_files_delta:
+            scan_stats.delta_changed_roms += 1
+            log.debug(f"  {fs_rom['file_name']} changed: {rom_files_delta}")
+        else:
+            scan_stats.delta_unchanged_roms += 1
+
+
+async def _get_roms_hashes(
+    scan_id: str,
+    platform: Platform,
+    fs_roms: tuple[FSRom, ...],
+    rom_by_filename_map: dict[str, Rom],
+    scan_type: ScanType,
+    roms_ids: list[str],
+    force_rehash: bool = False,
+) -> dict[str, dict[str, str]]:
+    """Calculate the hashes of the roms that will be scanned in parallel in the hashing workers
+
+    Returns:
+        dict: Rom hashes by file name
+    """
+
+    # Break early if the flag is set
+    if _is_scan_stopped(scan_id):
+        return {}
+
+    file_names = [
+        fs_rom["file_name"]
+        for fs_rom in fs_roms
+        if _should_scan_rom(
+            scan_type=scan_type,
+            rom=rom_by_filename_map.get(fs_rom["file_name"]),
+            fs_rom=fs_rom,
+            roms_ids=roms_ids,
+        )
+        and should_hash_rom(
+            scan_type=scan_type, rom=rom_by_filename_map.get(fs_rom["file_name"])
+        )
+    ]
+    roms_hashes = await asyncio.gather(
+        *(
+            get_rom_hashes(
+                platform,
+                file_name,
+                force_rehash=force_rehash,
+                # A hashes scan is explicitly asking for the full hashes
+                fast_identify=SCAN_FAST_IDENTIFY and scan_type != ScanType.HASHES,
+                full_hashes=scan_type == ScanType.HASHES,
+            )
+            for file_name in file_names
+        ),
+        return_exceptions=True,
+    )
+
+    # Roms that couldn't be hashed are left out, and hashed again when identified
+    rom_hashes_by_filename: dict[str, dict[str, str]] = {}
+    for file_name, rom_hashes in zip(file_names, roms_hashes, strict=True):
+        if isinstance(rom_hashes, BaseException):
+            log.error(f"  Error hashing rom {file_name}: {rom_hashes}")
+            continue
+
+        rom_hashes_by_filename[file_name] = rom_hashes
+
+    return rom_hashes_by_filename
+
+
+async def _identify_rom_bounded(
+    semaphore: asyncio.Semaphore,
+    platform: Platform,
+    fs_rom: FSRom,
+    **kwargs: Any,
+) -> tuple[ScanStats, Rom | None]:
+    """Identify a rom once a slot is free, without letting its errors stop the scan"""
+
+    async with semaphore:
+        try:
+            return await _identify_rom(platform=platform, fs_rom=fs_rom, **kwargs)
+        except Exception as e:
+            log.error(f"  Error scanning rom {fs_rom['file_name']}: {e}")
+            return ScanStats(), None
+
+
 async def _identify_rom(
+    scan_id: str,
     platform: Platform,
     fs_rom: FSRom,
     rom: Rom | None,
     scan_type: ScanType,
     roms_ids: list[str],
     metadata_sources: list[str],
-    socket_manager: socketio.AsyncRedisManager,
-) -> ScanStats:
+    rom_hashes: dict[str, str] | None = None,
+    force_rehash: bool = False,
+) -> tuple[ScanStats, Rom | None]:
+    """Identify a single rom
+
+    Roms that don't need a metadata scan only get their filesystem data updated.
+
+    Returns:
+        tuple: Scan stats and the scanned rom, not yet stored in the database
+    """
+
     scan_stats = ScanStats()
 
     # Break early if the flag is set
-    if redis_client.get(STOP_SCAN_FLAG):
-        return scan_stats
+    if _is_scan_stopped(scan_id):
+        return scan_stats, None
 
-    if not _should_scan_rom(scan_type=scan_type, rom=rom, roms_ids=roms_ids):
-        if rom and (
-            rom.file_name != fs_rom["file_name"]
-            or rom.multi != fs_rom["multi"]
-            or rom.files != fs_rom["files"]
-        ):
-            # Just to update the filesystem data
-            rom.file_name = fs_rom["file_name"]
-            rom.multi = fs_rom["multi"]
-            rom.files = fs_rom["files"]
-            db_rom_handler.add_rom(rom)
+    if not _should_scan_rom(
+        scan_type=scan_type, rom=rom, fs_rom=fs_rom, roms_ids=roms_ids
+    ):
+        if rom:
+            fs_data = {"file_name": fs_rom["file_name"], "multi": fs_rom["multi"]}
+            # Resized or touched files keep their stored size and mtime until the
+            # rom is rehashed, so a later delta scan still finds them changed
+            if not get_rom_files_delta(rom.files, fs_rom["files"]):
+                fs_data["files"] = fs_rom["files"]
 
-        return scan_stats
+            if any(getattr(rom, key) != value for key, value in fs_data.items()):
+                # Just to update the filesystem data
+                db_rom_handler.update_rom(rom.id, fs_data)
+
+        return scan_stats, None
 
     scanned_rom = await scan_rom(
         platform=platform,
@@ -368,55 +940,140 @@ async def _identify_rom(
         scan_type=scan_type,
         rom=rom,
         metadata_sources=metadata_sources,
+        rom_hashes=rom_hashes,
+        force_rehash=force_rehash,
     )
 
     scan_stats.scanned_roms += 1
     scan_stats.added_roms += 1 if not rom else 0
     scan_stats.metadata_roms += 1 if scanned_rom.igdb_id or scanned_rom.moby_id else 0
 
-    _added_rom = db_rom_handler.add_rom(scanned_rom)
+    return scan_stats, scanned_rom
+
+
+async def _store_scanned_roms(
+    semaphore: asyncio.Semaphore,
+    scanned_roms: list[Rom],
+    rom_by_filename_map: dict[str, Rom],
+    scan_type: ScanType,
+) -> list[Rom]:
+    """Store a batch of scanned roms along with their cover and screenshots
+
+    The artwork of the batch is fetched concurrently into the resources store,
+    then the roms are written with a single upsert, or one by one if it fails.
+
+    Returns:
+        list: The stored roms to report to the client, in the same order
+    """
+
+    if not scanned_roms:
+        return []
 
     # Return early if we're only scanning for hashes
     if scan_type == ScanType.HASHES:
-        return scan_stats
-
-    path_cover_s, path_cover_l = await fs_resource_handler.get_cover(
-        overwrite=True,
-        entity=_added_rom,
-        url_cover=_added_rom.url_cover,
+        _upsert_scanned_roms(scanned_roms)
+        return []
+
+    roms_artwork = await asyncio.gather(
+        *(
+            _get_rom_artwork_bounded(
+                semaphore=semaphore,
+                rom=scanned_rom,
+                previous_rom=rom_by_filename_map.get(scanned_rom.file_name),
+            )
+            for scanned_rom in scanned_roms
+        )
     )
+    for scanned_rom, rom_artwork in zip(scanned_roms, roms_artwork, strict=True):
+        for key, value in rom_artwork.items():
+            setattr(scanned_rom, key, value)
 
-    path_screenshots = await fs_resource_handler.get_rom_screenshots(
-        rom=_added_rom,
-        url_screenshots=_added_rom.url_screenshots,
-    )
+    rom_ids = _upsert_scanned_roms(scanned_roms)
 
-    _added_rom.path_cover_s = path_cover_s
-    _added_rom.path_cover_l = path_cover_l
-    _added_rom.path_screenshots = path_screenshots
-    # Update the scanned rom with the cover and screenshots paths and update database
-    db_rom_handler.update_rom(
-        _added_rom.id,
-        {
-            c: getattr(_added_rom, c)
-            for c in inspect(_added_rom).mapper.column_attrs.keys()
-        },
+    # Remove the store resources the previous version of the roms referenced
+    previous_resources: set[str] = set()
+    for scanned_rom in scanned_roms:
+        previous_resources |= fs_resource_handler.get_stored_resources(
+            rom_by_filename_map.get(scanned_rom.file_name)
+        )
+    fs_resource_handler.remove_resources(
+        db_resource_handler.get_unreferenced_resources(previous_resources)
     )
 
+    stored_roms = db_rom_handler.get_roms_by_ids(rom_ids)
+    for stored_rom in stored_roms:
+        fs_resource_handler.remove_legacy_resources(stored_rom)
+
+    return stored_roms
+
+
+def _upsert_scanned_roms(scanned_roms: list[Rom]) -> list[int]:
+    """Store a batch of scanned roms, without letting a bad rom drop the whole batch
+
+    Returns:
+        list: The ids of the roms that were stored
+    """
+
+    try:
+        return db_rom_handler.upsert_roms(scanned_roms)
+    except Exception as e:
+        log.warning(
+            f"  Batch of {len(scanned_roms)} roms couldn't be stored, storing them one by one: {e}"
+        )
+
+    rom_ids = []
+    for scanned_rom in scanned_roms:
+        try:
+            rom_ids.extend(db_rom_handler.upsert_roms([scanned_rom]))
+        except Exception as e:
+            log.error(f"  Error storing rom {scanned_rom.file_name}: {e}")
+
+    return rom_ids
+
+
+async def _get_rom_artwork_bounded(
+    semaphore: asyncio.Semaphore, rom: Rom, previous_rom: Rom | None = None
+) -> dict[str, Any]:
+    """Fetch the cover and screenshots of a rom, without letting its errors stop the scan"""
+
+    async with semaphore:
+        try:
+            path_cover_s, path_cover_l = await fs_resource_handler.get_cover(
+                overwrite=True,
+                entity=rom,
+                url_cover=rom.url_cover or "",
+            )
+            path_screenshots = await fs_resource_handler.get_rom_screenshots(
+                rom=rom,
+                url_screenshots=rom.url_screenshots or [],
+                previous_rom=previous_rom,
+            )
+        except Exception as e:
+            log.error(f"  Error fetching artwork for rom {rom.file_name}: {e}")
+            return {}
+
+    return {
+        "path_cover_s": path_cover_s,
+        "path_cover_l": path_cover_l,
+        "path_screenshots": path_screenshots,
+    }
+
+
+async def _emit_scanned_rom(
+    socket_manager: socketio.AsyncRedisManager, platform: Platform, rom: Rom
+) -> None:
     await socket_manager.emit(
         "scan:scanning_rom",
         {
             "platform_name": platform.name,
             "platform_slug": platform.slug,
-            **SimpleRomSchema.from_orm_with_factory(_added_rom).model_dump(
+            **SimpleRomSchema.from_orm_with_factory(rom).model_dump(
                 exclude={"created_at", "updated_at", "rom_user"}
             ),
         },
     )
     await socket_manager.emit("", None)
 
-    return scan_stats
-
 
 @socket_handler.socket_server.on("scan")
 async def scan_handler(_sid: str, options: dict):
@@ -432,6 +1089,7 @@ async def scan_handler(_sid: str, options: dict):
     scan_type = ScanType[options.get("type", "quick").upper()]
     roms_ids = options.get("roms_ids", [])
     metadata_sources = options.get("apis", [])
+    force_rehash = options.get("force_rehash", False)
 
     # Uncomment this to run scan in the current process
     # await scan_platforms(
@@ -439,6 +1097,7 @@ async def scan_handler(_sid: str, options: dict):
     #     scan_type=scan_type,
     #     roms_ids=roms_ids,
     #     metadata_sources=metadata_sources,
+    #     force_rehash=force_rehash,
     # )
 
     return high_prio_queue.enqueue(
@@ -447,6 +1106,7 @@ async def scan_handler(_sid: str, options: dict):
         scan_type,
         roms_ids,
         metadata_sources,
+        force_rehash,
         job_timeout=SCAN_TIMEOUT,  # Timeout (default of 4 hours)
     )
 
@@ -457,24 +1117,38 @@ async def stop_scan_handler(_sid: str):
 
     log.info(emoji.emojize(":stop_button: Stop scan requested..."))
 
-    async def cancel_job(job: Job):
-        job.cancel()
-        redis_client.set(STOP_SCAN_FLAG, 1)
-        log.info(emoji.emojize(":stop_button: Job found, stopping scan..."))
-
-    existing_jobs = high_prio_queue.get_jobs()
-    for job in existing_jobs:
-        if job.func_name == "scan_platform" and job.is_started:
-            return await cancel_job(job)
-
-    workers = Worker.all(connection=redis_client)
-    for worker in workers:
+    # Jobs are not canceled, as canceled jobs never enqueue their dependents.
+    # Every job of a stopped scan checks its flag instead, and the job that
+    # finishes the scan clears it.
+    # Platform jobs waiting for another scan of their platform are deferred
+    deferred_jobs = Job.fetch_many(
+        high_prio_queue.deferred_job_registry.get_job_ids(), connection=redis_client
+    )
+    scan_jobs = [
+        job
+        for job in [*high_prio_queue.get_jobs(), *deferred_jobs]
+        if job and job.func_name in SCAN_JOB_FUNC_NAMES
+    ]
+    for worker in Worker.all(connection=redis_client):
         current_job = worker.get_current_job()
         if (
             current_job
-            and current_job.func_name == "endpoints.sockets.scan.scan_platforms"
+            and current_job.func_name in SCAN_JOB_FUNC_NAMES
             and current_job.is_started
         ):
-            return await cancel_job(current_job)
+            scan_jobs.append(current_job)
+
+    scan_ids = {
+        (
+            job.id
+            if job.func_name == "endpoints.sockets.scan.scan_platforms"
+            else job.args[0]
+        )
+        for job in scan_jobs
+    }
+    if scan_ids:
+        _stop_scans(scan_ids)
+        log.info(emoji.emojize(":stop_button: Job found, stopping scan..."))
+        return
 
     log.info(emoji.emojize(":stop_button: No running scan to stop"))
@@ -1,6 +1,7 @@
 from .collections_handler import DBCollectionsHandler
 from .firmware_handler import DBFirmwareHandler
 from .platforms_handler import DBPlatformsHandler
+from .resources_handler import DBResourcesHandler
 from .roms_handler import DBRomsHandler
 from .saves_handler import DBSavesHandler
 from .screenshots_handler import DBScreenshotsHandler
@@ -10,6 +11,7 @@ from .users_handler import DBUsersHandler
 
 db_firmware_handler = DBFirmwareHandler()
 db_platform_handler = DBPlatformsHandler()
+db_resource_handler = DBResourcesHandler()
 db_rom_handler = DBRomsHandler()
 db_save_handler = DBSavesHandler()
 db_screenshot_handler = DBScreenshotsHandler()
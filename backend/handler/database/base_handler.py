@@ -1,9 +1,61 @@
+from itertools import batched
+from typing import Final
+
 from config.config_manager import ConfigManager
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import create_engine, delete, select
+from sqlalchemy.orm import Session, sessionmaker
 
 sync_engine = create_engine(ConfigManager.get_db_engine(), pool_pre_ping=True)
 sync_session = sessionmaker(bind=sync_engine, expire_on_commit=False)
 
+# Maximum number of primary keys sent in a single purge statement
+PURGE_BATCH_SIZE: Final = 1000
+
+
+class DBBaseHandler:
+    @staticmethod
+    def _find_ids_not_in(
+        model, column, values: list[str], *criteria, session: Session
+    ) -> set[int]:
+        """Find the ids of the rows where `column NOT IN values`, a bounded batch
+        of values at a time
+
+        Values are still compared by the database, so its collation applies, and
+        rows where the column is NULL only match when there are no values at all.
+        """
+        if not values:
+            return set(session.scalars(select(model.id).where(*criteria)))
+
+        ids = set(
+            session.scalars(select(model.id).where(*criteria, column.is_not(None)))
+        )
+        for values_batch in batched(values, PURGE_BATCH_SIZE):
+            ids.difference_update(
+                session.scalars(
+                    select(model.id).where(*criteria, column.in_(values_batch))
+                )
+            )
+        return ids
+
+    @staticmethod
+    def _purge_by_ids(model, ids: set[int], *options, session: Session) -> list:
+        """Load and delete rows by primary key, a bounded batch at a time
 
-class DBBaseHandler: ...
+        Returns
+            list: The purged rows, loaded with the given options
+        """
+        purged = []
+        for ids_batch in batched(sorted(ids), PURGE_BATCH_SIZE):
+            purged.extend(
+                session.scalars(
+                    select(model).options(*options).where(model.id.in_(ids_batch))
+                )
+                .unique()
+                .all()
+            )
+            session.execute(
+                delete(model)
+                .where(model.id.in_(ids_batch))
+                .execution_options(synchronize_session=False)
+            )
+        return purged
@@ -1,6 +1,6 @@
 from decorators.database import begin_session
 from models.firmware import Firmware
-from sqlalchemy import and_, delete, select, update
+from sqlalchemy import delete, select, update
 from sqlalchemy.orm import Session
 
 from .base_handler import DBBaseHandler
@@ -63,29 +63,14 @@ class DBFirmwareHandler(DBBaseHandler):
     @begin_session
     def purge_firmware(
         self, platform_id: int, fs_firmwares: list[str], session: Session = None
-    ) -> None:
-        purged_firmware = (
-            session.scalars(
-                select(Firmware)
-                .order_by(Firmware.file_name.asc())
-                .where(
-                    and_(
-                        Firmware.platform_id == platform_id,
-                        Firmware.file_name.not_in(fs_firmwares),
-                    )
-                )
-            )  # type: ignore[attr-defined]
-            .unique()
-            .all()
-        )
-        session.execute(
-            delete(Firmware)
-            .where(
-                and_(
-                    Firmware.platform_id == platform_id,
-                    Firmware.file_name.not_in(fs_firmwares),
-                )
-            )
-            .execution_options(synchronize_session="evaluate")
+    ) -> list[Firmware]:
+        """Delete the firmware of a platform whose file is not in `fs_firmwares`"""
+        purged_ids = self._find_ids_not_in(
+            Firmware,
+            Firmware.file_name,
+            fs_firmwares,
+            Firmware.platform_id == platform_id,
+            session=session,
         )
-        return purged_firmware
+        purged_firmware = self._purge_by_ids(Firmware, purged_ids, session=session)
+        return sorted(purged_firmware, key=lambda firmware: firmware.file_name)
@@ -1,12 +1,23 @@
 from decorators.database import begin_session
 from models.platform import Platform
 from models.rom import Rom
-from sqlalchemy import Select, delete, or_, select
-from sqlalchemy.orm import Session
+from sqlalchemy import Select, delete, select
+from sqlalchemy.orm import Session, load_only, raiseload, selectinload
 
 from .base_handler import DBBaseHandler
 
 
+def _load_roms_resources():
+    """Load only the resource paths of the roms of a platform, so they can still
+    be collected once the platform and its roms are deleted"""
+    return selectinload(Platform.roms).options(
+        load_only(
+            Rom.platform_id, Rom.path_cover_s, Rom.path_cover_l, Rom.path_screenshots
+        ),
+        raiseload("*"),
+    )
+
+
 class DBPlatformsHandler(DBBaseHandler):
     @begin_session
     def add_platform(
@@ -44,7 +55,16 @@ class DBPlatformsHandler(DBBaseHandler):
         return session.scalar(select(Platform).filter_by(fs_slug=fs_slug).limit(1))
 
     @begin_session
-    def delete_platform(self, id: int, session: Session) -> None:
+    def delete_platform(self, id: int, session: Session) -> Platform | None:
+        """Delete a platform along with its roms
+
+        Returns
+            The deleted platform, with only the resource paths of its roms loaded
+        """
+        platform = session.scalar(
+            select(Platform).options(_load_roms_resources()).filter_by(id=id).limit(1)
+        )
+
         # Remove all roms from that platforms first
         session.execute(
             delete(Rom)
@@ -57,25 +77,25 @@ class DBPlatformsHandler(DBBaseHandler):
             .where(Platform.id == id)
             .execution_options(synchronize_session="evaluate")
         )
+        return platform
 
     @begin_session
     def purge_platforms(
         self, fs_platforms: list[str], session: Session
-    ) -> Select[tuple[Platform]]:
-        purged_platforms = (
-            session.scalars(
-                select(Platform)
-                .order_by(Platform.name.asc())
-                .where(
-                    or_(Platform.fs_slug.not_in(fs_platforms), Platform.slug.is_(None))
-                )
-            )  # type: ignore[attr-defined]
-            .unique()
-            .all()
+    ) -> list[Platform]:
+        """Delete the platforms whose folder is not in `fs_platforms`
+
+        Returns
+            list: The purged platforms, with only the resource paths of their
+            roms loaded
+        """
+        purged_ids = self._find_ids_not_in(
+            Platform, Platform.fs_slug, fs_platforms, session=session
         )
-        session.execute(
-            delete(Platform)
-            .where(or_(Platform.fs_slug.not_in(fs_platforms), Platform.slug.is_(None)))  # type: ignore[attr-defined]
-            .execution_options(synchronize_session="fetch")
+        purged_ids |= set(
+            session.scalars(select(Platform.id).where(Platform.slug.is_(None)))
+        )
+        purged_platforms = self._purge_by_ids(
+            Platform, purged_ids, _load_roms_resources(), session=session
         )
-        return purged_platforms
+        return sorted(purged_platforms, key=lambda platform: platform.name or "")
@@ -0,0 +1,61 @@
+from collections.abc import Iterable
+from itertools import batched
+
+from decorators.database import begin_session
+from models.collection import Collection
+from models.rom import Rom
+from sqlalchemy import or_, select
+from sqlalchemy.orm import Session
+from utils.database import json_array_contains_value
+
+from .base_handler import DBBaseHandler
+
+# Maximum number of resource paths checked in a single statement
+RESOURCES_BATCH_SIZE = 100
+
+
+class DBResourcesHandler(DBBaseHandler):
+    @begin_session
+    def get_unreferenced_resources(
+        self, paths: Iterable[str], session: Session = None
+    ) -> set[str]:
+        """Filter the resource paths no rom or collection references anymore.
+
+        Resources are shared between roms and collections, so their reference
+        count is the number of rows pointing to them.
+        """
+        paths = set(paths)
+        referenced: set[str] = set()
+
+        for paths_batch in batched(paths, RESOURCES_BATCH_SIZE):
+            roms_resources = session.execute(
+                select(Rom.path_cover_s, Rom.path_cover_l, Rom.path_screenshots).where(
+                    or_(
+                        Rom.path_cover_s.in_(paths_batch),
+                        Rom.path_cover_l.in_(paths_batch),
+                        *(
+                            json_array_contains_value(
+                                Rom.path_screenshots, path, session=session
+                            )
+                            for path in paths_batch
+                        ),
+                    )
+                )
+            )
+            for path_cover_s, path_cover_l, path_screenshots in roms_resources:
+                referenced.update(
+                    [path_cover_s, path_cover_l, *(path_screenshots or [])]
+                )
+
+            collections_resources = session.execute(
+                select(Collection.path_cover_s, Collection.path_cover_l).where(
+                    or_(
+                        Collection.path_cover_s.in_(paths_batch),
+                        Collection.path_cover_l.in_(paths_batch),
+                    )
+                )
+            )
+            for path_cover_s, path_cover_l in collections_resources:
+                referenced.update([path_cover_s, path_cover_l])
+
+        return paths - referenced
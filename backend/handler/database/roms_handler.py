@@ -4,7 +4,7 @@ from collections.abc import Iterable
 from decorators.database import begin_session
 from models.collection import Collection
 from models.rom import Rom, RomUser
-from sqlalchemy import and_, delete, func, or_, select, update
+from sqlalchemy import and_, bindparam, delete, func, or_, select, update
 from sqlalchemy.orm import Query, Session, selectinload
 
 from .base_handler import DBBaseHandler
@@ -48,6 +48,14 @@ def with_simple(func):
     return wrapper
 
 
+def _group_rows_by_columns(rows: list[dict]) -> dict[tuple[str, ...], list[int]]:
+    """Group row indexes by the set of columns the rows define"""
+    groups: dict[tuple[str, ...], list[int]] = {}
+    for idx, row in enumerate(rows):
+        groups.setdefault(tuple(sorted(row.keys())), []).append(idx)
+    return groups
+
+
 class DBRomsHandler(DBBaseHandler):
     def _filter(
         self,
@@ -98,6 +106,60 @@ class DBRomsHandler(DBBaseHandler):
 
         return session.scalar(query.filter_by(id=rom.id).limit(1))
 
+    @begin_session
+    def upsert_roms(self, roms: list[Rom], session: Session = None) -> list[int]:
+        """Store a batch of scanned roms with as few statements as possible.
+
+        Roms that still exist are written with one executemany `UPDATE` per set
+        of columns, so only the columns set on each rom are written, like
+        `session.merge` would. New roms, and roms deleted since they were read,
+        are inserted with a single multi-row `INSERT` and must be complete.
+
+        Returns
+            list[int]: The id of each rom, in the same order as `roms`
+        """
+        column_keys = Rom.__table__.columns.keys()
+        rows = [
+            {k: v for k, v in rom.__dict__.items() if k in column_keys} for rom in roms
+        ]
+        rom_ids: list[int] = [row.get("id") for row in rows]
+
+        stored_ids = set(
+            session.scalars(
+                select(Rom.id).where(Rom.id.in_([id for id in rom_ids if id]))
+            )
+        )
+        existing_rows = [i for i, row in enumerate(rows) if row.get("id") in stored_ids]
+        for indexes in _group_rows_by_columns(
+            [rows[i] for i in existing_rows]
+        ).values():
+            # The columns to set are the keys of the parameters, but the id
+            session.execute(
+                update(Rom.__table__).where(Rom.__table__.c.id == bindparam("rom_id")),
+                [
+                    {
+                        "rom_id": rows[existing_rows[i]]["id"],
+                        **{
+                            k: v for k, v in rows[existing_rows[i]].items() if k != "id"
+                        },
+                    }
+                    for i in indexes
+                ],
+            )
+
+        new_rows = [i for i, row in enumerate(rows) if row.get("id") not in stored_ids]
+        new_roms = [
+            Rom(**{k: v for k, v in rows[i].items() if k != "id"}) for i in new_rows
+        ]
+        session.add_all(new_roms)
+        # Flushed together, so the ids come back from a single INSERT .. RETURNING
+        # on databases that support it
+        session.flush()
+        for i, new_rom in zip(new_rows, new_roms, strict=True):
+            rom_ids[i] = new_rom.id
+
+        return rom_ids
+
     @begin_session
     @with_details
     def get_rom(
@@ -128,6 +190,16 @@ class DBRomsHandler(DBBaseHandler):
         limited_query = offset_query.limit(limit)
         return session.scalars(limited_query).unique().all()
 
+    @begin_session
+    @with_simple
+    def get_roms_by_ids(
+        self, ids: list[int], query: Query = None, session: Session = None
+    ) -> list[Rom]:
+        """Retrieve roms by their ids, in the same order as `ids`"""
+        roms = session.scalars(query.filter(Rom.id.in_(ids))).unique().all()
+        rom_by_id = {rom.id: rom for rom in roms}
+        return [rom_by_id[id] for id in ids if id in rom_by_id]
+
     @begin_session
     @with_details
     def get_rom_by_filename(
@@ -162,6 +234,22 @@ class DBRomsHandler(DBBaseHandler):
         )
         return {rom.file_name: rom for rom in roms}
 
+    @begin_session
+    def get_matched_rom_titles(
+        self, platform_id: int, session: Session = None
+    ) -> list[tuple[int | None, int | None, str]]:
+        """Retrieve the (igdb id, moby id, name) of the matched roms of a platform"""
+        return [
+            (igdb_id, moby_id, name)
+            for igdb_id, moby_id, name in session.execute(
+                select(Rom.igdb_id, Rom.moby_id, Rom.name).filter(
+                    Rom.platform_id == platform_id,
+                    or_(Rom.igdb_id.isnot(None), Rom.moby_id.isnot(None)),
+                    Rom.name.isnot(None),
+                )
+            )
+        ]
+
     @begin_session
     @with_details
     def get_rom_by_filename_no_tags(
@@ -189,6 +277,12 @@ class DBRomsHandler(DBBaseHandler):
             .execution_options(synchronize_session="evaluate")
         )
 
+    @begin_session
+    def update_roms(self, data: list[dict], session: Session = None) -> None:
+        """Update several roms at once, each dictionary must include the rom id"""
+        if data:
+            session.execute(update(Rom), data)
+
     @begin_session
     def delete_rom(self, id: int, session: Session = None) -> Rom:
         return session.execute(
@@ -201,23 +295,20 @@ class DBRomsHandler(DBBaseHandler):
     def purge_roms(
         self, platform_id: int, fs_roms: list[str], session: Session = None
     ) -> list[Rom]:
-        purged_roms = (
-            session.scalars(
-                select(Rom)
-                .order_by(Rom.file_name.asc())
-                .where(
-                    and_(Rom.platform_id == platform_id, Rom.file_name.not_in(fs_roms))
-                )
-            )  # type: ignore[attr-defined]
-            .unique()
-            .all()
-        )
-        session.execute(
-            delete(Rom)
-            .where(and_(Rom.platform_id == platform_id, Rom.file_name.not_in(fs_roms)))  # type: ignore[attr-defined]
-            .execution_options(synchronize_session="evaluate")
+        """Delete the roms of a platform whose file is not in `fs_roms`
+
+        The file names are matched against the roms of the platform a bounded
+        batch at a time, so the statements don't grow with the library.
+        """
+        purged_ids = self._find_ids_not_in(
+            Rom,
+            Rom.file_name,
+            fs_roms,
+            Rom.platform_id == platform_id,
+            session=session,
         )
-        return purged_roms
+        purged_roms = self._purge_by_ids(Rom, purged_ids, session=session)
+        return sorted(purged_roms, key=lambda rom: rom.file_name)
 
     @begin_session
     def add_rom_user(
@@ -1,11 +1,13 @@
 from .assets_handler import FSAssetsHandler
 from .firmware_handler import FSFirmwareHandler
+from .hash_cache_handler import FSHashCacheHandler
 from .platforms_handler import FSPlatformsHandler
 from .resources_handler import FSResourcesHandler
 from .roms_handler import FSRomsHandler
 
 fs_asset_handler = FSAssetsHandler()
 fs_firmware_handler = FSFirmwareHandler()
+fs_hash_cache_handler = FSHashCacheHandler()
 fs_platform_handler = FSPlatformsHandler()
 fs_rom_handler = FSRomsHandler()
 fs_resource_handler = FSResourcesHandler()
@@ -109,7 +109,7 @@ class FSHandler:
         cnfg = cm.get_config()
         excluded_extensions = getattr(cnfg, f"EXCLUDED_{filetype.upper()}_EXT")
         excluded_names = getattr(cnfg, f"EXCLUDED_{filetype.upper()}_FILES")
-        excluded_files: list = []
+        excluded_files: set[str] = set()
 
         for file_name in files:
             # Split the file name to get the extension.
@@ -117,13 +117,13 @@ class FSHandler:
 
             # Exclude the file if it has no extension or the extension is in the excluded list.
             if not ext or ext in excluded_extensions:
-                excluded_files.append(file_name)
+                excluded_files.add(file_name)
 
             # Additionally, check if the file name mathes a pattern in the excluded list.
             if len(excluded_names) > 0:
                 for name in excluded_names:
                     if file_name == name or fnmatch.fnmatch(file_name, name):
-                        excluded_files.append(file_name)
+                        excluded_files.add(file_name)
 
         # Return files that are not in the filtered list.
         return [f for f in files if f not in excluded_files]
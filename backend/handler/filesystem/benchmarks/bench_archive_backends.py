@@ -0,0 +1,84 @@
+# python3 -m handler.filesystem.benchmarks.bench_archive_backends --size 64
+"""Compare the hashing throughput of the archive backends for every format.
+
+Builds an archive of each supported format from deterministic payloads, then
+hashes it with every available backend. Throughput is reported in MB/s of
+decompressed data, and hashes must match across backends.
+"""
+
+import argparse
+import hashlib
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from handler.filesystem.roms_handler import (
+    ARCHIVE_BACKEND_COMMANDS,
+    ArchiveBackend,
+    CommandArchiveBackend,
+    FSRomsHandler,
+)
+from utils.hashing import crc32_to_hex
+
+from .payloads import ARCHIVE_FORMATS, build_archive, build_payload
+
+
+def get_backends() -> dict[str, ArchiveBackend]:
+    backends: dict[str, ArchiveBackend] = {"python": ArchiveBackend()}
+    for name, command in ARCHIVE_BACKEND_COMMANDS.items():
+        if shutil.which(command[0]):
+            backends[name] = CommandArchiveBackend(command)
+        else:
+            print(f"Skipping the {name} backend, {command[0]} is not installed")
+    return backends
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=64, help="Rom size in MB")
+    args = parser.parse_args()
+
+    fs_rom_handler = FSRomsHandler()
+    backends = get_backends()
+
+    with tempfile.TemporaryDirectory() as tmp_path:
+        parts = [
+            build_payload(
+                Path(tmp_path, f"part{i}.bin"), args.size * 1024 * 1024 // 3, i
+            )
+            for i in range(3)
+        ]
+        size = sum(part.stat().st_size for part in parts)
+        archives = {
+            archive_format: build_archive(Path(tmp_path), archive_format, parts)
+            for archive_format in ARCHIVE_FORMATS
+        }
+
+        for archive_format, archive_path in archives.items():
+            hashes = set()
+            for backend_name, backend in backends.items():
+                fs_rom_handler.archive_backend = backend
+
+                start = time.perf_counter()
+                crc_c, md5_h, sha1_h = fs_rom_handler._calculate_rom_hashes(
+                    archive_path,
+                    0,
+                    hashlib.md5(usedforsecurity=False),
+                    hashlib.sha1(usedforsecurity=False),
+                )
+                elapsed = time.perf_counter() - start
+
+                hashes.add((crc32_to_hex(crc_c), md5_h.hexdigest(), sha1_h.hexdigest()))
+                print(
+                    f"{archive_format:>4} {backend_name:>10}: "
+                    f"{size / 1024 / 1024 / elapsed:8.1f} MB/s"
+                )
+
+            assert (
+                len(hashes) == 1
+            ), f"Hashes of {archive_format} differ between backends"
+
+
+if __name__ == "__main__":
+    main()
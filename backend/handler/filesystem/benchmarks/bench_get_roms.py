@@ -0,0 +1,163 @@
+# python3 -m handler.filesystem.benchmarks.bench_get_roms --files 100000
+"""Count the filesystem calls made to list the roms of a platform.
+
+Builds a synthetic platform folder and lists it with the previous os.walk
+based enumeration and with `FSRomsHandler.get_roms_from_path`. Calls are
+counted at the `os` module boundary, where each counted call maps to one
+syscall (`DirEntry.stat()` is only counted the first time, as it is cached).
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from collections import Counter
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+
+from handler.filesystem import fs_rom_handler
+from models.rom import RomFile
+from utils.filesystem import iter_directories, iter_files
+
+
+class _CountedDirEntry:
+    def __init__(self, entry: os.DirEntry, counter: Counter) -> None:
+        self._entry = entry
+        self._counter = counter
+        self._stat: os.stat_result | None = None
+
+    def __getattr__(self, name: str):
+        return getattr(self._entry, name)
+
+    def __fspath__(self) -> str:
+        return self._entry.path
+
+    def stat(self, *, follow_symlinks: bool = True) -> os.stat_result:
+        if self._stat is None:
+            self._counter["stat"] += 1
+            self._stat = self._entry.stat(follow_symlinks=follow_symlinks)
+        return self._stat
+
+
+class _CountedScandirIterator:
+    def __init__(self, iterator, counter: Counter) -> None:
+        self._iterator = iterator
+        self._counter = counter
+
+    def __iter__(self) -> Iterator[_CountedDirEntry]:
+        for entry in self._iterator:
+            yield _CountedDirEntry(entry, self._counter)
+
+    def __next__(self) -> _CountedDirEntry:
+        return _CountedDirEntry(next(self._iterator), self._counter)
+
+    def __enter__(self) -> "_CountedScandirIterator":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self._iterator.close()
+
+    def close(self) -> None:
+        self._iterator.close()
+
+
+@contextmanager
+def count_fs_calls() -> Iterator[Counter]:
+    counter: Counter = Counter()
+    original_stat, original_listdir, original_scandir = os.stat, os.listdir, os.scandir
+
+    def counted_stat(*args, **kwargs):
+        counter["stat"] += 1
+        return original_stat(*args, **kwargs)
+
+    def counted_listdir(*args, **kwargs):
+        counter["listdir"] += 1
+        return original_listdir(*args, **kwargs)
+
+    def counted_scandir(*args, **kwargs):
+        counter["scandir"] += 1
+        return _CountedScandirIterator(original_scandir(*args, **kwargs), counter)
+
+    os.stat, os.listdir, os.scandir = counted_stat, counted_listdir, counted_scandir  # type: ignore
+    try:
+        yield counter
+    finally:
+        os.stat, os.listdir, os.scandir = original_stat, original_listdir, original_scandir  # type: ignore
+
+
+def legacy_get_roms(roms_file_path: str) -> list[dict]:
+    """Enumeration used before single pass scandir listing"""
+
+    def build_rom_file(path: Path) -> RomFile:
+        return RomFile(
+            filename=path.name,
+            size=os.stat(path).st_size,
+            last_modified=os.path.getmtime(path),
+        )
+
+    def get_rom_files(rom: str) -> list[RomFile]:
+        if os.path.isdir(f"{roms_file_path}/{rom}"):
+            multi_files = os.listdir(f"{roms_file_path}/{rom}")
+            return [
+                build_rom_file(Path(roms_file_path, rom, file))
+                for file in fs_rom_handler._exclude_files(multi_files, "multi_parts")
+            ]
+        return [build_rom_file(Path(roms_file_path, rom))]
+
+    fs_single_roms = [f for _, f in iter_files(roms_file_path)]
+    fs_multi_roms = [d for _, d in iter_directories(roms_file_path)]
+    fs_roms = [
+        (False, rom) for rom in fs_rom_handler._exclude_files(fs_single_roms, "single")
+    ] + [(True, rom) for rom in fs_rom_handler._exclude_multi_roms(fs_multi_roms)]
+
+    return sorted(
+        [
+            {"multi": multi, "file_name": rom, "files": get_rom_files(rom)}
+            for multi, rom in fs_roms
+        ],
+        key=lambda rom: rom["file_name"],
+    )
+
+
+def build_platform(path: str, files: int, multi_roms: int, parts: int) -> None:
+    for i in range(files - multi_roms * parts):
+        Path(path, f"Game {i:06d}.bin").touch()
+
+    for i in range(multi_roms):
+        rom_path = Path(path, f"Multi Game {i:06d}")
+        rom_path.mkdir()
+        for part in range(parts):
+            Path(rom_path, f"Multi Game {i:06d} (Disc {part + 1}).bin").touch()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=100_000)
+    parser.add_argument("--multi-roms", type=int, default=1_000)
+    parser.add_argument("--parts", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as roms_file_path:
+        build_platform(roms_file_path, args.files, args.multi_roms, args.parts)
+
+        results = {}
+        for name, get_roms in (
+            ("os.walk", legacy_get_roms),
+            ("scandir", fs_rom_handler.get_roms_from_path),
+        ):
+            with count_fs_calls() as counter:
+                start = time.perf_counter()
+                roms = get_roms(roms_file_path)
+                elapsed = time.perf_counter() - start
+            results[name] = roms
+            print(
+                f"{name:>8}: {len(roms)} roms in {elapsed:.2f}s, "
+                f"{sum(counter.values())} calls ({', '.join(f'{k}={v}' for k, v in sorted(counter.items()))})"
+            )
+
+        assert results["os.walk"] == results["scandir"], "Enumerations differ"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""Hashing throughput benchmarks for every rom format, run with:
+
+    pytest handler/filesystem/benchmarks/bench_hashing.py
+
+Each case hashes a deterministic payload with `FSRomsHandler._calculate_rom_hashes`
+in a fresh process, and reports the throughput and the peak RSS that hashing
+added to that process on top of its imports. A case fails when its throughput
+drops below the one stored in hashing_baseline.json. Cases smaller than
+BASELINE_MIN_SIZE_MB are only reported, as their time is mostly fixed setup. Run with ROMM_BENCHMARK_UPDATE_BASELINE=1 to store the
+measured throughputs, scaled down by BASELINE_MARGIN, as the new baseline.
+"""
+
+import hashlib
+import json
+import multiprocessing
+import os
+import resource
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pytest
+
+from .payloads import ARCHIVE_FORMATS, build_archive, build_payload
+
+SIZES_MB = (1, 16, 64)
+ROM_FORMATS = ("plain", *ARCHIVE_FORMATS)
+BASELINE_PATH = Path(__file__).with_name("hashing_baseline.json")
+# Leave room for noisy CI machines when storing a new baseline
+BASELINE_MARGIN = 0.5
+BASELINE_MIN_SIZE_MB = 16
+UPDATE_BASELINE = os.environ.get("ROMM_BENCHMARK_UPDATE_BASELINE", "") == "1"
+
+
+def _reset_peak_rss() -> None:
+    # The peak RSS of a new process starts at the RSS of its parent when forked
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def _get_rss(field: str) -> int:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(f"{field}:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _hash_rom(file_path: str) -> tuple[float, int]:
+    from handler.filesystem import fs_rom_handler
+
+    # Only count the memory used by hashing, not by the imports above
+    _reset_peak_rss()
+    start_rss = _get_rss("VmRSS")
+    start = time.perf_counter()
+    fs_rom_handler._calculate_rom_hashes(
+        Path(file_path),
+        0,
+        hashlib.md5(usedforsecurity=False),
+        hashlib.sha1(usedforsecurity=False),
+    )
+    elapsed = time.perf_counter() - start
+
+    return elapsed, max(_get_rss("VmHWM") - start_rss, 0)
+
+
+@pytest.fixture(scope="module")
+def baseline():
+    baseline = json.loads(BASELINE_PATH.read_text()) if BASELINE_PATH.exists() else {}
+    yield baseline
+
+    if UPDATE_BASELINE:
+        BASELINE_PATH.write_text(json.dumps(baseline, indent=2, sort_keys=True) + "\n")
+
+
+@pytest.fixture(scope="module")
+def payloads(tmp_path_factory):
+    path = tmp_path_factory.mktemp("payloads")
+    return {
+        size_mb: build_payload(path / f"rom-{size_mb}mb.bin", size_mb * 1024 * 1024)
+        for size_mb in SIZES_MB
+    }
+
+
+@pytest.mark.parametrize("size_mb", SIZES_MB)
+@pytest.mark.parametrize("rom_format", ROM_FORMATS)
+def test_hashing_throughput(rom_format, size_mb, payloads, baseline, tmp_path, capsys):
+    payload = payloads[size_mb]
+    rom_path = (
+        payload
+        if rom_format == "plain"
+        else build_archive(tmp_path, rom_format, [payload])
+    )
+
+    # A fresh process per case, so the peak RSS only belongs to this hashing path
+    with ProcessPoolExecutor(
+        max_workers=1, mp_context=multiprocessing.get_context("spawn")
+    ) as executor:
+        elapsed, peak_rss = executor.submit(_hash_rom, str(rom_path)).result()
+
+    throughput = size_mb / elapsed
+    with capsys.disabled():
+        print(
+            f"\n{rom_format:>5} {size_mb:>3} MB: {throughput:8.1f} MB/s, "
+            f"peak RSS +{peak_rss / 1024 / 1024:6.1f} MB"
+        )
+
+    case = f"{rom_format}-{size_mb}mb"
+    if size_mb < BASELINE_MIN_SIZE_MB:
+        return
+
+    if UPDATE_BASELINE:
+        baseline[case] = round(throughput * BASELINE_MARGIN, 1)
+    elif case in baseline:
+        assert (
+            throughput >= baseline[case]
+        ), f"{case} hashed at {throughput:.1f} MB/s, below the {baseline[case]} MB/s baseline"
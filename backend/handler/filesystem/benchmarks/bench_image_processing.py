@@ -0,0 +1,93 @@
+# python3 -m handler.filesystem.benchmarks.bench_image_processing --uploads 16
+"""Measure event loop latency while covers are processed during concurrent uploads.
+
+Stores the same uploaded cover concurrently, once with Pillow called directly
+from the coroutines (as the endpoints used to) and once through the
+`ImageHandler` worker pool. A probe task sleeps for a fixed interval in a loop
+and records how late it wakes up, which is how long the event loop was blocked.
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import tempfile
+import time
+from io import BytesIO
+from pathlib import Path
+
+from handler.image_handler import ImageHandler, _store_artwork
+from PIL import Image
+
+PROBE_INTERVAL = 0.005
+
+
+def build_cover(width: int, height: int) -> bytes:
+    rng = random.Random(0)
+    img = Image.frombytes("RGB", (width, height), rng.randbytes(width * height * 3))
+    content = BytesIO()
+    img.save(content, format="PNG")
+    return content.getvalue()
+
+
+async def probe_latency(lags: list[float], stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(PROBE_INTERVAL)
+        lags.append(time.perf_counter() - start - PROBE_INTERVAL)
+
+
+async def run_uploads(
+    mode: str, content: bytes, uploads: int, workers: int, tmp_path: Path
+) -> tuple[float, list[float]]:
+    image_handler = ImageHandler(max_workers=workers, max_pending=uploads)
+
+    async def upload(idx: int) -> None:
+        cover_path = str(tmp_path / f"{mode}-{idx}-big.png")
+        small_cover_path = str(tmp_path / f"{mode}-{idx}-small.png")
+        if mode == "inline":
+            _store_artwork(content, cover_path, small_cover_path)
+        else:
+            await image_handler.store_artwork(content, cover_path, small_cover_path)
+
+    lags: list[float] = []
+    stop = asyncio.Event()
+    probe = asyncio.create_task(probe_latency(lags, stop))
+    await asyncio.sleep(PROBE_INTERVAL * 2)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(upload(idx) for idx in range(uploads)))
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    await probe
+    image_handler.shutdown()
+    return elapsed, lags
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--uploads", type=int, default=16, help="Concurrent uploads")
+    parser.add_argument("--workers", type=int, default=2, help="Image workers")
+    parser.add_argument("--width", type=int, default=1200, help="Cover width")
+    parser.add_argument("--height", type=int, default=1600, help="Cover height")
+    args = parser.parse_args()
+
+    content = build_cover(args.width, args.height)
+
+    with tempfile.TemporaryDirectory() as tmp_path:
+        for mode in ("inline", "pool"):
+            elapsed, lags = asyncio.run(
+                run_uploads(mode, content, args.uploads, args.workers, Path(tmp_path))
+            )
+            lags_ms = sorted(lag * 1000 for lag in lags) or [0.0]
+            print(
+                f"{mode:>6}: {elapsed:6.2f}s total, loop lag "
+                f"p50 {statistics.median(lags_ms):7.1f} ms, "
+                f"p99 {lags_ms[int(len(lags_ms) * 0.99)]:7.1f} ms, "
+                f"max {lags_ms[-1]:7.1f} ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
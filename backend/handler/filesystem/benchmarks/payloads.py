@@ -0,0 +1,54 @@
+import bz2
+import random
+import tarfile
+import zipfile
+from pathlib import Path
+
+import py7zr
+
+# Small enough for the smallest payloads to mix random and zeroed blocks
+BLOCK_SIZE = 256 * 1024
+ARCHIVE_FORMATS = ("zip", "tar", "gz", "bz2", "7z")
+
+
+def build_payload(path: Path, size: int, seed: int = 0) -> Path:
+    """Write a deterministic rom payload of alternating random and zeroed blocks,
+    starting with a random one, so archives built from it are partially compressible"""
+    rng = random.Random(seed)
+    with open(path, "wb") as f:
+        written = 0
+        block = 0
+        while written < size:
+            length = min(BLOCK_SIZE, size - written)
+            f.write(bytes(length) if block % 2 else rng.randbytes(length))
+            written += length
+            block += 1
+    return path
+
+
+def build_archive(path: Path, archive_format: str, parts: list[Path]) -> Path:
+    """Build an archive of the given format with the parts, in order"""
+    if archive_format == "zip":
+        archive_path = path / "rom.zip"
+        with zipfile.ZipFile(archive_path, "w", zipfile.ZIP_DEFLATED) as z:
+            for part in parts:
+                z.write(part, part.name)
+    elif archive_format in ("tar", "gz"):
+        archive_path = path / ("rom.tar" if archive_format == "tar" else "rom.tar.gz")
+        with tarfile.open(archive_path, "w" if archive_format == "tar" else "w:gz") as t:  # type: ignore
+            for part in parts:
+                t.add(part, part.name)
+    elif archive_format == "bz2":
+        archive_path = path / "rom.bin.bz2"
+        with bz2.open(archive_path, "wb") as b:
+            for part in parts:
+                b.write(part.read_bytes())
+    elif archive_format == "7z":
+        archive_path = path / "rom.7z"
+        with py7zr.SevenZipFile(archive_path, "w") as archive:
+            for part in parts:
+                archive.write(part, part.name)
+    else:
+        raise ValueError(f"Unknown archive format {archive_format}")
+
+    return archive_path
@@ -0,0 +1,141 @@
+import json
+import os
+import stat
+from collections.abc import Iterable
+from dataclasses import dataclass
+from typing import Final
+
+from handler.redis_handler import sync_cache
+
+ROM_HASHES_CACHE_KEY: Final = "romm:rom_hashes"
+FIRMWARE_HASHES_CACHE_KEY: Final = "romm:firmware_hashes"
+DEFERRED_ROM_HASHES_KEY: Final = "romm:deferred_rom_hashes"
+
+
+@dataclass
+class HashCacheStats:
+    hits: int = 0
+    misses: int = 0
+
+
+def _stat_identity(file_stat: os.stat_result) -> list[int]:
+    return [
+        file_stat.st_size,
+        file_stat.st_mtime_ns,
+        file_stat.st_ino,
+        file_stat.st_dev,
+    ]
+
+
+class FSHashCacheHandler:
+    """Persistent cache of file hashes, keyed on the file identity.
+
+    Entries are stored in redis by absolute file path, along with the identity
+    (size, mtime_ns, inode and device) of the file when it was hashed. A cached
+    entry is only returned if the identity of the file still matches.
+
+    Hashes of disc images are also stored with the fingerprint of their contents,
+    so they're not calculated again when an image is touched but its contents
+    didn't change. Fingerprints are only compared for the same path, the hashes
+    of a file are never reused for another one.
+    """
+
+    def __init__(self) -> None:
+        self.stats = HashCacheStats()
+
+    @staticmethod
+    def get_file_identity(file_path: str) -> list:
+        """Build the identity of a file, or of every file in a multi-part rom folder
+
+        Args:
+            file_path: absolute path to the file or folder
+        Returns
+            JSON serializable identity of the file
+        """
+        file_stat = os.stat(file_path)
+        if not stat.S_ISDIR(file_stat.st_mode):
+            return _stat_identity(file_stat)
+
+        with os.scandir(file_path) as entries:
+            return sorted(
+                [entry.name, *_stat_identity(entry.stat())] for entry in entries
+            )
+
+    def get_hashes(
+        self, cache_key: str, file_path: str, identity: list
+    ) -> dict[str, str] | None:
+        cache_entry = sync_cache.hget(cache_key, file_path)
+        if cache_entry:
+            cache_json = json.loads(cache_entry)
+            if cache_json.get("identity") == identity:
+                self.stats.hits += 1
+                return cache_json["hashes"]
+
+        self.stats.misses += 1
+        return None
+
+    def set_hashes(
+        self,
+        cache_key: str,
+        file_path: str,
+        identity: list,
+        hashes: dict[str, str],
+        fingerprint: str | None = None,
+    ) -> None:
+        cache_entry: dict = {"identity": identity, "hashes": hashes}
+        if fingerprint:
+            cache_entry["fingerprint"] = fingerprint
+
+        sync_cache.hset(cache_key, file_path, json.dumps(cache_entry))
+
+    def get_fingerprint_hashes(
+        self, cache_key: str, file_path: str, fingerprint: str
+    ) -> dict[str, str] | None:
+        """Get the hashes of a file whose identity changed, if its contents didn't"""
+        cache_entry = sync_cache.hget(cache_key, file_path)
+        if cache_entry:
+            cache_json = json.loads(cache_entry)
+            if cache_json.get("fingerprint") == fingerprint:
+                return cache_json["hashes"]
+
+        return None
+
+    def invalidate(self, cache_key: str, file_paths: Iterable[str]) -> None:
+        file_paths = list(file_paths)
+        if file_paths:
+            sync_cache.hdel(cache_key, *file_paths)
+
+    def move(self, cache_key: str, old_file_path: str, new_file_path: str) -> None:
+        """Keep the cached hashes of a renamed file, whose identity doesn't change"""
+        cache_entry = sync_cache.hget(cache_key, old_file_path)
+        if not cache_entry:
+            return
+
+        with sync_cache.pipeline() as pipe:
+            pipe.hset(cache_key, new_file_path, cache_entry)
+            pipe.hdel(cache_key, old_file_path)
+            pipe.execute()
+
+    def clear(self, cache_key: str) -> None:
+        sync_cache.delete(cache_key)
+
+    def defer_rom_hashes(
+        self, file_path: str, platform_id: int, file_name: str
+    ) -> None:
+        """Track a rom whose md5 and sha1 hashes are calculated later"""
+        sync_cache.hset(
+            DEFERRED_ROM_HASHES_KEY,
+            file_path,
+            json.dumps({"platform_id": platform_id, "file_name": file_name}),
+        )
+
+    def pop_deferred_rom_hashes(self) -> list[dict]:
+        with sync_cache.pipeline() as pipe:
+            pipe.hvals(DEFERRED_ROM_HASHES_KEY)
+            pipe.delete(DEFERRED_ROM_HASHES_KEY)
+            deferred_roms, _ = pipe.execute()
+
+        return [json.loads(deferred_rom) for deferred_rom in deferred_roms]
+
+    def reset_stats(self) -> None:
+        self.stats = HashCacheStats()
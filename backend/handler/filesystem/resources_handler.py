@@ -1,17 +1,61 @@
+import asyncio
+import hashlib
+import os
 import shutil
+import time
+import weakref
+from collections.abc import AsyncIterator, Iterable
+from contextlib import asynccontextmanager
+from typing import Final
+from uuid import uuid4
 
 import httpx
-from anyio import Path, open_file
-from config import RESOURCES_BASE_PATH
+from anyio import Path
+from config import (
+    RESOURCES_BASE_PATH,
+    SCAN_ARTWORK_CONCURRENCY,
+    SCAN_ARTWORK_CONCURRENCY_PER_HOST,
+)
 from fastapi import HTTPException, status
+from handler.image_handler import image_handler
+from handler.redis_handler import sync_cache
 from logger.logger import log
 from models.collection import Collection
 from models.rom import Rom
-from PIL import Image, ImageFile
 from utils.context import ctx_httpx_client
 
 from .base_handler import CoverSize, FSHandler
 
+# Downloaded covers and screenshots are stored once, named after their content
+RESOURCES_STORE_DIR: Final = "store"
+RESOURCES_URLS_KEY: Final = "romm:resources_urls"
+# Store files downloaded or reused this recently may be about to be referenced by
+# a rom that isn't stored yet, so they are only removed once this many seconds old
+RESOURCES_REMOVAL_GRACE_PERIOD: Final = 60 * 60
+RESOURCES_PENDING_REMOVAL_KEY: Final = "romm:resources_pending_removal"
+
+# Download limits, per event loop since asyncio semaphores can't be shared across loops
+_artwork_semaphores: weakref.WeakKeyDictionary[
+    asyncio.AbstractEventLoop, tuple[asyncio.Semaphore, dict[str, asyncio.Semaphore]]
+] = weakref.WeakKeyDictionary()
+
+
+@asynccontextmanager
+async def artwork_download_slot(url: str) -> AsyncIterator[None]:
+    """Wait for a free artwork download slot, both globally and for the url host"""
+    loop = asyncio.get_running_loop()
+    if loop not in _artwork_semaphores:
+        _artwork_semaphores[loop] = (asyncio.Semaphore(SCAN_ARTWORK_CONCURRENCY), {})
+    global_semaphore, host_semaphores = _artwork_semaphores[loop]
+
+    host = httpx.URL(url).host
+    if host not in host_semaphores:
+        host_semaphores[host] = asyncio.Semaphore(SCAN_ARTWORK_CONCURRENCY_PER_HOST)
+
+    # Take the host slot first so busy hosts don't hold global slots while waiting
+    async with host_semaphores[host], global_semaphore:
+        yield
+
 
 class FSResourcesHandler(FSHandler):
     @staticmethod
@@ -19,12 +63,17 @@ class FSResourcesHandler(FSHandler):
         """Check if rom cover exists in filesystem
 
         Args:
-            fs_slug: short name of the platform
-            rom_name: name of rom file
+            entity: rom or collection the cover belongs to
             size: size of the cover
         Returns
             True if cover exists in filesystem else False
         """
+        path_cover = (
+            entity.path_cover_s if size == CoverSize.SMALL else entity.path_cover_l
+        )
+        if path_cover and path_cover.startswith(f"{RESOURCES_STORE_DIR}/"):
+            return await Path(f"{RESOURCES_BASE_PATH}/{path_cover}").exists()
+
         async for _ in Path(
             f"{RESOURCES_BASE_PATH}/{entity.fs_resources_path}/cover"
         ).glob(f"{size.value}.*"):
@@ -33,66 +82,147 @@ class FSResourcesHandler(FSHandler):
         return False
 
     @staticmethod
-    def resize_cover_to_small(cover: ImageFile.ImageFile, save_path: Path) -> None:
-        """Resize cover to small size, and save it to filesystem."""
-        if cover.height >= 1000:
-            ratio = 0.2
-        else:
-            ratio = 0.4
-        small_width = int(cover.width * ratio)
-        small_height = int(cover.height * ratio)
-        small_size = (small_width, small_height)
-        small_img = cover.resize(small_size)
-        small_img.save(save_path)
-
-    async def _store_cover(
-        self, entity: Rom | Collection, url_cover: str, size: CoverSize
-    ) -> None:
-        """Store roms resources in filesystem
+    def _touch_resource(path: str) -> bool:
+        """Mark a store file as just used, so it isn't removed during its grace period
+
+        Returns
+            True if the file is still stored
+        """
+        try:
+            os.utime(f"{RESOURCES_BASE_PATH}/{path}")
+        except FileNotFoundError:
+            return False
+        return True
+
+    def _get_stored_resource(self, url: str) -> str:
+        """Returns the store path of a previously downloaded url, if still stored"""
+        path = sync_cache.hget(RESOURCES_URLS_KEY, url)
+        if not path:
+            return ""
+
+        path = path.decode() if isinstance(path, bytes) else path
+        if not self._touch_resource(path):
+            return ""
+        return path
+
+    async def _download_resource(self, url: str, file_ext: str) -> str:
+        """Download a resource into the content-addressed store
+
+        The file is named after the SHA1 of its content, so identical images
+        downloaded from different urls are only stored once.
 
         Args:
-            fs_slug: short name of the platform
-            rom_name: name of rom file
-            url_cover: url to get the cover
-            size: size of the cover
+            url: url to get the resource
+            file_ext: extension to store the resource with
+        Returns
+            Path of the resource relative to the resources folder, empty if it
+            couldn't be downloaded
         """
-        cover_path = Path(f"{RESOURCES_BASE_PATH}/{entity.fs_resources_path}/cover")
-        cover_file = cover_path / Path(f"{size.value}.png")
+        store_path = Path(f"{RESOURCES_BASE_PATH}/{RESOURCES_STORE_DIR}")
+        await store_path.mkdir(parents=True, exist_ok=True)
+        tmp_file = store_path / Path(f".{uuid4().hex}.tmp")
+        sha1_h = hashlib.sha1(usedforsecurity=False)
 
         httpx_client = ctx_httpx_client.get()
         try:
-            async with httpx_client.stream("GET", url_cover, timeout=120) as response:
-                if response.status_code == 200:
-                    await cover_path.mkdir(parents=True, exist_ok=True)
-                    async with await cover_file.open("wb") as f:
-                        async for chunk in response.aiter_raw():
-                            await f.write(chunk)
+            async with (
+                artwork_download_slot(url),
+                httpx_client.stream("GET", url, timeout=120) as response,
+            ):
+                if response.status_code != 200:
+                    log.warning(
+                        f"Unable to fetch resource at {url}: HTTP {response.status_code}"
+                    )
+                    return ""
+
+                async with await tmp_file.open("wb") as f:
+                    async for chunk in response.aiter_raw():
+                        sha1_h.update(chunk)
+                        await f.write(chunk)
+
+            content_hash = sha1_h.hexdigest()
+            path = f"{RESOURCES_STORE_DIR}/{content_hash[:2]}/{content_hash}.{file_ext}"
+            resource_file = Path(f"{RESOURCES_BASE_PATH}/{path}")
+            await resource_file.parent.mkdir(parents=True, exist_ok=True)
+            # Replacing is atomic, and an existing file already has the same content
+            await tmp_file.replace(resource_file)
         except httpx.NetworkError as exc:
             raise HTTPException(
                 status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-                detail=f"Unable to fetch cover at {url_cover}: {str(exc)}",
+                detail=f"Unable to fetch resource at {url}: {str(exc)}",
             ) from exc
         except httpx.ProtocolError:
-            log.warning(f"Failure writing cover {url_cover} to file (ProtocolError)")
+            log.warning(f"Failure writing resource {url} to file (ProtocolError)")
+            return ""
+        finally:
+            # Only left behind when the download failed, timed out or was cancelled,
+            # removed synchronously so a cancellation can't interrupt it
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+
+        sync_cache.hset(RESOURCES_URLS_KEY, url, path)
+        return path
+
+    async def _store_cover(self, url_cover: str) -> tuple[str, str]:
+        """Store both sizes of a cover, downloading it only if it isn't stored yet
 
-        if size == CoverSize.SMALL:
-            with Image.open(cover_file) as img:
-                self.resize_cover_to_small(img, save_path=cover_file)
+        The small cover is resized from the stored big one.
+
+        Args:
+            url_cover: url to get the cover
+        Returns
+            Tuple with the small and big cover paths, empty if the cover
+            couldn't be downloaded
+        """
+        path_cover_l = self._get_stored_resource(
+            url_cover
+        ) or await self._download_resource(url_cover, "png")
+        if not path_cover_l:
+            return "", ""
+
+        path_cover_s = (
+            f"{path_cover_l.removesuffix('.png')}_{CoverSize.SMALL.value}.png"
+        )
+        if not self._touch_resource(path_cover_s):
+            # Resized next to it first, as other roms may share the same cover
+            tmp_small_cover_file = (
+                f"{RESOURCES_BASE_PATH}/{RESOURCES_STORE_DIR}/.{uuid4().hex}.png"
+            )
+            try:
+                await image_handler.store_small_cover(
+                    f"{RESOURCES_BASE_PATH}/{path_cover_l}", tmp_small_cover_file
+                )
+                os.replace(
+                    tmp_small_cover_file, f"{RESOURCES_BASE_PATH}/{path_cover_s}"
+                )
+            finally:
+                if os.path.exists(tmp_small_cover_file):
+                    os.remove(tmp_small_cover_file)
+
+        return path_cover_s, path_cover_l
 
     @staticmethod
-    async def _get_cover_path(entity: Rom | Collection, size: CoverSize) -> str:
-        """Returns rom cover filesystem path adapted to frontend folder structure
+    async def _get_cover_paths(entity: Rom | Collection) -> tuple[str, str]:
+        """Returns the small and big cover filesystem paths adapted to frontend folder structure
 
         Args:
-            fs_slug: short name of the platform
-            file_name: name of rom file
-            size: size of the cover
+            entity: rom or collection the cover belongs to
+        Returns
+            Tuple with the small and big cover paths, empty if they don't exist
         """
-        async for matched_file in Path(
-            f"{RESOURCES_BASE_PATH}/{entity.fs_resources_path}/cover"
-        ).glob(f"{size.value}.*"):
-            return str(matched_file.relative_to(RESOURCES_BASE_PATH))
-        return ""
+        cover_paths = {CoverSize.SMALL: "", CoverSize.BIG: ""}
+        cover_path = Path(f"{RESOURCES_BASE_PATH}/{entity.fs_resources_path}/cover")
+        try:
+            async for matched_file in cover_path.iterdir():
+                for size, path in cover_paths.items():
+                    if not path and matched_file.name.startswith(f"{size.value}."):
+                        cover_paths[size] = str(
+                            matched_file.relative_to(RESOURCES_BASE_PATH)
+                        )
+        except FileNotFoundError:
+            pass
+
+        return cover_paths[CoverSize.SMALL], cover_paths[CoverSize.BIG]
 
     async def get_cover(
         self, entity: Rom | Collection | None, overwrite: bool, url_cover: str = ""
@@ -100,27 +230,17 @@ class FSResourcesHandler(FSHandler):
         if not entity:
             return "", ""
 
-        small_cover_exists = await self.cover_exists(entity, CoverSize.SMALL)
-        if url_cover and (overwrite or not small_cover_exists):
-            await self._store_cover(entity, url_cover, CoverSize.SMALL)
-            small_cover_exists = await self.cover_exists(entity, CoverSize.SMALL)
-        path_cover_s = (
-            (await self._get_cover_path(entity, CoverSize.SMALL))
-            if small_cover_exists
-            else ""
-        )
+        if not overwrite:
+            path_cover_s, path_cover_l = await self._get_cover_paths(entity)
+            if (path_cover_s and path_cover_l) or not url_cover:
+                return path_cover_s, path_cover_l
 
-        big_cover_exists = await self.cover_exists(entity, CoverSize.BIG)
-        if url_cover and (overwrite or not big_cover_exists):
-            await self._store_cover(entity, url_cover, CoverSize.BIG)
-            big_cover_exists = await self.cover_exists(entity, CoverSize.BIG)
-        path_cover_l = (
-            (await self._get_cover_path(entity, CoverSize.BIG))
-            if big_cover_exists
-            else ""
-        )
+        if url_cover:
+            path_cover_s, path_cover_l = await self._store_cover(url_cover)
+            if path_cover_s and path_cover_l:
+                return path_cover_s, path_cover_l
 
-        return path_cover_s, path_cover_l
+        return await self._get_cover_paths(entity)
 
     @staticmethod
     def remove_cover(entity: Rom | Collection | None):
@@ -150,56 +270,129 @@ class FSResourcesHandler(FSHandler):
 
         return path_cover_l, path_cover_s, artwork_path
 
-    @staticmethod
-    async def _store_screenshot(rom: Rom, url: str, idx: int):
-        """Store roms resources in filesystem
+    async def _store_screenshot(self, url: str) -> str:
+        """Store a screenshot, downloading it only if it isn't stored yet
 
         Args:
-            fs_slug: short name of the platform
-            file_name: name of rom
             url: url to get the screenshot
+        Returns
+            Path of the screenshot relative to the resources folder
         """
-        screenshot_file = f"{idx}.jpg"
-        screenshot_path = f"{RESOURCES_BASE_PATH}/{rom.fs_resources_path}/screenshots"
+        return self._get_stored_resource(url) or await self._download_resource(
+            url, "jpg"
+        )
 
-        httpx_client = ctx_httpx_client.get()
-        try:
-            async with httpx_client.stream("GET", url, timeout=120) as response:
-                if response.status_code == 200:
-                    await Path(screenshot_path).mkdir(parents=True, exist_ok=True)
-                    async with await open_file(
-                        f"{screenshot_path}/{screenshot_file}", "wb"
-                    ) as f:
-                        async for chunk in response.aiter_raw():
-                            await f.write(chunk)
-        except httpx.NetworkError as exc:
-            raise HTTPException(
-                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-                detail=f"Unable to fetch screenshot at {url}: {str(exc)}",
-            ) from exc
-        except httpx.ProtocolError:
-            log.warning(f"Failure writing screenshot {url} to file (ProtocolError)")
+    async def get_rom_screenshots(
+        self, rom: Rom | None, url_screenshots: list, previous_rom: Rom | None = None
+    ) -> list[str]:
+        """Store the screenshots of a rom, keeping one path per url in the same order
 
-    @staticmethod
-    def _get_screenshot_path(rom: Rom, idx: str):
-        """Returns rom cover filesystem path adapted to frontend folder structure
+        A screenshot that can't be fetched keeps the path the rom previously had for
+        the same url at the same position, or an empty path otherwise, so the ones
+        after it don't shift.
 
         Args:
-            fs_slug: short name of the platform
-            file_name: name of rom
-            idx: index number of screenshot
+            rom: rom the screenshots belong to
+            url_screenshots: urls to get the screenshots
+            previous_rom: stored version of the rom, defaults to the rom itself
+        Returns
+            Paths of the screenshots relative to the resources folder
         """
-        return f"{rom.fs_resources_path}/screenshots/{idx}.jpg"
-
-    async def get_rom_screenshots(
-        self, rom: Rom | None, url_screenshots: list
-    ) -> list[str]:
         if not rom:
             return []
 
+        previous_rom = previous_rom or rom
+        previous_urls = previous_rom.url_screenshots or []
+        previous_paths = previous_rom.path_screenshots or []
+
+        # Screenshots are fetched concurrently, within the artwork download limits
+        results = await asyncio.gather(
+            *(self._store_screenshot(url) for url in url_screenshots),
+            return_exceptions=True,
+        )
+
         path_screenshots: list[str] = []
-        for idx, url in enumerate(url_screenshots):
-            await self._store_screenshot(rom, url, idx)
-            path_screenshots.append(self._get_screenshot_path(rom, str(idx)))
+        for idx, (url, result) in enumerate(zip(url_screenshots, results, strict=True)):
+            if isinstance(result, asyncio.CancelledError):
+                raise result
+            if isinstance(result, BaseException):
+                log.warning(
+                    f"Failure fetching screenshot {url}: "
+                    f"{getattr(result, 'detail', result)}"
+                )
+                result = ""
+            if (
+                not result
+                and idx < len(previous_urls)
+                and idx < len(previous_paths)
+                and previous_urls[idx] == url
+            ):
+                result = previous_paths[idx]
+            path_screenshots.append(result)
 
         return path_screenshots
+
+    @staticmethod
+    def get_stored_resources(entity: Rom | Collection | None) -> set[str]:
+        """Returns the paths of the store resources referenced by a rom or collection"""
+        if not entity:
+            return set()
+
+        paths = [entity.path_cover_s, entity.path_cover_l]
+        if isinstance(entity, Rom):
+            paths += entity.path_screenshots or []
+        return {
+            path
+            for path in paths
+            if path and path.startswith(f"{RESOURCES_STORE_DIR}/")
+        }
+
+    @staticmethod
+    def remove_resources(paths: Iterable[str]) -> None:
+        """Remove resources from the store, once nothing references them anymore
+
+        Resources still in their grace period are kept, and left pending until
+        `pop_pending_resources` hands them back to be checked again.
+
+        Args:
+            paths: paths of the resources relative to the resources folder
+        """
+        pending_paths = []
+        for path in paths:
+            if not path.startswith(f"{RESOURCES_STORE_DIR}/"):
+                continue
+            resource_file = f"{RESOURCES_BASE_PATH}/{path}"
+            try:
+                if (
+                    time.time() - os.path.getmtime(resource_file)
+                    < RESOURCES_REMOVAL_GRACE_PERIOD
+                ):
+                    pending_paths.append(path)
+                    continue
+                os.remove(resource_file)
+            except FileNotFoundError:
+                pass
+
+        if pending_paths:
+            sync_cache.sadd(RESOURCES_PENDING_REMOVAL_KEY, *pending_paths)
+
+    @staticmethod
+    def pop_pending_resources() -> set[str]:
+        """Returns the resources whose removal was put off by their grace period"""
+        with sync_cache.pipeline() as pipe:
+            pipe.smembers(RESOURCES_PENDING_REMOVAL_KEY)
+            pipe.delete(RESOURCES_PENDING_REMOVAL_KEY)
+            paths, _ = pipe.execute()
+
+        return {path.decode() if isinstance(path, bytes) else path for path in paths}
+
+    @staticmethod
+    def remove_legacy_resources(rom: Rom) -> None:
+        """Remove the cover and screenshots downloaded into the folder of a rom before
+        the store existed, once the rom doesn't reference them anymore"""
+        paths = [rom.path_cover_s, rom.path_cover_l, *(rom.path_screenshots or [])]
+        for folder in ("cover", "screenshots"):
+            folder_path = f"{rom.fs_resources_path}/{folder}"
+            if any(path and path.startswith(f"{folder_path}/") for path in paths):
+                continue
+            shutil.rmtree(f"{RESOURCES_BASE_PATH}/{folder_path}", ignore_errors=True)
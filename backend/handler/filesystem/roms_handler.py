@@ -4,18 +4,22 @@ import hashlib
 import os
 import re
 import shutil
+import struct
+import subprocess  # nosec B404
 import tarfile
 import zipfile
 from collections.abc import Callable, Iterator
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Any, Final, TypedDict
 
 import magic
 import py7zr
 import zipfile_deflate64  # trunk-ignore(ruff/F401): Patches zipfile to support deflate64 compression
-from config import LIBRARY_BASE_PATH
+from config import LIBRARY_BASE_PATH, SCAN_ARCHIVE_BACKEND
 from config.config_manager import config_manager as cm
 from exceptions.fs_exceptions import RomAlreadyExistsException, RomsNotFoundException
+from logger.logger import log
 from models.rom import RomFile
 from py7zr.exceptions import (
     Bad7zFile,
@@ -24,8 +28,10 @@ from py7zr.exceptions import (
     UnsupportedCompressionMethodError,
 )
 from utils.archive_7zip import CallbackIOFactory
-from utils.filesystem import iter_directories, iter_files
-from utils.hashing import crc32_to_hex
+from utils.disc_image import ISO_SECTOR_SIZE, ISOImage, read_chd_sha1
+from utils.filesystem import scan_directory
+from utils.hashing import crc32_combine, crc32_to_hex
+from utils.rom_headers import ROM_HEADER_READERS, RomHeader, read_rom_header
 
 from .base_handler import (
     LANGUAGES_BY_SHORTCODE,
@@ -59,6 +65,15 @@ COMPRESSED_FILE_EXTENSIONS = frozenset(
 )
 
 FILE_READ_CHUNK_SIZE = 1024 * 8
+LARGE_FILE_READ_CHUNK_SIZE = 1024 * 1024 * 8
+
+# Disc images that can be identified without reading them whole
+DISC_IMAGE_EXTENSIONS: Final = frozenset((".bin", ".chd", ".gcm", ".img", ".iso"))
+# Smaller images are hashed whole, which is about as fast as fingerprinting them
+DISC_FINGERPRINT_MIN_SIZE: Final = 1024 * 1024 * 64
+# Blocks read across the image, so dumps that only differ in their data don't collide
+DISC_FINGERPRINT_SAMPLES: Final = 8
+DISC_FINGERPRINT_SAMPLE_SIZE: Final = 1024 * 64
 
 
 class FSRom(TypedDict):
@@ -67,6 +82,16 @@ class FSRom(TypedDict):
     files: list[RomFile]
 
 
+class RomFingerprint(TypedDict):
+    key: str
+
+
+class ArchiveMember(TypedDict):
+    filename: str
+    size: int
+    crc32: int
+
+
 def is_compressed_file(file_path: str) -> bool:
     mime = magic.Magic(mime=True)
     file_type = mime.from_file(file_path)
@@ -82,6 +107,46 @@ def read_basic_file(file_path: Path) -> Iterator[bytes]:
             yield chunk
 
 
+def hash_basic_file(file_path: Path, crc_c: int, md5_h: Any, sha1_h: Any) -> int:
+    """Hash an uncompressed file, reading it in large chunks into reusable buffers.
+
+    md5, sha1 and crc32 release the GIL on large inputs, so each chunk is hashed
+    by all three in parallel threads while the next chunk is read into a second
+    buffer. md5 and sha1 are updated in place, and the updated crc32 is returned.
+    """
+
+    with open(file_path, "rb", buffering=0) as f:
+        # Small files are read at once, as threads would only add overhead
+        if os.fstat(f.fileno()).st_size <= LARGE_FILE_READ_CHUNK_SIZE:
+            data = f.read()
+            md5_h.update(data)
+            sha1_h.update(data)
+            return binascii.crc32(data, crc_c)
+
+        buffers = (
+            bytearray(LARGE_FILE_READ_CHUNK_SIZE),
+            bytearray(LARGE_FILE_READ_CHUNK_SIZE),
+        )
+        current = 0
+        size = f.readinto(buffers[current])
+
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            while size:
+                chunk = memoryview(buffers[current])[:size]
+                md5_future = executor.submit(md5_h.update, chunk)
+                sha1_future = executor.submit(sha1_h.update, chunk)
+                crc_future = executor.submit(binascii.crc32, chunk, crc_c)
+
+                current ^= 1
+                size = f.readinto(buffers[current])
+
+                md5_future.result()
+                sha1_future.result()
+                crc_c = crc_future.result()
+
+    return crc_c
+
+
 def read_zip_file(file_path: Path) -> Iterator[bytes]:
     try:
         with zipfile.ZipFile(file_path, "r") as z:
@@ -154,6 +219,71 @@ def process_7z_file(
             fn_hash_update(chunk)
 
 
+def read_zip_members(file_path: Path) -> list[ArchiveMember] | None:
+    """Read the size and crc32 of every file in a zip from its central directory"""
+    try:
+        with zipfile.ZipFile(file_path, "r") as z:
+            return [
+                ArchiveMember(
+                    filename=info.filename, size=info.file_size, crc32=info.CRC
+                )
+                for info in z.infolist()
+                if not info.is_dir()
+            ]
+    except zipfile.BadZipFile:
+        return None
+
+
+def read_7z_members(file_path: Path) -> list[ArchiveMember] | None:
+    """Read the size and crc32 of every file in a 7zip from its header"""
+    try:
+        with py7zr.SevenZipFile(file_path, mode="r") as archive:
+            files = [f for f in archive.list() if not f.is_directory]
+    except (Bad7zFile, PasswordRequired):
+        return None
+
+    # Empty files have no stored crc32, any other missing crc32 can't be trusted
+    if any(f.crc32 is None and f.uncompressed for f in files):
+        return None
+
+    return [
+        ArchiveMember(filename=f.filename, size=f.uncompressed, crc32=f.crc32 or 0)
+        for f in files
+    ]
+
+
+def read_7z_file_with_command(command: list[str], file_path: Path) -> Iterator[bytes]:
+    """Stream the decompressed files of a 7zip file from a native decompressor.
+
+    The command must write the contents of every file in the archive to stdout in
+    archive order, which is the order py7zr extracts them in, so the calculated
+    hashes match.
+    """
+    read_any = False
+    with subprocess.Popen(  # nosec B603
+        [*command, str(file_path)],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+    ) as process:
+        assert process.stdout is not None  # nosec B101
+        while chunk := process.stdout.read(LARGE_FILE_READ_CHUNK_SIZE):
+            read_any = True
+            yield chunk
+        returncode = process.wait()
+
+    if returncode == 0:
+        return
+
+    # Hashes are already updated with partial contents, so they can't be recovered
+    if read_any:
+        raise Bad7zFile(f"{command[0]} failed to decompress {file_path}")
+
+    # Same as py7zr, treat files that can't be opened as regular files
+    for chunk in read_basic_file(file_path):
+        yield chunk
+
+
 def read_bz2_file(file_path: Path) -> Iterator[bytes]:
     try:
         with bz2.BZ2File(file_path, "rb") as f:
@@ -164,9 +294,76 @@ def read_bz2_file(file_path: Path) -> Iterator[bytes]:
             yield chunk
 
 
+class ArchiveBackend:
+    """Reads the decompressed contents of the files in an archive, in archive order"""
+
+    def read_zip_file(self, file_path: Path) -> Iterator[bytes]:
+        return read_zip_file(file_path)
+
+    def read_tar_file(self, file_path: Path) -> Iterator[bytes]:
+        return read_tar_file(file_path)
+
+    def read_gz_file(self, file_path: Path) -> Iterator[bytes]:
+        return read_gz_file(file_path)
+
+    def read_bz2_file(self, file_path: Path) -> Iterator[bytes]:
+        return read_bz2_file(file_path)
+
+    def process_7z_file(
+        self,
+        file_path: Path,
+        fn_hash_update: Callable[[bytes | bytearray], None],
+        fn_hash_read: Callable[[int | None], bytes],
+    ) -> None:
+        process_7z_file(file_path, fn_hash_update, fn_hash_read)
+
+
+class CommandArchiveBackend(ArchiveBackend):
+    """Decompresses 7zip files with a native decompressor running in a subprocess.
+
+    py7zr has to extract files one by one for the hashes to be deterministic,
+    which makes 7zip files the slowest to hash. Other formats are already
+    decompressed by C extensions, so they are read in-process.
+    """
+
+    def __init__(self, command: list[str]) -> None:
+        self.command = command
+
+    def process_7z_file(
+        self,
+        file_path: Path,
+        fn_hash_update: Callable[[bytes | bytearray], None],
+        fn_hash_read: Callable[[int | None], bytes],
+    ) -> None:
+        for chunk in read_7z_file_with_command(self.command, file_path):
+            fn_hash_update(chunk)
+
+
+ARCHIVE_BACKEND_COMMANDS: Final = {
+    "7z": ["7z", "x", "-so", "-y", "-bd", "--"],
+    "libarchive": ["bsdtar", "-x", "-O", "-f"],
+}
+
+
+def get_archive_backend(name: str) -> ArchiveBackend:
+    if name == "python":
+        return ArchiveBackend()
+
+    command = ARCHIVE_BACKEND_COMMANDS.get(name)
+    if not command:
+        log.warning(f"Unknown archive backend {name}, using the python backend")
+        return ArchiveBackend()
+
+    if not shutil.which(command[0]):
+        log.warning(f"{command[0]} not found, using the python archive backend")
+        return ArchiveBackend()
+
+    return CommandArchiveBackend(command)
+
+
 class FSRomsHandler(FSHandler):
     def __init__(self) -> None:
-        pass
+        self.archive_backend = get_archive_backend(SCAN_ARCHIVE_BACKEND)
 
     def remove_file(self, file_name: str, file_path: str) -> None:
         try:
@@ -220,36 +417,40 @@ class FSRomsHandler(FSHandler):
         return regs, rev, langs, other_tags
 
     def _exclude_multi_roms(self, roms: list[str]) -> list[str]:
-        excluded_names = cm.get_config().EXCLUDED_MULTI_FILES
-        filtered_files: list = []
-
-        for rom in roms:
-            if rom in excluded_names:
-                filtered_files.append(rom)
+        excluded_names = set(cm.get_config().EXCLUDED_MULTI_FILES)
+        return [f for f in roms if f not in excluded_names]
 
-        return [f for f in roms if f not in filtered_files]
-
-    def _build_rom_file(self, path: Path) -> RomFile:
+    def _build_rom_file(self, entry: os.DirEntry) -> RomFile:
+        # The stat result is cached in the entry, so this is at most one syscall
+        entry_stat = entry.stat()
         return RomFile(
-            filename=path.name,
-            size=os.stat(path).st_size,
-            last_modified=os.path.getmtime(path),
+            filename=entry.name,
+            size=entry_stat.st_size,
+            last_modified=entry_stat.st_mtime,
         )
 
     def get_rom_files(self, rom: str, roms_path: str) -> list[RomFile]:
-        rom_files: list[RomFile] = []
+        rom_path = f"{roms_path}/{rom}"
 
         # Check if rom is a multi-part rom
-        if os.path.isdir(f"{roms_path}/{rom}"):
-            multi_files = os.listdir(f"{roms_path}/{rom}")
-            for file in self._exclude_files(multi_files, "multi_parts"):
-                path = Path(roms_path, rom, file)
-                rom_files.append(self._build_rom_file(path))
-        else:
-            path = Path(roms_path, rom)
-            rom_files.append(self._build_rom_file(path))
+        if os.path.isdir(rom_path):
+            return self._get_multi_rom_files(rom_path)
 
-        return rom_files
+        rom_stat = os.stat(rom_path)
+        return [
+            RomFile(
+                filename=rom, size=rom_stat.st_size, last_modified=rom_stat.st_mtime
+            )
+        ]
+
+    def _get_multi_rom_files(self, rom_path: str) -> list[RomFile]:
+        with os.scandir(rom_path) as entries:
+            entries_map = {entry.name: entry for entry in entries}
+
+        return [
+            self._build_rom_file(entries_map[file_name])
+            for file_name in self._exclude_files(list(entries_map), "multi_parts")
+        ]
 
     def _calculate_rom_hashes(
         self, file_path: Path, crc_c: int, md5_h: Any, sha1_h: Any
@@ -265,34 +466,162 @@ class FSRomsHandler(FSHandler):
             crc_c = binascii.crc32(chunk, crc_c)
 
         if extension == ".zip" or file_type == "application/zip":
-            for chunk in read_zip_file(file_path):
+            for chunk in self.archive_backend.read_zip_file(file_path):
                 update_hashes(chunk)
 
         elif extension == ".tar" or file_type == "application/x-tar":
-            for chunk in read_tar_file(file_path):
+            for chunk in self.archive_backend.read_tar_file(file_path):
                 update_hashes(chunk)
 
         elif extension == ".gz" or file_type == "application/x-gzip":
-            for chunk in read_gz_file(file_path):
+            for chunk in self.archive_backend.read_gz_file(file_path):
                 update_hashes(chunk)
 
         elif extension == ".7z" or file_type == "application/x-7z-compressed":
-            process_7z_file(
+            self.archive_backend.process_7z_file(
                 file_path=file_path,
                 fn_hash_update=update_hashes,
                 fn_hash_read=lambda size: sha1_h.digest(),
             )
 
         elif extension == ".bz2" or file_type == "application/x-bzip2":
-            for chunk in read_bz2_file(file_path):
+            for chunk in self.archive_backend.read_bz2_file(file_path):
                 update_hashes(chunk)
 
         else:
-            for chunk in read_basic_file(file_path):
-                update_hashes(chunk)
+            crc_c = hash_basic_file(file_path, crc_c, md5_h, sha1_h)
 
         return crc_c, md5_h, sha1_h
 
+    def get_rom_fast_hashes(self, rom: str, roms_path: str) -> dict[str, str] | None:
+        """Get the crc32 of a zip or 7zip rom from the crc32 stored for its files
+
+        The crc32 of the files are combined into the crc32 of their contents, so it
+        matches the one calculated by decompressing the rom. The md5 and sha1
+        hashes are left empty, as they can only be calculated by decompressing it.
+
+        Args:
+            rom: name of the rom file
+            roms_path: path to the roms folder of the platform
+        Returns
+            rom hashes, or None if the rom is not a single zip or 7zip file
+        """
+        file_path = Path(LIBRARY_BASE_PATH, roms_path, rom)
+        if file_path.is_dir():
+            return None
+
+        file_type = magic.Magic(mime=True).from_file(file_path)
+        extension = file_path.suffix.lower()
+
+        if extension == ".zip" or file_type == "application/zip":
+            members = read_zip_members(file_path)
+        elif extension == ".7z" or file_type == "application/x-7z-compressed":
+            members = read_7z_members(file_path)
+        else:
+            return None
+
+        if members is None:
+            return None
+
+        crc_c = 0
+        for member in members:
+            crc_c = crc32_combine(crc_c, member["crc32"], member["size"])
+
+        return {
+            "crc_hash": crc32_to_hex(crc_c),
+            "md5_hash": "",
+            "sha1_hash": "",
+        }
+
+    def get_rom_fingerprint(self, rom: str, roms_path: str) -> RomFingerprint | None:
+        """Fingerprint a disc image from its headers, without reading it whole
+
+        CHD files are fingerprinted from the sha1 of their data stored in their
+        header. Other images are fingerprinted from their size, system area, primary
+        volume descriptor, boot file and a few blocks spread across the image. The
+        fingerprint doesn't change when the image is touched, so the cached hashes
+        of the image are kept as long as it matches.
+
+        Args:
+            rom: name of the rom file
+            roms_path: path to the roms folder of the platform
+        Returns
+            rom fingerprint, or None if the rom is not a disc image
+        """
+        file_path = Path(LIBRARY_BASE_PATH, roms_path, rom)
+        if file_path.suffix.lower() not in DISC_IMAGE_EXTENSIONS or file_path.is_dir():
+            return None
+
+        with open(file_path, "rb") as f:
+            chd_sha1 = read_chd_sha1(f)
+            if chd_sha1:
+                return RomFingerprint(key=f"chd:{chd_sha1}")
+
+            size = os.fstat(f.fileno()).st_size
+            if size < DISC_FINGERPRINT_MIN_SIZE:
+                return None
+
+            fingerprint_h = hashlib.sha1(usedforsecurity=False)
+            fingerprint_h.update(size.to_bytes(8, byteorder="big"))
+
+            # The system area holds the headers of Saturn, Sega CD and GameCube discs
+            f.seek(0)
+            fingerprint_h.update(f.read(ISO_SECTOR_SIZE))
+
+            iso_image = ISOImage.open(f)
+            if iso_image:
+                fingerprint_h.update(iso_image.read_pvd())
+                boot_file_path = iso_image.get_boot_file_path()
+                if boot_file_path:
+                    fingerprint_h.update(iso_image.read_file(boot_file_path) or b"")
+
+            for sample in range(1, DISC_FINGERPRINT_SAMPLES + 1):
+                f.seek(
+                    max(size - DISC_FINGERPRINT_SAMPLE_SIZE, 0)
+                    * sample
+                    // DISC_FINGERPRINT_SAMPLES
+                )
+                fingerprint_h.update(f.read(DISC_FINGERPRINT_SAMPLE_SIZE))
+
+        return RomFingerprint(key=f"disc:{fingerprint_h.hexdigest()}")
+
+    def get_rom_header(self, rom: str, roms_path: str) -> RomHeader | None:
+        """Read the internal title and serial of a rom, or of the first part of a
+        multi-part rom that has them
+
+        Args:
+            rom: name of the rom file or multi-part rom folder
+            roms_path: path to the roms folder of the platform
+        Returns
+            rom header, or None if no known header was found
+        """
+        rom_path = Path(LIBRARY_BASE_PATH, roms_path, rom)
+        if rom_path.is_dir():
+            file_paths = [
+                Path(rom_path, file)
+                for file in sorted(
+                    self._exclude_files(os.listdir(rom_path), "multi_parts")
+                )
+            ]
+        else:
+            file_paths = [rom_path]
+
+        for file_path in file_paths:
+            if file_path.suffix.lower() not in ROM_HEADER_READERS:
+                continue
+
+            try:
+                with open(file_path, "rb") as f:
+                    rom_header = read_rom_header(f, file_path.suffix)
+            except (OSError, struct.error) as e:
+                log.warning(f"Header of {file_path.name} couldn't be read: {e}")
+                continue
+
+            if rom_header:
+                return rom_header
+
+        return None
+
     def get_rom_hashes(self, rom: str, roms_path: str) -> dict[str, str]:
         roms_file_path = f"{LIBRARY_BASE_PATH}/{roms_path}"
 
@@ -333,34 +662,40 @@ class FSRomsHandler(FSHandler):
         roms_file_path = f"{LIBRARY_BASE_PATH}/{roms_path}"
 
         try:
-            fs_single_roms = [f for _, f in iter_files(roms_file_path)]
+            return self.get_roms_from_path(roms_file_path)
         except IndexError as exc:
             raise RomsNotFoundException(platform_fs_slug) from exc
 
-        try:
-            fs_multi_roms = [d for _, d in iter_directories(roms_file_path)]
-        except IndexError as exc:
-            raise RomsNotFoundException(platform_fs_slug) from exc
+    def get_roms_from_path(self, roms_file_path: str) -> list[FSRom]:
+        """Gets all filesystem roms in a folder, listing it only once
+
+        Args:
+            roms_file_path: absolute path to the roms folder of a platform
+        Returns
+            list with all the filesystem roms found in the folder
+        """
+        single_entries, multi_entries = scan_directory(roms_file_path)
 
-        fs_roms: list[dict] = [
-            {"multi": False, "file_name": rom}
-            for rom in self._exclude_files(fs_single_roms, "single")
+        single_entries_map = {entry.name: entry for entry in single_entries}
+        multi_entries_map = {entry.name: entry for entry in multi_entries}
+
+        fs_roms: list[FSRom] = [
+            FSRom(
+                multi=False,
+                file_name=rom,
+                files=[self._build_rom_file(single_entries_map[rom])],
+            )
+            for rom in self._exclude_files(list(single_entries_map), "single")
         ] + [
-            {"multi": True, "file_name": rom}
-            for rom in self._exclude_multi_roms(fs_multi_roms)
+            FSRom(
+                multi=True,
+                file_name=rom,
+                files=self._get_multi_rom_files(multi_entries_map[rom].path),
+            )
+            for rom in self._exclude_multi_roms(list(multi_entries_map))
         ]
 
-        return sorted(
-            [
-                FSRom(
-                    multi=rom["multi"],
-                    file_name=rom["file_name"],
-                    files=self.get_rom_files(rom["file_name"], roms_file_path),
-                )
-                for rom in fs_roms
-            ],
-            key=lambda rom: rom["file_name"],
-        )
+        return sorted(fs_roms, key=lambda rom: rom["file_name"])
 
     def file_exists(self, path: str, file_name: str) -> bool:
         """Check if file exists in filesystem
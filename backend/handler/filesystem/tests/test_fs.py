@@ -1,8 +1,39 @@
+import asyncio
+import binascii
+import hashlib
 import os
+import shutil
+import zipfile
+from io import BytesIO
 from pathlib import Path
-
-from handler.filesystem import fs_platform_handler, fs_resource_handler, fs_rom_handler
+from types import SimpleNamespace
+
+import httpx
+import py7zr
+import pytest
+from handler.filesystem import (
+    fs_platform_handler,
+    fs_resource_handler,
+    fs_rom_handler,
+    resources_handler,
+)
+from handler.filesystem.resources_handler import (
+    RESOURCES_PENDING_REMOVAL_KEY,
+    RESOURCES_URLS_KEY,
+)
+from handler.filesystem.roms_handler import (
+    ARCHIVE_BACKEND_COMMANDS,
+    ArchiveBackend,
+    CommandArchiveBackend,
+    hash_basic_file,
+    read_basic_file,
+)
+from handler.hashing_handler import hashing_handler
+from handler.redis_handler import sync_cache
 from models.platform import Platform
+from PIL import Image
+from utils.context import ctx_httpx_client, set_context_var
+from utils.test_disc_image import BOOT_FILE, SYSTEM_CNF, build_iso
 
 
 async def test_get_rom_cover():
@@ -14,6 +45,224 @@ async def test_get_rom_cover():
     assert "" in path_cover_l
 
 
+async def test_get_rom_cover_downloads_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(resources_handler, "RESOURCES_BASE_PATH", str(tmp_path))
+    sync_cache.delete(RESOURCES_URLS_KEY)
+
+    cover = BytesIO()
+    Image.new("RGB", (100, 200)).save(cover, format="PNG")
+    requests: list[httpx.Request] = []
+
+    class CoverStream(httpx.AsyncByteStream):
+        async def __aiter__(self):
+            yield cover.getvalue()
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return httpx.Response(200, stream=CoverStream())
+
+    rom = SimpleNamespace(fs_resources_path="roms/1/1")
+    content_hash = hashlib.sha1(cover.getvalue()).hexdigest()
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        async with set_context_var(ctx_httpx_client, client):
+            path_cover_s, path_cover_l = await fs_resource_handler.get_cover(
+                overwrite=True, entity=rom, url_cover="https://covers.test/1.png"
+            )
+
+            assert len(requests) == 1
+            assert path_cover_s == f"store/{content_hash[:2]}/{content_hash}_small.png"
+            assert path_cover_l == f"store/{content_hash[:2]}/{content_hash}.png"
+            with Image.open(tmp_path / path_cover_s) as img:
+                assert img.size == (40, 80)
+
+            # Stored covers are not downloaded again, even for another rom
+            sibling_rom = SimpleNamespace(fs_resources_path="roms/1/2")
+            assert await fs_resource_handler.get_cover(
+                overwrite=True,
+                entity=sibling_rom,
+                url_cover="https://covers.test/1.png",
+            ) == (path_cover_s, path_cover_l)
+            assert len(requests) == 1
+
+            # The same image from another url is stored once
+            assert await fs_resource_handler.get_cover(
+                overwrite=True,
+                entity=sibling_rom,
+                url_cover="https://mirror.covers.test/1.png",
+            ) == (path_cover_s, path_cover_l)
+            assert len(requests) == 2
+
+    # Just used covers may be about to be referenced, so their removal is put off
+    sync_cache.delete(RESOURCES_PENDING_REMOVAL_KEY)
+    fs_resource_handler.remove_resources([path_cover_s, path_cover_l])
+    assert (tmp_path / path_cover_s).exists()
+    assert (tmp_path / path_cover_l).exists()
+
+    monkeypatch.setattr(resources_handler, "RESOURCES_REMOVAL_GRACE_PERIOD", 0)
+    fs_resource_handler.remove_resources(fs_resource_handler.pop_pending_resources())
+    assert not (tmp_path / path_cover_s).exists()
+    assert not (tmp_path / path_cover_l).exists()
+    assert fs_resource_handler.pop_pending_resources() == set()
+
+
+async def test_store_cover_removes_tmp_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(resources_handler, "RESOURCES_BASE_PATH", str(tmp_path))
+    path_cover_l = "store/ab/abcd.png"
+    (tmp_path / "store" / "ab").mkdir(parents=True)
+    (tmp_path / path_cover_l).write_bytes(b"")
+    sync_cache.hset(RESOURCES_URLS_KEY, "https://covers.test/broken.png", path_cover_l)
+
+    async def store_small_cover(cover_path: str, small_cover_path: str) -> None:
+        Path(small_cover_path).write_bytes(b"partial")
+        raise OSError("disk full")
+
+    monkeypatch.setattr(
+        resources_handler.image_handler, "store_small_cover", store_small_cover
+    )
+    with pytest.raises(OSError):
+        await fs_resource_handler._store_cover("https://covers.test/broken.png")
+
+    assert sorted(p.name for p in (tmp_path / "store").iterdir()) == ["ab"]
+
+
+@pytest.mark.parametrize(
+    "error",
+    [httpx.ReadTimeout("Timed out"), asyncio.CancelledError(), None],
+)
+async def test_download_resource_removes_tmp_file(tmp_path, monkeypatch, error):
+    monkeypatch.setattr(resources_handler, "RESOURCES_BASE_PATH", str(tmp_path))
+
+    class BrokenStream(httpx.AsyncByteStream):
+        async def __aiter__(self):
+            yield b"partial"
+            if error:
+                raise error
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if not error:
+            return httpx.Response(404, stream=BrokenStream())
+        return httpx.Response(200, stream=BrokenStream())
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        async with set_context_var(ctx_httpx_client, client):
+            if error:
+                with pytest.raises(type(error)):
+                    await fs_resource_handler._download_resource(
+                        "https://covers.test/broken.png", "png"
+                    )
+            else:
+                assert (
+                    await fs_resource_handler._download_resource(
+                        "https://covers.test/broken.png", "png"
+                    )
+                    == ""
+                )
+
+    assert list((tmp_path / "store").iterdir()) == []
+
+
+def test_remove_legacy_resources(tmp_path, monkeypatch):
+    monkeypatch.setattr(resources_handler, "RESOURCES_BASE_PATH", str(tmp_path))
+    for folder in ("roms/1/1/cover", "roms/1/1/screenshots"):
+        (tmp_path / folder).mkdir(parents=True)
+        (tmp_path / folder / "0.png").write_bytes(b"")
+
+    rom = SimpleNamespace(
+        fs_resources_path="roms/1/1",
+        path_cover_s="roms/1/1/cover/0.png",
+        path_cover_l="roms/1/1/cover/0.png",
+        path_screenshots=["store/ab/abcd.jpg"],
+    )
+    fs_resource_handler.remove_legacy_resources(rom)
+    assert (tmp_path / "roms/1/1/cover").exists()
+    assert not (tmp_path / "roms/1/1/screenshots").exists()
+
+    rom.path_cover_s, rom.path_cover_l = "store/ab/ab_small.png", "store/ab/ab.png"
+    fs_resource_handler.remove_legacy_resources(rom)
+    assert not (tmp_path / "roms/1/1/cover").exists()
+
+
+async def test_get_rom_screenshots(tmp_path, monkeypatch):
+    monkeypatch.setattr(resources_handler, "RESOURCES_BASE_PATH", str(tmp_path))
+    monkeypatch.setattr(resources_handler, "SCAN_ARTWORK_CONCURRENCY_PER_HOST", 2)
+    sync_cache.delete(RESOURCES_URLS_KEY)
+
+    active_requests = 0
+    max_active_requests = 0
+
+    class ScreenshotStream(httpx.AsyncByteStream):
+        def __init__(self, content: bytes) -> None:
+            self.content = content
+
+        async def __aiter__(self):
+            nonlocal active_requests, max_active_requests
+            active_requests += 1
+            max_active_requests = max(max_active_requests, active_requests)
+            await asyncio.sleep(0.01)
+            active_requests -= 1
+            yield self.content
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/missing.jpg":
+            return httpx.Response(404)
+        if request.url.path == "/broken.jpg":
+            raise httpx.ConnectError("Connection refused", request=request)
+        return httpx.Response(200, stream=ScreenshotStream(request.url.path.encode()))
+
+    url_screenshots = [
+        "https://screenshots.test/0.jpg",
+        "https://screenshots.test/missing.jpg",
+        "https://screenshots.test/2.jpg",
+        "https://screenshots.test/broken.jpg",
+        "https://screenshots.test/4.jpg",
+        "https://screenshots.test/5.jpg",
+    ]
+    # The broken screenshot keeps the path it was previously stored at
+    rom = SimpleNamespace(
+        fs_resources_path="roms/1/1",
+        url_screenshots=url_screenshots,
+        path_screenshots=["", "", "", "store/ab/abcd.jpg"],
+    )
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        async with set_context_var(ctx_httpx_client, client):
+            path_screenshots = await fs_resource_handler.get_rom_screenshots(
+                rom=rom, url_screenshots=url_screenshots
+            )
+
+    def store_path(name: str) -> str:
+        content_hash = hashlib.sha1(f"/{name}.jpg".encode()).hexdigest()
+        return f"store/{content_hash[:2]}/{content_hash}.jpg"
+
+    assert path_screenshots == [
+        store_path("0"),
+        "",
+        store_path("2"),
+        "store/ab/abcd.jpg",
+        store_path("4"),
+        store_path("5"),
+    ]
+    assert (tmp_path / path_screenshots[4]).read_bytes() == b"/4.jpg"
+    assert max_active_requests == 2
+
+
+async def test_get_rom_screenshots_cancelled(tmp_path, monkeypatch):
+    monkeypatch.setattr(resources_handler, "RESOURCES_BASE_PATH", str(tmp_path))
+    sync_cache.delete(RESOURCES_URLS_KEY)
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        raise asyncio.CancelledError()
+
+    rom = SimpleNamespace(
+        fs_resources_path="roms/1/1", url_screenshots=[], path_screenshots=[]
+    )
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        async with set_context_var(ctx_httpx_client, client):
+            with pytest.raises(asyncio.CancelledError):
+                await fs_resource_handler.get_rom_screenshots(
+                    rom=rom, url_screenshots=["https://screenshots.test/0.jpg"]
+                )
+
+
 def test_get_platforms():
     platforms = fs_platform_handler.get_platforms()
 
@@ -39,6 +288,160 @@ def test_get_roms():
     assert roms[1]["multi"]
 
 
+def test_get_roms_from_path(tmp_path):
+    (tmp_path / "Single Game.bin").write_bytes(b"single")
+    (tmp_path / "Multi Game").mkdir()
+    (tmp_path / "Multi Game" / "Multi Game (Disc 1).bin").write_bytes(b"disc1")
+    (tmp_path / "Multi Game" / "Multi Game (Disc 2).bin").write_bytes(b"disc 2")
+
+    roms = fs_rom_handler.get_roms_from_path(str(tmp_path))
+
+    assert [rom["file_name"] for rom in roms] == ["Multi Game", "Single Game.bin"]
+    assert roms[0]["multi"]
+    assert sorted((f["filename"], f["size"]) for f in roms[0]["files"]) == [
+        ("Multi Game (Disc 1).bin", 5),
+        ("Multi Game (Disc 2).bin", 6),
+    ]
+    assert not roms[1]["multi"]
+    assert roms[1]["files"] == [
+        {
+            "filename": "Single Game.bin",
+            "size": 6,
+            "last_modified": os.stat(tmp_path / "Single Game.bin").st_mtime,
+        }
+    ]
+
+
+@pytest.mark.parametrize("size", [0, 1, 1024, 1024 + 1, 1024 * 3 + 512])
+def test_hash_basic_file(tmp_path, monkeypatch, size):
+    monkeypatch.setattr(
+        "handler.filesystem.roms_handler.LARGE_FILE_READ_CHUNK_SIZE", 1024
+    )
+    file_path = tmp_path / "rom.bin"
+    file_path.write_bytes(os.urandom(size))
+
+    md5_h = hashlib.md5(usedforsecurity=False)
+    sha1_h = hashlib.sha1(usedforsecurity=False)
+    crc_c = hash_basic_file(file_path, 0, md5_h, sha1_h)
+
+    expected_crc_c = 0
+    expected_md5_h = hashlib.md5(usedforsecurity=False)
+    expected_sha1_h = hashlib.sha1(usedforsecurity=False)
+    for chunk in read_basic_file(file_path):
+        expected_crc_c = binascii.crc32(chunk, expected_crc_c)
+        expected_md5_h.update(chunk)
+        expected_sha1_h.update(chunk)
+
+    assert crc_c == expected_crc_c
+    assert md5_h.hexdigest() == expected_md5_h.hexdigest()
+    assert sha1_h.hexdigest() == expected_sha1_h.hexdigest()
+
+
+def test_get_rom_fast_hashes(tmp_path):
+    contents = [os.urandom(3000), b"", os.urandom(5)]
+    with zipfile.ZipFile(tmp_path / "rom.zip", "w") as z:
+        for i, content in enumerate(contents):
+            z.writestr(f"part{i}.bin", content)
+    with py7zr.SevenZipFile(tmp_path / "rom.7z", "w") as archive:
+        for i, content in enumerate(contents):
+            archive.writestr(content, f"part{i}.bin")
+    (tmp_path / "rom.bin").write_bytes(contents[0])
+
+    expected_crc_hash = f"{binascii.crc32(b''.join(contents)):08x}"
+    for rom in ("rom.zip", "rom.7z"):
+        assert fs_rom_handler.get_rom_fast_hashes(rom, str(tmp_path)) == {
+            "crc_hash": expected_crc_hash,
+            "md5_hash": "",
+            "sha1_hash": "",
+        }
+
+    assert fs_rom_handler.get_rom_fast_hashes("rom.bin", str(tmp_path)) is None
+
+
+def test_get_rom_fingerprint(tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        "handler.filesystem.roms_handler.DISC_FINGERPRINT_MIN_SIZE", 2048 * 16
+    )
+    sha1 = hashlib.sha1(b"romm").digest()
+    chd_header = bytearray(124)
+    chd_header[0:16] = b"MComprHD" + (124).to_bytes(4, "big") + (5).to_bytes(4, "big")
+    chd_header[84:104] = sha1
+    (tmp_path / "game.chd").write_bytes(chd_header)
+
+    image = build_iso({"SYSTEM.CNF": SYSTEM_CNF, "SLUS_200.62": BOOT_FILE})
+    (tmp_path / "game.iso").write_bytes(image)
+    (tmp_path / "renamed.iso").write_bytes(image)
+    (tmp_path / "other.iso").write_bytes(image[:-1] + b"\x01")
+    (tmp_path / "game.sfc").write_bytes(image)
+
+    assert fs_rom_handler.get_rom_fingerprint("game.chd", str(tmp_path)) == {
+        "key": f"chd:{sha1.hex()}"
+    }
+
+    fingerprint = fs_rom_handler.get_rom_fingerprint("game.iso", str(tmp_path))
+    assert fingerprint and fingerprint["key"].startswith("disc:")
+    assert (
+        fs_rom_handler.get_rom_fingerprint("renamed.iso", str(tmp_path)) == fingerprint
+    )
+    assert fs_rom_handler.get_rom_fingerprint("other.iso", str(tmp_path)) != fingerprint
+    assert fs_rom_handler.get_rom_fingerprint("game.sfc", str(tmp_path)) is None
+
+    monkeypatch.setattr(
+        "handler.filesystem.roms_handler.DISC_FINGERPRINT_MIN_SIZE", len(image) + 1
+    )
+    assert fs_rom_handler.get_rom_fingerprint("game.iso", str(tmp_path)) is None
+
+
+def test_get_rom_header(tmp_path):
+    image = build_iso({"SYSTEM.CNF": SYSTEM_CNF, "SLUS_200.62": BOOT_FILE})
+    (tmp_path / "game.iso").write_bytes(image)
+    (tmp_path / "game.zip").write_bytes(image)
+    (tmp_path / "multi").mkdir()
+    (tmp_path / "multi" / "disc 1.cue").write_text('FILE "disc 1.bin" BINARY')
+    (tmp_path / "multi" / "disc 1.bin").write_bytes(image)
+
+    assert fs_rom_handler.get_rom_header("game.iso", str(tmp_path)) == {
+        "serial": "SLUS-20062"
+    }
+    assert fs_rom_handler.get_rom_header("multi", str(tmp_path)) == {
+        "serial": "SLUS-20062"
+    }
+    assert fs_rom_handler.get_rom_header("game.zip", str(tmp_path)) is None
+
+
+@pytest.mark.parametrize("backend", ["7z", "libarchive"])
+def test_command_archive_backend(tmp_path, backend):
+    command = ARCHIVE_BACKEND_COMMANDS[backend]
+    if not shutil.which(command[0]):
+        pytest.skip(f"{command[0]} is not installed")
+
+    with py7zr.SevenZipFile(tmp_path / "rom.7z", "w") as archive:
+        archive.writestr(os.urandom(3000), "part1.bin")
+        archive.writestr(b"", "empty.bin")
+        archive.writestr(bytes(100_000), "folder/part2.bin")
+    (tmp_path / "corrupted.7z").write_bytes(os.urandom(1000))
+
+    for rom in ("rom.7z", "corrupted.7z"):
+        expected_chunks: list[bytes] = []
+        ArchiveBackend().process_7z_file(
+            tmp_path / rom, expected_chunks.append, lambda size: b""
+        )
+        chunks: list[bytes] = []
+        CommandArchiveBackend(command).process_7z_file(
+            tmp_path / rom, chunks.append, lambda size: b""
+        )
+
+        assert b"".join(chunks) == b"".join(expected_chunks)
+
+
+async def test_hashing_handler_get_rom_hashes():
+    roms_path = fs_rom_handler.get_roms_fs_structure(fs_slug="n64")
+
+    for rom in ("Paper Mario (USA).z64", "Super Mario 64 (J) (Rev A)"):
+        rom_hashes = await hashing_handler.get_rom_hashes(rom, roms_path)
+        assert rom_hashes == fs_rom_handler.get_rom_hashes(rom, roms_path)
+
+
 def test_exclude_files():
     from config.config_manager import ConfigManager
 
@@ -0,0 +1,163 @@
+import os
+
+import pytest
+from handler.filesystem import fs_hash_cache_handler
+from handler.filesystem.hash_cache_handler import ROM_HASHES_CACHE_KEY
+
+HASHES = {"crc_hash": "00000000", "md5_hash": "md5", "sha1_hash": "sha1"}
+
+
+@pytest.fixture(autouse=True)
+def clear_hash_cache():
+    fs_hash_cache_handler.clear(ROM_HASHES_CACHE_KEY)
+    fs_hash_cache_handler.reset_stats()
+    yield
+    fs_hash_cache_handler.clear(ROM_HASHES_CACHE_KEY)
+
+
+def test_hash_cache_hit_and_miss(tmp_path):
+    rom_path = tmp_path / "rom.bin"
+    rom_path.write_bytes(b"rom")
+
+    identity = fs_hash_cache_handler.get_file_identity(str(rom_path))
+    assert (
+        fs_hash_cache_handler.get_hashes(ROM_HASHES_CACHE_KEY, str(rom_path), identity)
+        is None
+    )
+
+    fs_hash_cache_handler.set_hashes(
+        ROM_HASHES_CACHE_KEY, str(rom_path), identity, HASHES
+    )
+    assert (
+        fs_hash_cache_handler.get_hashes(ROM_HASHES_CACHE_KEY, str(rom_path), identity)
+        == HASHES
+    )
+
+    assert fs_hash_cache_handler.stats.hits == 1
+    assert fs_hash_cache_handler.stats.misses == 1
+
+
+def test_hash_cache_identity_changes(tmp_path):
+    rom_path = tmp_path / "rom.bin"
+    rom_path.write_bytes(b"rom")
+
+    identity = fs_hash_cache_handler.get_file_identity(str(rom_path))
+    fs_hash_cache_handler.set_hashes(
+        ROM_HASHES_CACHE_KEY, str(rom_path), identity, HASHES
+    )
+
+    rom_path.write_bytes(b"modified rom")
+    os.utime(rom_path, ns=(0, 0))
+    new_identity = fs_hash_cache_handler.get_file_identity(str(rom_path))
+
+    assert new_identity != identity
+    assert (
+        fs_hash_cache_handler.get_hashes(
+            ROM_HASHES_CACHE_KEY, str(rom_path), new_identity
+        )
+        is None
+    )
+
+
+def test_hash_cache_multi_file_identity(tmp_path):
+    (tmp_path / "part1.bin").write_bytes(b"part1")
+    (tmp_path / "part2.bin").write_bytes(b"part2")
+
+    identity = fs_hash_cache_handler.get_file_identity(str(tmp_path))
+    assert [entry[0] for entry in identity] == ["part1.bin", "part2.bin"]
+
+    (tmp_path / "part3.bin").write_bytes(b"part3")
+    assert fs_hash_cache_handler.get_file_identity(str(tmp_path)) != identity
+
+
+def test_hash_cache_invalidate(tmp_path):
+    rom_path = tmp_path / "rom.bin"
+    rom_path.write_bytes(b"rom")
+
+    identity = fs_hash_cache_handler.get_file_identity(str(rom_path))
+    fs_hash_cache_handler.set_hashes(
+        ROM_HASHES_CACHE_KEY, str(rom_path), identity, HASHES
+    )
+    fs_hash_cache_handler.invalidate(ROM_HASHES_CACHE_KEY, [str(rom_path)])
+
+    assert (
+        fs_hash_cache_handler.get_hashes(ROM_HASHES_CACHE_KEY, str(rom_path), identity)
+        is None
+    )
+
+
+def test_hash_cache_move(tmp_path):
+    rom_path = tmp_path / "rom.bin"
+    rom_path.write_bytes(b"rom")
+    identity = fs_hash_cache_handler.get_file_identity(str(rom_path))
+    fs_hash_cache_handler.set_hashes(
+        ROM_HASHES_CACHE_KEY, str(rom_path), identity, HASHES
+    )
+
+    renamed_path = tmp_path / "renamed.bin"
+    os.rename(rom_path, renamed_path)
+    fs_hash_cache_handler.move(ROM_HASHES_CACHE_KEY, str(rom_path), str(renamed_path))
+
+    # Renaming keeps the identity of the file, so its hashes are still valid
+    assert (
+        fs_hash_cache_handler.get_hashes(
+            ROM_HASHES_CACHE_KEY,
+            str(renamed_path),
+            fs_hash_cache_handler.get_file_identity(str(renamed_path)),
+        )
+        == HASHES
+    )
+    assert (
+        fs_hash_cache_handler.get_hashes(ROM_HASHES_CACHE_KEY, str(rom_path), identity)
+        is None
+    )
+
+    # Files without cached hashes are left alone
+    fs_hash_cache_handler.move(ROM_HASHES_CACHE_KEY, str(rom_path), str(renamed_path))
+    assert (
+        fs_hash_cache_handler.get_hashes(
+            ROM_HASHES_CACHE_KEY,
+            str(renamed_path),
+            fs_hash_cache_handler.get_file_identity(str(renamed_path)),
+        )
+        == HASHES
+    )
+
+
+def test_deferred_rom_hashes():
+    fs_hash_cache_handler.defer_rom_hashes("/library/n64/roms/rom.zip", 1, "rom.zip")
+    fs_hash_cache_handler.defer_rom_hashes("/library/n64/roms/rom.zip", 1, "rom.zip")
+
+    assert fs_hash_cache_handler.pop_deferred_rom_hashes() == [
+        {"platform_id": 1, "file_name": "rom.zip"}
+    ]
+    assert fs_hash_cache_handler.pop_deferred_rom_hashes() == []
+
+
+def test_fingerprint_hashes(tmp_path):
+    rom_path = tmp_path / "game.iso"
+    rom_path.write_bytes(b"image")
+    identity = fs_hash_cache_handler.get_file_identity(str(rom_path))
+    fs_hash_cache_handler.set_hashes(
+        ROM_HASHES_CACHE_KEY, str(rom_path), identity, HASHES, "disc:fingerprint"
+    )
+
+    assert (
+        fs_hash_cache_handler.get_fingerprint_hashes(
+            ROM_HASHES_CACHE_KEY, str(rom_path), "disc:fingerprint"
+        )
+        == HASHES
+    )
+    assert (
+        fs_hash_cache_handler.get_fingerprint_hashes(
+            ROM_HASHES_CACHE_KEY, str(rom_path), "disc:other"
+        )
+        is None
+    )
+    # Hashes are never reused for another file with the same fingerprint
+    assert (
+        fs_hash_cache_handler.get_fingerprint_hashes(
+            ROM_HASHES_CACHE_KEY, str(tmp_path / "copy.iso"), "disc:fingerprint"
+        )
+        is None
+    )
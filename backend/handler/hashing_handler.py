@@ -0,0 +1,125 @@
+import asyncio
+import multiprocessing
+import resource
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import TYPE_CHECKING, Any
+
+from config import SCAN_HASHING_WORKER_MAX_MEMORY, SCAN_HASHING_WORKERS
+from logger.logger import log
+
+if TYPE_CHECKING:
+    from handler.filesystem.roms_handler import RomFingerprint
+    from utils.rom_headers import RomHeader
+
+
+def _init_hashing_worker(max_memory: int) -> None:
+    """Limit the memory available to each hashing worker process"""
+    if max_memory > 0:
+        max_memory_bytes = max_memory * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (max_memory_bytes, max_memory_bytes))
+
+
+def _calculate_rom_hashes(rom: str, roms_path: str) -> dict[str, str]:
+    from handler.filesystem import fs_rom_handler
+
+    return fs_rom_handler.get_rom_hashes(rom, roms_path)
+
+
+def _calculate_rom_fast_hashes(rom: str, roms_path: str) -> dict[str, str] | None:
+    from handler.filesystem import fs_rom_handler
+
+    return fs_rom_handler.get_rom_fast_hashes(rom, roms_path)
+
+
+def _calculate_rom_fingerprint(rom: str, roms_path: str) -> "RomFingerprint | None":
+    from handler.filesystem import fs_rom_handler
+
+    return fs_rom_handler.get_rom_fingerprint(rom, roms_path)
+
+
+def _read_rom_header(rom: str, roms_path: str) -> "RomHeader | None":
+    from handler.filesystem import fs_rom_handler
+
+    return fs_rom_handler.get_rom_header(rom, roms_path)
+
+
+def _calculate_firmware_hashes(firmware_path: str, file_name: str) -> dict[str, str]:
+    from handler.filesystem import fs_firmware_handler
+
+    return fs_firmware_handler.calculate_file_hashes(
+        firmware_path=firmware_path, file_name=file_name
+    )
+
+
+class HashingHandler:
+    """Run file hashing jobs in a bounded pool of worker processes.
+
+    Hashing is CPU bound, so running it in the scan process limits a scan to a
+    single core. Jobs are submitted to a `ProcessPoolExecutor` and awaited from
+    the scan loop. Setting the number of workers to 0 hashes files in-process.
+
+    Workers are started from a fork server rather than forked from the scan
+    process, which runs threads and holds open redis and database connections.
+    """
+
+    def __init__(self, max_workers: int, max_memory: int) -> None:
+        self.max_workers = max_workers
+        self.max_memory = max_memory
+        self._executor: ProcessPoolExecutor | None = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("forkserver"),
+                initializer=_init_hashing_worker,
+                initargs=(self.max_memory,),
+            )
+        return self._executor
+
+    async def _run(self, func: Callable[..., Any], *args: Any) -> Any:
+        if self.max_workers <= 0:
+            return func(*args)
+
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self._get_executor(), func, *args)
+        except BrokenProcessPool:
+            # A worker died (e.g. it hit the memory limit), so start a new pool next time
+            log.error("Hashing worker pool is broken, restarting it...")
+            self.shutdown()
+            raise
+
+    async def get_rom_hashes(self, rom: str, roms_path: str) -> dict[str, str]:
+        return await self._run(_calculate_rom_hashes, rom, roms_path)
+
+    async def get_rom_fast_hashes(
+        self, rom: str, roms_path: str
+    ) -> dict[str, str] | None:
+        return await self._run(_calculate_rom_fast_hashes, rom, roms_path)
+
+    async def get_rom_fingerprint(
+        self, rom: str, roms_path: str
+    ) -> "RomFingerprint | None":
+        return await self._run(_calculate_rom_fingerprint, rom, roms_path)
+
+    async def get_rom_header(self, rom: str, roms_path: str) -> "RomHeader | None":
+        return await self._run(_read_rom_header, rom, roms_path)
+
+    async def get_firmware_hashes(
+        self, firmware_path: str, file_name: str
+    ) -> dict[str, str]:
+        return await self._run(_calculate_firmware_hashes, firmware_path, file_name)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+hashing_handler = HashingHandler(
+    max_workers=SCAN_HASHING_WORKERS,
+    max_memory=SCAN_HASHING_WORKER_MAX_MEMORY,
+)
@@ -0,0 +1,99 @@
+import asyncio
+import weakref
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from typing import Any
+
+from config import IMAGE_PROCESSING_MAX_PENDING, IMAGE_PROCESSING_WORKERS
+from PIL import Image
+
+
+def resize_cover_to_small(cover: Image.Image, save_path: str) -> None:
+    """Resize cover to small size, and save it to filesystem."""
+    if cover.height >= 1000:
+        ratio = 0.2
+    else:
+        ratio = 0.4
+    small_width = int(cover.width * ratio)
+    small_height = int(cover.height * ratio)
+    small_size = (small_width, small_height)
+    small_img = cover.resize(small_size)
+    small_img.save(save_path)
+
+
+def _store_small_cover(cover_path: str, small_cover_path: str) -> None:
+    with Image.open(cover_path) as img:
+        resize_cover_to_small(img, save_path=small_cover_path)
+
+
+def _store_artwork(content: bytes, cover_path: str, small_cover_path: str) -> None:
+    with Image.open(BytesIO(content)) as img:
+        img.save(cover_path)
+        resize_cover_to_small(img, save_path=small_cover_path)
+
+
+class ImageHandler:
+    """Run image decoding, resizing and encoding in a bounded pool of threads.
+
+    Pillow releases the GIL while it decodes, resamples and encodes, so running
+    those calls in threads keeps the event loop responsive without copying
+    images to other processes. At most `max_pending` jobs are queued or running
+    at once, further callers wait for a free slot.
+    """
+
+    def __init__(self, max_workers: int, max_pending: int) -> None:
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor: ThreadPoolExecutor | None = None
+        # asyncio semaphores can't be shared across event loops
+        self._semaphores: weakref.WeakKeyDictionary[
+            asyncio.AbstractEventLoop, asyncio.Semaphore
+        ] = weakref.WeakKeyDictionary()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="image"
+            )
+        return self._executor
+
+    async def _run(self, func: Callable[..., Any], *args: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        if loop not in self._semaphores:
+            self._semaphores[loop] = asyncio.Semaphore(self.max_pending)
+
+        async with self._semaphores[loop]:
+            return await loop.run_in_executor(self._get_executor(), func, *args)
+
+    async def store_small_cover(self, cover_path: str, small_cover_path: str) -> None:
+        """Resize a stored cover to the small size
+
+        Args:
+            cover_path: path of the stored cover
+            small_cover_path: path to save the small cover to
+        """
+        await self._run(_store_small_cover, cover_path, small_cover_path)
+
+    async def store_artwork(
+        self, content: bytes, cover_path: str, small_cover_path: str
+    ) -> None:
+        """Store an uploaded cover in both sizes
+
+        Args:
+            content: encoded image
+            cover_path: path to save the big cover to
+            small_cover_path: path to save the small cover to
+        """
+        await self._run(_store_artwork, content, cover_path, small_cover_path)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+image_handler = ImageHandler(
+    max_workers=IMAGE_PROCESSING_WORKERS,
+    max_pending=IMAGE_PROCESSING_MAX_PENDING,
+)
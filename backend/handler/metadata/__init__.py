@@ -1,7 +1,9 @@
+from .dat_handler import DATHandler
 from .igdb_handler import IGDBBaseHandler
 from .moby_handler import MobyGamesHandler
 from .sgdb_handler import SGDBBaseHandler
 
+meta_dat_handler = DATHandler()
 meta_igdb_handler = IGDBBaseHandler()
 meta_moby_handler = MobyGamesHandler()
 meta_sgdb_handler = SGDBBaseHandler()
@@ -1,9 +1,12 @@
+import asyncio
+import functools
 import json
 import os
 import re
 import unicodedata
+from collections.abc import Awaitable, Callable, Sequence
 from itertools import batched
-from typing import Final
+from typing import Final, TypeVar
 
 from handler.redis_handler import async_cache, sync_cache
 from logger.logger import log
@@ -13,6 +16,14 @@ from tasks.update_switch_titledb import (
     update_switch_titledb_task,
 )
 
+_T = TypeVar("_T")
+
+# Number of normalized names kept in memory
+NORMALIZED_NAMES_CACHE_SIZE: Final = 2**16
+
+# Number of search term variants looked up at the same time for a rom
+SEARCH_VARIANTS_CONCURRENCY: Final = 3
+
 
 def conditionally_set_cache(
     index_key: str, filename: str, parent_dir: str = os.path.dirname(__file__)
@@ -54,6 +65,13 @@ PSP_SERIAL_INDEX_KEY: Final = "romm:psp_serial_index"
 conditionally_set_cache(PSP_SERIAL_INDEX_KEY, "psp_serial_index.json")
 
 
+def search_serial(
+    pattern: re.Pattern[str], serial: str | None, file_name: str
+) -> re.Match[str] | None:
+    """Match a serial pattern on the serial read from the rom, then on its file name"""
+    return (pattern.search(serial) if serial else None) or pattern.search(file_name)
+
+
 class MetadataHandler:
     @staticmethod
     def normalize_search_term(search_term: str) -> str:
@@ -69,8 +87,9 @@ class MetadataHandler:
     def _normalize_cover_url(url: str) -> str:
         return url if not url else f"https:{url.replace('https:', '')}"
 
-    # This is expensive, so it should be used sparingly
+    # This is expensive, so results are memoized as the same titles come up often
     @staticmethod
+    @functools.lru_cache(maxsize=NORMALIZED_NAMES_CACHE_SIZE)
     def _normalize_exact_match(name: str) -> str:
         name = (
             name.lower()  # Convert to lower case,
@@ -97,6 +116,42 @@ class MetadataHandler:
 
         return canonical_form
 
+    @staticmethod
+    async def _resolve_first_match(
+        candidates: Sequence[Callable[[], Awaitable[_T | None]]],
+        concurrency: int = SEARCH_VARIANTS_CONCURRENCY,
+    ) -> _T | None:
+        """Run lookups speculatively, returning the first match in order of priority
+
+        The first lookup runs alone, as it usually matches. Once it found nothing,
+        at most `concurrency` lookups run at once, starting from the one being
+        waited on. The result of a lookup is only used once every lookup before
+        it found nothing, so the precedence is the same as running them one by
+        one, and the remaining lookups are cancelled as soon as one matches.
+
+        Args:
+            candidates: lookups, from highest to lowest priority
+            concurrency: maximum number of lookups running at once
+        Returns
+            Result of the first lookup that matched, None if none did
+        """
+        tasks: list[asyncio.Task[_T | None]] = []
+        try:
+            for idx in range(len(candidates)):
+                window = idx + concurrency if idx else 1
+                while len(tasks) < min(window, len(candidates)):
+                    tasks.append(asyncio.create_task(candidates[len(tasks)]()))
+
+                result = await tasks[idx]
+                if result:
+                    return result
+
+            return None
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
     async def _ps2_opl_format(self, match: re.Match[str], search_term: str) -> str:
         serial_code = match.group(1)
         index_entry = await async_cache.hget(PS2_OPL_KEY, serial_code)
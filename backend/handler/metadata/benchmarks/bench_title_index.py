@@ -0,0 +1,90 @@
+# python3 -m handler.metadata.benchmarks.bench_title_index --titles 20000
+"""Measure how many candidate titles the local title index scores per second.
+
+Builds a `TitleIndex` from deterministic game titles, then looks up the titles
+again with a typo, as found in rom file names. Lookups are timed scoring every
+candidate and with the confidence threshold, and the cost of normalizing names
+is compared with and without memoization.
+"""
+
+import argparse
+import random
+import time
+
+from handler.metadata.base_hander import MetadataHandler
+from handler.metadata.title_index import TitleIndex
+
+WORDS = (
+    "super mario zelda legend of the quest dragon final fantasy kart star fox "
+    "metal gear solid sonic hedgehog street fighter tetris racing world cup "
+    "castle vania mega man kirby dream land donkey kong country pokemon red "
+    "blue crystal advance island adventure tales knights saga wars chronicles"
+).split()
+
+
+def build_titles(count: int, rng: random.Random) -> list[str]:
+    return [
+        f"{' '.join(rng.choices(WORDS, k=rng.randint(2, 5))).title()} {idx % 7 or ''}"
+        for idx in range(count)
+    ]
+
+
+def add_typo(title: str, rng: random.Random) -> str:
+    idx = rng.randrange(len(title))
+    return f"{title[:idx]}{rng.choice('aeiou')}{title[idx + 1 :]}"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--titles", type=int, default=20000, help="Indexed titles")
+    parser.add_argument("--lookups", type=int, default=2000, help="Lookups")
+    parser.add_argument("--threshold", type=float, default=0.9, help="Threshold")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    titles = build_titles(args.titles, rng)
+    queries = [add_typo(rng.choice(titles), rng) for _ in range(args.lookups)]
+
+    normalize = MetadataHandler._normalize_exact_match
+    for name, normalizer in (
+        ("plain", normalize.__wrapped__),
+        ("memoized", normalize),
+    ):
+        normalize.cache_clear()
+        start = time.perf_counter()
+        for _ in range(3):
+            for title in titles:
+                normalizer(title)
+        elapsed = time.perf_counter() - start
+        print(f"{name:>8} normalizer: {len(titles) * 3 / elapsed:12,.0f} names/s")
+
+    index = TitleIndex(normalize)
+    start = time.perf_counter()
+    for game_id, title in enumerate(titles):
+        index.add(game_id, [title])
+    print(f"      index build: {time.perf_counter() - start:12.2f}s")
+
+    # Without a threshold every name sharing a trigram is scored, with one only
+    # the names holding the rarest trigrams of the search term are
+    for mode, threshold in (("full", 0.0), ("threshold", args.threshold)):
+        candidates = 0
+        matches = 0
+        start = time.perf_counter()
+        for query in queries:
+            scores = index.search(query, threshold)
+            candidates += len(scores)
+            matches += (
+                len([score for score in scores.values() if score >= args.threshold])
+                == 1
+            )
+        elapsed = time.perf_counter() - start
+
+        print(
+            f"{mode:>9} search: {len(queries) / elapsed:12,.0f} lookups/s, "
+            f"{candidates / elapsed:12,.0f} candidates/s returned, "
+            f"{matches / len(queries):.1%} matched locally"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,440 @@
+import fcntl
+import glob
+import os
+import re
+import sqlite3
+import threading
+import xml.etree.ElementTree as ET  # nosec B405
+from collections.abc import Iterator
+from itertools import chain
+from typing import Final, NotRequired, TypedDict
+
+from config.config_manager import ROMM_USER_CONFIG_PATH
+from handler.filesystem.base_handler import TAG_REGEX
+from logger.logger import log
+
+DATS_BASE_PATH: Final = f"{ROMM_USER_CONFIG_PATH}/dats"
+DATS_INDEX_FILE: Final = ".index.sqlite3"
+DATS_FILE_EXTENSIONS: Final = ("dat", "xml")
+# Games written to the index per transaction while importing
+DATS_IMPORT_BATCH_SIZE: Final = 1000
+# Digests are stored as raw bytes, their kind is told apart by their length
+HASH_KINDS: Final = (("sha1", 20), ("md5", 16), ("crc", 4))
+# Indexes built with another schema are rebuilt
+DATS_INDEX_VERSION: Final = 4
+# Game code of cartridge serials, as read from the header, e.g. BPEE in AGB-BPEE-USA
+CARTRIDGE_SERIAL_REGEX: Final = re.compile(r"^[A-Z]{3,4}-([A-Z0-9]{4})-[A-Z]{3}$")
+
+INDEX_SCHEMA: Final = """
+CREATE TABLE dats (
+    id INTEGER PRIMARY KEY,
+    file_name TEXT NOT NULL,
+    platform TEXT,
+    name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE TABLE games (
+    id INTEGER PRIMARY KEY,
+    dat_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    region TEXT,
+    serial TEXT
+);
+CREATE TABLE hashes (
+    hash BLOB NOT NULL,
+    dat_id INTEGER NOT NULL,
+    game_id INTEGER NOT NULL,
+    PRIMARY KEY (hash, dat_id)
+) WITHOUT ROWID;
+CREATE TABLE serials (
+    serial TEXT NOT NULL,
+    dat_id INTEGER NOT NULL,
+    game_id INTEGER NOT NULL,
+    PRIMARY KEY (serial, dat_id)
+) WITHOUT ROWID;
+"""
+
+
+class DATGame(TypedDict):
+    dat_name: str
+    name: str
+    title: str
+    region: NotRequired[str | None]
+    serial: NotRequired[str | None]
+
+
+def _parse_digest(value: str | None, length: int) -> bytes | None:
+    if not value:
+        return None
+
+    try:
+        digest = bytes.fromhex(value.strip())
+    except ValueError:
+        return None
+
+    return digest if len(digest) == length else None
+
+
+def normalize_serial(serial: str) -> str:
+    return "".join(serial.split()).upper()
+
+
+def _serial_keys(serial: str | None) -> list[str]:
+    """Build the keys a game is found by from its serials, listed comma separated"""
+    keys = []
+    for part in (serial or "").split(","):
+        key = normalize_serial(part)
+        if not key:
+            continue
+
+        keys.append(key)
+        match = CARTRIDGE_SERIAL_REGEX.match(key)
+        if match:
+            keys.append(match.group(1))
+
+    return keys
+
+
+def parse_dat_file(
+    file_path: str,
+) -> Iterator[tuple[str, str, str | None, str | None, list[bytes]]]:
+    """Stream the games of a Logiqx XML DAT file
+
+    Elements are released as soon as each game is read, so the memory used
+    doesn't depend on the size of the file.
+
+    Args:
+        file_path: path to the DAT file
+    Yields
+        DAT name, game name, region, serial and digests of the roms and disks of
+        each game
+    """
+    dat_name = os.path.splitext(os.path.basename(file_path))[0]
+    root: ET.Element | None = None
+
+    for event, elem in ET.iterparse(file_path, events=("start", "end")):  # nosec B314
+        if event == "start":
+            if root is None:
+                root = elem
+            continue
+
+        if elem.tag == "header":
+            dat_name = (elem.findtext("name") or "").strip() or dat_name
+            elem.clear()
+            continue
+
+        if elem.tag not in ("game", "machine"):
+            continue
+
+        name = elem.get("name") or (elem.findtext("description") or "").strip()
+        release = elem.find("release")
+        region = release.get("region") if release is not None else None
+        serial = (elem.findtext("serial") or "").strip() or None
+
+        digests = []
+        # Disks are the CHD images of MAME DATs, listed by the sha1 in their header
+        for rom in chain(elem.iter("rom"), elem.iter("disk")):
+            serial = serial or rom.get("serial")
+            for kind, length in HASH_KINDS:
+                digest = _parse_digest(rom.get(kind), length)
+                if digest:
+                    digests.append(digest)
+
+        if name and digests:
+            yield dat_name, name, region, serial, digests
+
+        # Drop the game, and the reference the root keeps to it
+        elem.clear()
+        if root is not None:
+            root.clear()
+
+
+class DATHandler:
+    """Identify roms by hash against local No-Intro, Redump and MAME DAT files.
+
+    Logiqx XML DAT files dropped into the dats config folder are imported into a
+    sqlite index, where every CRC, MD5 and SHA1 digest of a DAT points to its game.
+    The index is rebuilt when the DAT files change.
+
+    DAT files in a subfolder named after the folder of a platform in the library,
+    e.g. dats/gba, only identify the roms of that platform. DAT files at the root
+    of the dats folder identify the roms of any platform, but only by MD5 or SHA1,
+    as a CRC or a serial alone can match the rom of another system.
+    """
+
+    def __init__(
+        self, dats_path: str = DATS_BASE_PATH, index_file: str = DATS_INDEX_FILE
+    ) -> None:
+        self.dats_path = dats_path
+        self.index_path = os.path.join(dats_path, index_file)
+        self._connection: sqlite3.Connection | None = None
+        self._connection_identity: tuple[int, int] | None = None
+        self._lock = threading.Lock()
+
+    def _list_dat_files(self) -> list[tuple[str, int, int]]:
+        dat_files = []
+        for extension in DATS_FILE_EXTENSIONS:
+            # DAT files of a platform are in the subfolder named after it
+            for pattern in (f"*.{extension}", f"*/*.{extension}"):
+                for file_path in glob.glob(f"{glob.escape(self.dats_path)}/{pattern}"):
+                    file_stat = os.stat(file_path)
+                    dat_files.append(
+                        (
+                            os.path.relpath(file_path, self.dats_path),
+                            file_stat.st_size,
+                            file_stat.st_mtime_ns,
+                        )
+                    )
+
+        return sorted(dat_files)
+
+    def _get_connection(self) -> sqlite3.Connection | None:
+        """Open the index, reopening it if it was rebuilt since it was last opened"""
+        try:
+            index_stat = os.stat(self.index_path)
+        except FileNotFoundError:
+            self._close()
+            return None
+
+        identity = (index_stat.st_ino, index_stat.st_mtime_ns)
+        with self._lock:
+            if self._connection is None or self._connection_identity != identity:
+                self._close()
+                self._connection = sqlite3.connect(
+                    f"file:{self.index_path}?mode=ro",
+                    uri=True,
+                    check_same_thread=False,
+                )
+                self._connection_identity = identity
+
+            return self._connection
+
+    def _close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+            self._connection_identity = None
+
+    def _get_indexed_dat_files(self) -> list[tuple[str, int, int]]:
+        connection = self._get_connection()
+        if connection is None:
+            return []
+
+        try:
+            (version,) = connection.execute("PRAGMA user_version").fetchone()
+            if version != DATS_INDEX_VERSION:
+                return []
+
+            return sorted(
+                connection.execute("SELECT file_name, size, mtime_ns FROM dats")
+            )
+        except sqlite3.DatabaseError:
+            return []
+
+    def is_stale(self) -> bool:
+        """Check if DAT files were added, changed or removed since the last import"""
+        dat_files = self._list_dat_files()
+        if not dat_files:
+            return os.path.exists(self.index_path)
+
+        return dat_files != self._get_indexed_dat_files()
+
+    def _build_index(self, dat_files: list[tuple[str, int, int]]) -> None:
+        tmp_index_path = f"{self.index_path}.{os.getpid()}.tmp"
+        if os.path.exists(tmp_index_path):
+            os.remove(tmp_index_path)
+
+        connection = sqlite3.connect(tmp_index_path)
+        try:
+            connection.execute("PRAGMA journal_mode = OFF")
+            connection.execute("PRAGMA synchronous = OFF")
+            connection.executescript(INDEX_SCHEMA)
+            connection.execute(f"PRAGMA user_version = {DATS_INDEX_VERSION}")
+
+            game_id = 0
+            for dat_id, (file_name, size, mtime_ns) in enumerate(dat_files):
+                file_path = os.path.join(self.dats_path, file_name)
+                platform_fs_slug = os.path.dirname(file_name) or None
+                dat_name = os.path.splitext(os.path.basename(file_name))[0]
+                games: list[tuple[int, int, str, str | None, str | None]] = []
+                hashes: list[tuple[bytes, int, int]] = []
+                serials: list[tuple[str, int, int]] = []
+                try:
+                    for game in parse_dat_file(file_path):
+                        # The DAT is named after its header once it's been read
+                        dat_name, name, region, serial, digests = game
+                        game_id += 1
+                        games.append((game_id, dat_id, name, region, serial))
+                        hashes.extend((digest, dat_id, game_id) for digest in digests)
+                        serials.extend(
+                            (key, dat_id, game_id) for key in _serial_keys(serial)
+                        )
+
+                        if len(games) >= DATS_IMPORT_BATCH_SIZE:
+                            self._insert_games(connection, games, hashes, serials)
+                            games, hashes, serials = [], [], []
+                except ET.ParseError as e:
+                    log.error(f"DAT file {file_name} couldn't be imported: {e}")
+
+                self._insert_games(connection, games, hashes, serials)
+                connection.execute(
+                    "INSERT INTO dats VALUES (?, ?, ?, ?, ?, ?)",
+                    (dat_id, file_name, platform_fs_slug, dat_name, size, mtime_ns),
+                )
+                connection.commit()
+                log.info(f"Imported DAT file {file_name}")
+        finally:
+            connection.close()
+
+        os.replace(tmp_index_path, self.index_path)
+
+    @staticmethod
+    def _insert_games(
+        connection: sqlite3.Connection,
+        games: list[tuple[int, int, str, str | None, str | None]],
+        hashes: list[tuple[bytes, int, int]],
+        serials: list[tuple[str, int, int]],
+    ) -> None:
+        connection.executemany("INSERT INTO games VALUES (?, ?, ?, ?, ?)", games)
+        # The first game of each DAT a digest or serial was found in is kept
+        connection.executemany("INSERT OR IGNORE INTO hashes VALUES (?, ?, ?)", hashes)
+        connection.executemany(
+            "INSERT OR IGNORE INTO serials VALUES (?, ?, ?)", serials
+        )
+
+    def update_index(self) -> None:
+        """Rebuild the index if the DAT files changed since the last import"""
+        try:
+            if not self.is_stale():
+                return
+
+            # Only one process rebuilds the index, the others wait and reuse it
+            with open(f"{self.index_path}.lock", "w") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                if not self.is_stale():
+                    return
+
+                dat_files = self._list_dat_files()
+                if not dat_files:
+                    os.remove(self.index_path)
+                    return
+
+                log.info(f"Importing {len(dat_files)} DAT files...")
+                self._build_index(dat_files)
+        except (OSError, sqlite3.Error) as e:
+            log.error(f"DAT files couldn't be imported: {e}")
+
+    def get_game(
+        self,
+        platform_fs_slug: str,
+        crc_hash: str = "",
+        md5_hash: str = "",
+        sha1_hash: str = "",
+        **_kwargs,
+    ) -> DATGame | None:
+        """Find the game of a rom by its hashes, trying the strongest ones first
+
+        Args:
+            platform_fs_slug: library folder of the platform of the rom
+            crc_hash: crc32 of the rom
+            md5_hash: md5 of the rom
+            sha1_hash: sha1 of the rom
+        Returns
+            Game of the first DAT file the rom was found in, the DAT files of the
+            platform first, if any
+        """
+        hashes = {"sha1": sha1_hash, "md5": md5_hash, "crc": crc_hash}
+        digests = [
+            (kind, digest)
+            for kind, length in HASH_KINDS
+            if (digest := _parse_digest(hashes[kind], length))
+        ]
+        if not digests:
+            return None
+
+        for kind, digest in digests:
+            # A CRC is only trusted in the DAT files of the platform
+            game = self._find_game(
+                "hashes",
+                "hash",
+                digest,
+                platform_fs_slug,
+                only_platform=kind == "crc",
+            )
+            if game:
+                return game
+
+        return None
+
+    def get_game_by_serial(self, platform_fs_slug: str, serial: str) -> DATGame | None:
+        """Find the game of a rom by its serial, or the game code in its header
+
+        Game codes are only 4 characters long and reused across systems, so only
+        the DAT files of the platform are searched.
+
+        Args:
+            platform_fs_slug: library folder of the platform of the rom
+            serial: serial of the rom
+        Returns
+            Game of the first DAT file of the platform the serial was found in, if any
+        """
+        key = normalize_serial(serial)
+        if not key:
+            return None
+
+        return self._find_game(
+            "serials", "serial", key, platform_fs_slug, only_platform=True
+        )
+
+    def _find_game(
+        self,
+        table: str,
+        column: str,
+        key: bytes | str,
+        platform_fs_slug: str | None = None,
+        only_platform: bool = False,
+    ) -> DATGame | None:
+        """Find a game by key, in the DAT files of the platform then in the others
+
+        Args:
+            platform_fs_slug: platform of the DAT files to search, all if None
+            only_platform: skip the DAT files at the root of the dats folder
+        """
+        connection = self._get_connection()
+        if connection is None:
+            return None
+
+        conditions = [f"{table}.{column} = :key"]
+        if platform_fs_slug is not None:
+            conditions.append(
+                "dats.platform = :platform"
+                if only_platform
+                else "(dats.platform = :platform OR dats.platform IS NULL)"
+            )
+        try:
+            row = connection.execute(
+                "SELECT dats.name, games.name, games.region, games.serial "  # nosec B608
+                f"FROM {table} "
+                f"JOIN games ON games.id = {table}.game_id "
+                "JOIN dats ON dats.id = games.dat_id "
+                f"WHERE {' AND '.join(conditions)} "
+                "ORDER BY dats.platform IS NULL, dats.id "
+                "LIMIT 1",
+                {"key": key, "platform": platform_fs_slug},
+            ).fetchone()
+        except sqlite3.DatabaseError as e:
+            log.error(f"DAT index couldn't be read: {e}")
+            return None
+
+        if not row:
+            return None
+
+        dat_name, name, region, serial = row
+        return DATGame(
+            dat_name=dat_name,
+            name=name,
+            title=TAG_REGEX.split(name)[0].strip() or name,
+            region=region,
+            serial=serial,
+        )
@@ -1,16 +1,16 @@
 import functools
-import re
+import http
 from typing import Final, NotRequired, TypedDict
 
 import httpx
 import pydash
 from adapters.services.igdb_types import GameCategory
-from config import IGDB_CLIENT_ID, IGDB_CLIENT_SECRET, IS_PYTEST_RUN
+from config import IGDB_CLIENT_ID, IGDB_CLIENT_SECRET, IGDB_RATE_LIMIT, IS_PYTEST_RUN
 from fastapi import HTTPException, status
 from handler.redis_handler import async_cache
 from logger.logger import log
 from unidecode import unidecode as uc
-from utils.context import ctx_httpx_client
+from utils.context import ctx_httpx_client, set_context_var
 
 from .base_hander import (
     PS2_OPL_REGEX,
@@ -18,7 +18,17 @@ from .base_hander import (
     SWITCH_PRODUCT_ID_REGEX,
     SWITCH_TITLEDB_REGEX,
     MetadataHandler,
+    search_serial,
 )
+from .igdb_multiquery import IGDBMultiQueryBatcher, ctx_igdb_multiquery
+from .miss_cache import (
+    MetadataMissCache,
+    ctx_metadata_request_errors,
+    track_request_error,
+)
+from .rate_limiter import MetadataRateLimiter, parse_retry_after
+from .response_cache import MetadataResponseCache
+from .title_index import MetadataTitleIndex
 
 # Used to display the IGDB API status in the frontend
 IGDB_API_ENABLED: Final = bool(IGDB_CLIENT_ID) and bool(IGDB_CLIENT_SECRET)
@@ -217,8 +227,28 @@ class IGDBBaseHandler(MetadataHandler):
         self.games_fields = GAMES_FIELDS
         self.search_endpoint = f"{self.BASE_URL}/search"
         self.search_fields = SEARCH_FIELDS
+        self.multiquery_endpoint = f"{self.BASE_URL}/multiquery"
+        self.multiquery_endpoints = ("games", "search")
         self.pagination_limit = 200
         self.twitch_auth = TwitchAuth()
+        self.response_cache = MetadataResponseCache(
+            "igdb",
+            ttls={
+                "search": 60 * 60 * 24,  # 1 day
+                "games": 60 * 60 * 24 * 7,  # 1 week
+                "platforms": 60 * 60 * 24 * 30,  # 30 days
+                "platform_versions": 60 * 60 * 24 * 30,  # 30 days
+            },
+            default_ttl=60 * 60 * 24,
+        )
+        self.miss_cache = MetadataMissCache("igdb")
+        self.title_index = MetadataTitleIndex("igdb", self._normalize_exact_match)
+        # IGDB allows 4 requests per second, and up to 8 open requests
+        self.rate_limiter = MetadataRateLimiter("igdb", rate=IGDB_RATE_LIMIT, burst=4)
+        # Concurrent game searches share multiquery requests, and rate limit tokens
+        self.multiquery_batcher = IGDBMultiQueryBatcher(
+            lambda body: self._post(self.multiquery_endpoint, body)
+        )
         self.headers = {
             "Client-ID": IGDB_CLIENT_ID,
             "Accept": "application/json",
@@ -235,6 +265,30 @@ class IGDBBaseHandler(MetadataHandler):
         return wrapper
 
     async def _request(self, url: str, data: str, timeout: int = 120) -> list:
+        query = f"{data} limit {self.pagination_limit};"
+        cached_response = await self.response_cache.get(url, query)
+        if cached_response is not None:
+            return cached_response
+
+        endpoint = url.removeprefix(f"{self.BASE_URL}/")
+        if ctx_igdb_multiquery.get() and endpoint in self.multiquery_endpoints:
+            response = await self.multiquery_batcher.query(endpoint, query)
+        else:
+            response = await self._post(url, query, timeout)
+
+        if response is None:
+            track_request_error(url)
+            return []  # All requests to the IGDB API return a list
+
+        await self.response_cache.set(url, query, response)
+        return response
+
+    async def _post(self, url: str, query: str, timeout: int = 120) -> list | None:
+        """Send a query to the IGDB API, retrying once if it fails
+
+        Returns
+            Decoded JSON response, None if the request failed
+        """
         httpx_client = ctx_httpx_client.get()
         try:
             masked_headers = self._mask_sensitive_values(self.headers)
@@ -242,12 +296,13 @@ class IGDBBaseHandler(MetadataHandler):
                 "API request: URL=%s, Headers=%s, Content=%s, Timeout=%s",
                 url,
                 masked_headers,
-                f"{data} limit {self.pagination_limit};",
+                query,
                 timeout,
             )
+            await self.rate_limiter.acquire()
             res = await httpx_client.post(
                 url,
-                content=f"{data} limit {self.pagination_limit};",
+                content=query,
                 headers=self.headers,
                 timeout=timeout,
             )
@@ -261,15 +316,19 @@ class IGDBBaseHandler(MetadataHandler):
                 detail="Can't connect to IGDB, check your internet connection",
             ) from exc
         except httpx.HTTPStatusError as err:
-            # Retry once if the auth token is invalid
-            if err.response.status_code != 401:
+            if err.response.status_code == http.HTTPStatus.TOO_MANY_REQUESTS:
+                # Retry once the rate limit allows it
+                await self.rate_limiter.retry_after(
+                    parse_retry_after(err.response.headers.get("Retry-After")) or 1
+                )
+            elif err.response.status_code == http.HTTPStatus.UNAUTHORIZED:
+                # Attempt to force a token refresh if the token is invalid, and retry once
+                log.warning("Twitch token invalid: fetching a new one...")
+                token = await self.twitch_auth._update_twitch_token()
+                self.headers["Authorization"] = f"Bearer {token}"
+            else:
                 log.error(err)
-                return []  # All requests to the IGDB API return a list
-
-            # Attempt to force a token refresh if the token is invalid
-            log.warning("Twitch token invalid: fetching a new one...")
-            token = await self.twitch_auth._update_twitch_token()
-            self.headers["Authorization"] = f"Bearer {token}"
+                return None
         except httpx.TimeoutException:
             # Retry once the request if it times out
             pass
@@ -279,25 +338,30 @@ class IGDBBaseHandler(MetadataHandler):
                 "Making a second attempt API request: URL=%s, Headers=%s, Content=%s, Timeout=%s",
                 url,
                 masked_headers,
-                f"{data} limit {self.pagination_limit};",
+                query,
                 timeout,
             )
+            await self.rate_limiter.acquire()
             res = await httpx_client.post(
                 url,
-                content=f"{data} limit {self.pagination_limit};",
+                content=query,
                 headers=self.headers,
                 timeout=timeout,
             )
             res.raise_for_status()
         except httpx.HTTPError as err:
-            # Log the error and return an empty list if the request fails again
+            # Log the error and give up if the request fails again
             log.error(err)
-            return []
+            return None
 
         return res.json()
 
     async def _search_rom(
-        self, search_term: str, platform_igdb_id: int, with_category: bool = False
+        self,
+        search_term: str,
+        platform_igdb_id: int,
+        with_category: bool = False,
+        expanded_searches: dict[str, list[dict]] | None = None,
     ) -> dict | None:
         if not platform_igdb_id:
             return None
@@ -340,33 +404,116 @@ class IGDBBaseHandler(MetadataHandler):
             self.games_endpoint,
             data=f'search "{search_term}"; fields {",".join(self.games_fields)}; where platforms=[{platform_igdb_id}] {category_filter};',
         )
+        await self._index_titles(platform_igdb_id, roms)
         for rom in roms:
             # Return early if an exact match is found.
             if is_exact_match(rom, search_term):
                 return rom
 
+        # The expanded search doesn't depend on the category, so the variants of
+        # the same term share it
+        if expanded_searches is not None and search_term in expanded_searches:
+            extra_roms = expanded_searches[search_term]
+        else:
+            extra_roms = await self._search_expanded(search_term, platform_igdb_id)
+            if expanded_searches is not None:
+                expanded_searches[search_term] = extra_roms
+
+        for rom in extra_roms:
+            # Return early if an exact match is found.
+            if is_exact_match(rom, search_term):
+                return rom
+
+        roms.extend(extra_roms)
+        return roms[0] if roms else None
+
+    async def _search_expanded(
+        self, search_term: str, platform_igdb_id: int
+    ) -> list[dict]:
+        """Search the names and alternative names of the games, then fetch the first
+        game found"""
         log.debug("Searching expanded in search endpoint")
         roms_expanded = await self._request(
             self.search_endpoint,
             data=f'fields {",".join(self.search_fields)}; where game.platforms=[{platform_igdb_id}] & (name ~ *"{search_term}"* | alternative_name ~ *"{search_term}"*);',
         )
-        if roms_expanded:
-            log.debug(
-                "Searching expanded in games endpoint for expanded game %s",
-                roms_expanded[0]["game"],
-            )
-            extra_roms = await self._request(
-                self.games_endpoint,
-                f'fields {",".join(self.games_fields)}; where id={roms_expanded[0]["game"]["id"]};',
-            )
-            for rom in extra_roms:
-                # Return early if an exact match is found.
-                if is_exact_match(rom, search_term):
-                    return rom
+        if not roms_expanded:
+            return []
 
-            roms.extend(extra_roms)
+        log.debug(
+            "Searching expanded in games endpoint for expanded game %s",
+            roms_expanded[0]["game"],
+        )
+        extra_roms = await self._request(
+            self.games_endpoint,
+            f'fields {",".join(self.games_fields)}; where id={roms_expanded[0]["game"]["id"]};',
+        )
+        await self._index_titles(platform_igdb_id, extra_roms)
+        return extra_roms
+
+    async def _index_titles(self, platform_igdb_id: int, roms: list[dict]) -> None:
+        """Add the names of the games found by a search to the local title index"""
+        await self.title_index.add_titles(
+            platform_igdb_id,
+            {
+                rom["id"]: [
+                    rom["name"],
+                    *pydash.map_(rom.get("alternative_names", []), "name"),
+                ]
+                for rom in roms
+            },
+        )
 
-        return roms[0] if roms else None
+    async def _match_local_title(
+        self, search_term: str, platform_igdb_id: int
+    ) -> dict | None:
+        """Match a rom with the local title index, then fetch the game by id"""
+        igdb_id = await self.title_index.match(platform_igdb_id, search_term)
+        if not igdb_id:
+            return None
+
+        log.debug("Matched %s to IGDB game %s locally", search_term, igdb_id)
+        roms = await self._request(
+            self.games_endpoint,
+            f'fields {",".join(self.games_fields)}; where id={igdb_id};',
+        )
+        return pydash.get(roms, "[0]", None)
+
+    async def _search_rom_variants(
+        self, search_term: str, platform_igdb_id: int
+    ) -> dict | None:
+        """Search a rom, then the variants of its search term until one matches
+
+        The variants are searched speculatively, keeping their order of precedence.
+        """
+        # Search with category first, then without it
+        variants = [(search_term, True), (search_term, False)]
+
+        # Split the search term since igdb struggles with colons
+        if ":" in search_term:
+            variants.extend((term, False) for term in search_term.split(":")[::-1])
+
+        # Some MAME games have two titles split by a slash
+        if "/" in search_term:
+            variants.extend((term.strip(), False) for term in search_term.split("/"))
+
+        # Searching the same variant twice would find nothing new
+        variants = list(dict.fromkeys(variants))
+        log.debug("Searching for %s on IGDB", [term for term, _ in variants])
+
+        expanded_searches: dict[str, list[dict]] = {}
+        return await self._resolve_first_match(
+            [
+                functools.partial(
+                    self._search_rom,
+                    term,
+                    platform_igdb_id,
+                    with_category,
+                    expanded_searches,
+                )
+                for term, with_category in variants
+            ]
+        )
 
     @check_twitch_token
     async def get_platform(self, slug: str) -> IGDBPlatform:
@@ -413,7 +560,13 @@ class IGDBBaseHandler(MetadataHandler):
         return IGDBPlatform(igdb_id=None, slug=slug)
 
     @check_twitch_token
-    async def get_rom(self, file_name: str, platform_igdb_id: int) -> IGDBRom:
+    async def get_rom(
+        self,
+        file_name: str,
+        platform_igdb_id: int,
+        title: str | None = None,
+        serial: str | None = None,
+    ) -> IGDBRom:
         from handler.filesystem import fs_rom_handler
 
         if not IGDB_API_ENABLED:
@@ -422,7 +575,7 @@ class IGDBBaseHandler(MetadataHandler):
         if not platform_igdb_id:
             return IGDBRom(igdb_id=None)
 
-        search_term = fs_rom_handler.get_file_name_with_no_tags(file_name)
+        search_term = title or fs_rom_handler.get_file_name_with_no_tags(file_name)
         fallback_rom = IGDBRom(igdb_id=None)
 
         # Support for PS2 OPL filename format
@@ -432,7 +585,7 @@ class IGDBBaseHandler(MetadataHandler):
             fallback_rom = IGDBRom(igdb_id=None, name=search_term)
 
         # Support for sony serial filename format (PS, PS3, PS3)
-        match = SONY_SERIAL_REGEX.search(file_name, re.IGNORECASE)
+        match = search_serial(SONY_SERIAL_REGEX, serial, file_name)
         if platform_igdb_id == PS1_IGDB_ID and match:
             search_term = await self._ps1_serial_format(match, search_term)
             fallback_rom = IGDBRom(igdb_id=None, name=search_term)
@@ -461,7 +614,7 @@ class IGDBBaseHandler(MetadataHandler):
                 )
 
         # Support for switch productID filename format
-        match = SWITCH_PRODUCT_ID_REGEX.search(file_name)
+        match = search_serial(SWITCH_PRODUCT_ID_REGEX, serial, file_name)
         if platform_igdb_id == SWITCH_IGDB_ID and match:
             search_term, index_entry = await self._switch_productid_format(
                 match, search_term
@@ -481,38 +634,23 @@ class IGDBBaseHandler(MetadataHandler):
             fallback_rom = IGDBRom(igdb_id=None, name=search_term)
 
         search_term = self.normalize_search_term(search_term)
+        if await self.miss_cache.is_known_miss(platform_igdb_id, search_term):
+            log.debug("Skipping %s on IGDB, it wasn't found recently", search_term)
+            return fallback_rom
 
-        log.debug("Searching for %s on IGDB with category", search_term)
-        rom = await self._search_rom(search_term, platform_igdb_id, with_category=True)
-        if not rom:
-            log.debug("Searching for %s on IGDB without category", search_term)
-            rom = await self._search_rom(search_term, platform_igdb_id)
-
-        # Split the search term since igdb struggles with colons
-        if not rom and ":" in search_term:
-            for term in search_term.split(":")[::-1]:
-                log.debug(
-                    "Searching for %s on IGDB without category after splitting semicolon",
-                    term,
-                )
-                rom = await self._search_rom(term, platform_igdb_id)
-                if rom:
-                    break
-
-        # Some MAME games have two titles split by a slash
-        if not rom and "/" in search_term:
-            for term in search_term.split("/"):
-                log.debug(
-                    "Searching for %s on IGDB without category after splitting slash",
-                    term,
-                )
-                rom = await self._search_rom(term.strip(), platform_igdb_id)
-                if rom:
-                    break
+        request_errors: list[str] = []
+        async with set_context_var(ctx_metadata_request_errors, request_errors):
+            rom = await self._match_local_title(
+                search_term, platform_igdb_id
+            ) or await self._search_rom_variants(search_term, platform_igdb_id)
 
         if not rom:
+            if not request_errors:
+                await self.miss_cache.add_miss(platform_igdb_id, search_term, file_name)
             return fallback_rom
 
+        await self.miss_cache.clear(platform_igdb_id, search_term)
+
         return IGDBRom(
             igdb_id=rom["id"],
             slug=rom["slug"],
@@ -0,0 +1,110 @@
+import asyncio
+import weakref
+from collections.abc import Awaitable, Callable
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Final
+
+# IGDB accepts up to 10 queries in a single multiquery request
+MULTIQUERY_MAX_QUERIES: Final = 10
+# How long the first query of a batch waits for others to join it, in seconds
+MULTIQUERY_BATCH_DELAY: Final = 0.05
+
+# Set to batch the queries of concurrent lookups, e.g. during scans
+ctx_igdb_multiquery: ContextVar[bool] = ContextVar("igdb_multiquery", default=False)
+
+
+@dataclass
+class _PendingQuery:
+    endpoint: str
+    query: str
+    future: asyncio.Future[list | None]
+
+
+@dataclass
+class _Batch:
+    queries: list[_PendingQuery] = field(default_factory=list)
+    flush_handle: asyncio.TimerHandle | None = None
+
+
+class IGDBMultiQueryBatcher:
+    """Packs the queries of concurrent callers into IGDB multiquery requests.
+
+    The first query of a batch waits `MULTIQUERY_BATCH_DELAY` for others to
+    join, and a full batch is sent right away. Each caller gets back the result
+    of its own query, or None if the multiquery request failed.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[str], Awaitable[list | None]],
+        max_queries: int = MULTIQUERY_MAX_QUERIES,
+        delay: float = MULTIQUERY_BATCH_DELAY,
+    ) -> None:
+        self.send = send
+        self.max_queries = max_queries
+        self.delay = delay
+        # Pending batches, per event loop since futures can't be shared across loops
+        self._batches: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _Batch] = (
+            weakref.WeakKeyDictionary()
+        )
+        self._tasks: set[asyncio.Task] = set()
+
+    async def query(self, endpoint: str, query: str) -> list | None:
+        """Queue a query and wait for its result
+
+        Args:
+            endpoint: name of the IGDB endpoint, e.g. "games"
+            query: apicalypse query, including its limit
+        Returns
+            Results of the query, None if the request failed
+        """
+        loop = asyncio.get_running_loop()
+        batch = self._batches.setdefault(loop, _Batch())
+        future: asyncio.Future[list | None] = loop.create_future()
+        batch.queries.append(_PendingQuery(endpoint, query, future))
+
+        if len(batch.queries) >= self.max_queries:
+            self._flush(loop)
+        elif not batch.flush_handle:
+            batch.flush_handle = loop.call_later(self.delay, self._flush, loop)
+
+        return await future
+
+    def _flush(self, loop: asyncio.AbstractEventLoop) -> None:
+        batch = self._batches.pop(loop, None)
+        if not batch:
+            return
+
+        if batch.flush_handle:
+            batch.flush_handle.cancel()
+
+        task = loop.create_task(self._send_batch(batch.queries))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _send_batch(self, queries: list[_PendingQuery]) -> None:
+        body = "".join(
+            f'query {pending.endpoint} "{idx}" {{ {pending.query} }};\n'
+            for idx, pending in enumerate(queries)
+        )
+
+        try:
+            response = await self.send(body)
+            results = (
+                {item["name"]: item.get("result", []) for item in response}
+                if response is not None
+                else {}
+            )
+            for idx, pending in enumerate(queries):
+                if not pending.future.done():
+                    pending.future.set_result(results.get(str(idx)))
+        except Exception as exc:
+            for pending in queries:
+                if not pending.future.done():
+                    pending.future.set_exception(exc)
+        finally:
+            # Don't leave callers waiting if the request was cancelled
+            for pending in queries:
+                if not pending.future.done():
+                    pending.future.cancel()
@@ -0,0 +1,131 @@
+import hashlib
+import json
+import time
+from contextvars import ContextVar
+from typing import Final
+
+from config import (
+    METADATA_CACHE_ENABLED,
+    METADATA_MISS_BACKOFF_BASE,
+    METADATA_MISS_BACKOFF_MAX,
+)
+from handler.redis_handler import async_cache
+from logger.logger import log
+from redis.exceptions import RedisError
+
+METADATA_MISSES_KEY_PREFIX: Final = "romm:metadata_misses"
+
+# Set to skip the searches that recently found nothing, e.g. during unidentified scans
+ctx_metadata_skip_known_misses: ContextVar[bool] = ContextVar(
+    "metadata_skip_known_misses", default=False
+)
+
+# Urls of the failed requests made while searching a rom, so searches that
+# couldn't reach the provider aren't recorded as misses
+ctx_metadata_request_errors: ContextVar[list[str] | None] = ContextVar(
+    "metadata_request_errors", default=None
+)
+
+
+def track_request_error(url: str) -> None:
+    """Flag the current rom search as failed, rather than not found"""
+    request_errors = ctx_metadata_request_errors.get()
+    if request_errors is not None:
+        request_errors.append(url)
+
+
+class MetadataMissCache:
+    """Searches that found nothing, shared by every worker through redis.
+
+    Misses are keyed on the provider, the platform and the normalized search
+    term. Each consecutive miss doubles the time before the search is retried,
+    from `METADATA_MISS_BACKOFF_BASE` up to `METADATA_MISS_BACKOFF_MAX`.
+    Renamed files get a new search term, and a miss is cleared as soon as the
+    search finds a match or the rom is matched manually.
+    """
+
+    def __init__(self, provider: str) -> None:
+        self.provider = provider
+
+    @staticmethod
+    def _hash(value: str) -> str:
+        return hashlib.sha1(value.encode(), usedforsecurity=False).hexdigest()
+
+    def _build_key(self, platform_id: int, search_term: str) -> str:
+        normalized_term = " ".join(search_term.lower().split())
+        return f"{METADATA_MISSES_KEY_PREFIX}:{self.provider}:{platform_id}:{self._hash(normalized_term)}"
+
+    def _build_file_key(self, platform_id: int, file_name: str) -> str:
+        return f"{METADATA_MISSES_KEY_PREFIX}:{self.provider}:{platform_id}:file:{self._hash(file_name)}"
+
+    async def is_known_miss(self, platform_id: int, search_term: str) -> bool:
+        """Check if the search recently found nothing and shouldn't be retried yet
+
+        Only applies when `ctx_metadata_skip_known_misses` is set.
+        """
+        if not METADATA_CACHE_ENABLED or not ctx_metadata_skip_known_misses.get():
+            return False
+
+        try:
+            miss = await async_cache.get(self._build_key(platform_id, search_term))
+        except RedisError as exc:
+            log.warning(f"Unable to read the {self.provider} misses cache: {exc}")
+            return False
+
+        return bool(miss) and json.loads(miss)["retry_at"] > time.time()
+
+    async def add_miss(
+        self, platform_id: int, search_term: str, file_name: str
+    ) -> None:
+        """Record a search that found nothing, and back off its next retry
+
+        Args:
+            platform_id: provider id of the platform
+            search_term: normalized search term
+            file_name: name of the rom file the search was made for
+        """
+        if not METADATA_CACHE_ENABLED:
+            return
+
+        key = self._build_key(platform_id, search_term)
+        try:
+            miss = await async_cache.get(key)
+            misses = json.loads(miss)["misses"] + 1 if miss else 1
+            backoff = min(
+                METADATA_MISS_BACKOFF_BASE * 2 ** (misses - 1),
+                METADATA_MISS_BACKOFF_MAX,
+            )
+            # Kept past the retry, so a new miss keeps backing off
+            expiry = backoff + METADATA_MISS_BACKOFF_MAX
+            async with async_cache.pipeline() as pipe:
+                pipe.set(
+                    key,
+                    json.dumps({"misses": misses, "retry_at": time.time() + backoff}),
+                    ex=expiry,
+                )
+                pipe.set(self._build_file_key(platform_id, file_name), key, ex=expiry)
+                await pipe.execute()
+        except RedisError as exc:
+            log.warning(f"Unable to write the {self.provider} misses cache: {exc}")
+
+    async def clear(self, platform_id: int, search_term: str) -> None:
+        """Forget the misses of a search"""
+        if not METADATA_CACHE_ENABLED:
+            return
+
+        try:
+            await async_cache.delete(self._build_key(platform_id, search_term))
+        except RedisError as exc:
+            log.warning(f"Unable to write the {self.provider} misses cache: {exc}")
+
+    async def clear_file(self, platform_id: int | None, file_name: str) -> None:
+        """Forget the misses of the last search made for a rom file"""
+        if not METADATA_CACHE_ENABLED or not platform_id:
+            return
+
+        file_key = self._build_file_key(platform_id, file_name)
+        try:
+            key = await async_cache.get(file_key)
+            await async_cache.delete(file_key, *([key] if key else []))
+        except RedisError as exc:
+            log.warning(f"Unable to write the {self.provider} misses cache: {exc}")
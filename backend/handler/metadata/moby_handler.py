@@ -1,17 +1,16 @@
-import asyncio
+import functools
 import http
-import re
 from typing import Final, NotRequired, TypedDict
-from urllib.parse import quote
+from urllib.parse import quote, urlencode
 
 import httpx
 import pydash
 import yarl
-from config import MOBYGAMES_API_KEY
+from config import MOBYGAMES_API_KEY, MOBYGAMES_RATE_LIMIT
 from fastapi import HTTPException, status
 from logger.logger import log
 from unidecode import unidecode as uc
-from utils.context import ctx_httpx_client
+from utils.context import ctx_httpx_client, set_context_var
 
 from .base_hander import (
     PS2_OPL_REGEX,
@@ -19,7 +18,16 @@ from .base_hander import (
     SWITCH_PRODUCT_ID_REGEX,
     SWITCH_TITLEDB_REGEX,
     MetadataHandler,
+    search_serial,
 )
+from .miss_cache import (
+    MetadataMissCache,
+    ctx_metadata_request_errors,
+    track_request_error,
+)
+from .rate_limiter import MetadataRateLimiter, parse_retry_after
+from .response_cache import MetadataResponseCache
+from .title_index import MetadataTitleIndex
 
 # Used to display the Mobygames API status in the frontend
 MOBY_API_ENABLED: Final = bool(MOBYGAMES_API_KEY)
@@ -81,8 +89,24 @@ class MobyGamesHandler(MetadataHandler):
         self.BASE_URL = "https://api.mobygames.com/v1"
         self.platform_url = f"{self.BASE_URL}/platforms"
         self.games_url = f"{self.BASE_URL}/games"
+        self.response_cache = MetadataResponseCache(
+            "moby",
+            ttls={
+                "games": 60 * 60 * 24 * 7,  # 1 week
+                "platforms": 60 * 60 * 24 * 30,  # 30 days
+            },
+            default_ttl=60 * 60 * 24,
+        )
+        self.miss_cache = MetadataMissCache("moby")
+        self.title_index = MetadataTitleIndex("moby", self._normalize_exact_match)
+        self.rate_limiter = MetadataRateLimiter("moby", rate=MOBYGAMES_RATE_LIMIT)
 
     async def _request(self, url: str, timeout: int = 120) -> dict:
+        query = urlencode(sorted(yarl.URL(url).query.items()))
+        cached_response = await self.response_cache.get(url, query)
+        if cached_response is not None:
+            return cached_response
+
         httpx_client = ctx_httpx_client.get()
         authorized_url = yarl.URL(url).update_query(api_key=MOBYGAMES_API_KEY)
         masked_url = authorized_url.with_query(
@@ -96,8 +120,10 @@ class MobyGamesHandler(MetadataHandler):
         )
 
         try:
+            await self.rate_limiter.acquire()
             res = await httpx_client.get(str(authorized_url), timeout=timeout)
             res.raise_for_status()
+            await self.response_cache.set(url, query, res.json())
             return res.json()
         except httpx.NetworkError as exc:
             log.critical("Connection error: can't connect to Mobygames", exc_info=True)
@@ -109,26 +135,29 @@ class MobyGamesHandler(MetadataHandler):
             if err.response.status_code == http.HTTPStatus.UNAUTHORIZED:
                 # Sometimes Mobygames returns 401 even with a valid API key
                 log.error(err)
+                track_request_error(url)
                 return {}
             elif err.response.status_code == http.HTTPStatus.TOO_MANY_REQUESTS:
-                # Retry after 2 seconds if rate limit hit
-                await asyncio.sleep(2)
+                # Retry once the rate limit allows it
+                await self.rate_limiter.retry_after(
+                    parse_retry_after(err.response.headers.get("Retry-After")) or 2
+                )
             else:
                 # Log the error and return an empty dict if the request fails with a different code
                 log.error(err)
+                track_request_error(url)
                 return {}
         except httpx.TimeoutException:
-            log.debug(
-                "Request to URL=%s timed out. Retrying with URL=%s", masked_url, url
-            )
+            log.debug("Request to URL=%s timed out. Retrying", masked_url)
             # Retry the request once if it times out
         try:
             log.debug(
                 "API request: URL=%s, Timeout=%s",
-                url,
+                masked_url,
                 timeout,
             )
-            res = await httpx_client.get(url, timeout=timeout)
+            await self.rate_limiter.acquire()
+            res = await httpx_client.get(str(authorized_url), timeout=timeout)
             res.raise_for_status()
         except (httpx.HTTPStatusError, httpx.TimeoutException) as err:
             if (
@@ -136,11 +165,14 @@ class MobyGamesHandler(MetadataHandler):
                 and err.response.status_code == http.HTTPStatus.UNAUTHORIZED
             ):
                 # Sometimes Mobygames returns 401 even with a valid API key
+                track_request_error(url)
                 return {}
             # Log the error and return an empty dict if the request fails with a different code
             log.error(err)
+            track_request_error(url)
             return {}
 
+        await self.response_cache.set(url, query, res.json())
         return res.json()
 
     async def _search_rom(self, search_term: str, platform_moby_id: int) -> dict | None:
@@ -153,6 +185,16 @@ class MobyGamesHandler(MetadataHandler):
             title=quote(search_term, safe="/ "),
         )
         roms = (await self._request(str(url))).get("games", [])
+        await self.title_index.add_titles(
+            platform_moby_id,
+            {
+                rom["game_id"]: [
+                    rom["title"],
+                    *pydash.map_(rom.get("alternate_titles", []), "title"),
+                ]
+                for rom in roms
+            },
+        )
 
         exact_matches = [
             rom
@@ -180,7 +222,54 @@ class MobyGamesHandler(MetadataHandler):
             name=platform["name"],
         )
 
-    async def get_rom(self, file_name: str, platform_moby_id: int) -> MobyGamesRom:
+    async def _match_local_title(
+        self, search_term: str, platform_moby_id: int
+    ) -> dict | None:
+        """Match a rom with the local title index, then fetch the game by id"""
+        moby_id = await self.title_index.match(platform_moby_id, search_term)
+        if not moby_id:
+            return None
+
+        log.debug("Matched %s to Mobygames game %s locally", search_term, moby_id)
+        url = yarl.URL(self.games_url).with_query(id=moby_id)
+        roms = (await self._request(str(url))).get("games", [])
+        return pydash.get(roms, "[0]", None)
+
+    async def _search_rom_variants(
+        self, search_term: str, platform_moby_id: int
+    ) -> dict | None:
+        """Search a rom, then the variants of its search term until one matches
+
+        The variants are searched speculatively, keeping their order of precedence.
+        """
+        variants = [search_term]
+
+        # Split the search term since mobygames search doesn't support special caracters
+        if ":" in search_term:
+            variants.extend(search_term.split(":")[::-1])
+
+        # Some MAME games have two titles split by a slash
+        if "/" in search_term:
+            variants.extend(term.strip() for term in search_term.split("/"))
+
+        # Searching the same variant twice would find nothing new
+        variants = list(dict.fromkeys(variants))
+        log.debug("Searching for %s on Mobygames", variants)
+
+        return await self._resolve_first_match(
+            [
+                functools.partial(self._search_rom, term, platform_moby_id)
+                for term in variants
+            ]
+        )
+
+    async def get_rom(
+        self,
+        file_name: str,
+        platform_moby_id: int,
+        title: str | None = None,
+        serial: str | None = None,
+    ) -> MobyGamesRom:
         from handler.filesystem import fs_rom_handler
 
         if not MOBY_API_ENABLED:
@@ -189,7 +278,7 @@ class MobyGamesHandler(MetadataHandler):
         if not platform_moby_id:
             return MobyGamesRom(moby_id=None)
 
-        search_term = fs_rom_handler.get_file_name_with_no_tags(file_name)
+        search_term = title or fs_rom_handler.get_file_name_with_no_tags(file_name)
         fallback_rom = MobyGamesRom(moby_id=None)
 
         # Support for PS2 OPL filename format
@@ -199,7 +288,7 @@ class MobyGamesHandler(MetadataHandler):
             fallback_rom = MobyGamesRom(moby_id=None, name=search_term)
 
         # Support for sony serial filename format (PS, PS3, PS3)
-        match = SONY_SERIAL_REGEX.search(file_name, re.IGNORECASE)
+        match = search_serial(SONY_SERIAL_REGEX, serial, file_name)
         if platform_moby_id == PS1_MOBY_ID and match:
             search_term = await self._ps1_serial_format(match, search_term)
             fallback_rom = MobyGamesRom(moby_id=None, name=search_term)
@@ -228,7 +317,7 @@ class MobyGamesHandler(MetadataHandler):
                 )
 
         # Support for switch productID filename format
-        match = SWITCH_PRODUCT_ID_REGEX.search(file_name)
+        match = search_serial(SWITCH_PRODUCT_ID_REGEX, serial, file_name)
         if platform_moby_id == SWITCH_MOBY_ID and match:
             search_term, index_entry = await self._switch_productid_format(
                 match, search_term
@@ -248,25 +337,23 @@ class MobyGamesHandler(MetadataHandler):
             fallback_rom = MobyGamesRom(moby_id=None, name=search_term)
 
         search_term = self.normalize_search_term(search_term)
-        res = await self._search_rom(search_term, platform_moby_id)
-
-        # Split the search term since mobygames search doesn't support special caracters
-        if not res and ":" in search_term:
-            for term in search_term.split(":")[::-1]:
-                res = await self._search_rom(term, platform_moby_id)
-                if res:
-                    break
+        if await self.miss_cache.is_known_miss(platform_moby_id, search_term):
+            log.debug("Skipping %s on Mobygames, it wasn't found recently", search_term)
+            return fallback_rom
 
-        # Some MAME games have two titles split by a slash
-        if not res and "/" in search_term:
-            for term in search_term.split("/"):
-                res = await self._search_rom(term.strip(), platform_moby_id)
-                if res:
-                    break
+        request_errors: list[str] = []
+        async with set_context_var(ctx_metadata_request_errors, request_errors):
+            res = await self._match_local_title(
+                search_term, platform_moby_id
+            ) or await self._search_rom_variants(search_term, platform_moby_id)
 
         if not res:
+            if not request_errors:
+                await self.miss_cache.add_miss(platform_moby_id, search_term, file_name)
             return fallback_rom
 
+        await self.miss_cache.clear(platform_moby_id, search_term)
+
         rom = {
             "moby_id": res["game_id"],
             "name": res["title"],
@@ -0,0 +1,141 @@
+import asyncio
+import math
+import time
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from typing import Final
+
+from handler.redis_handler import async_cache
+from logger.logger import log
+from redis.exceptions import RedisError, WatchError
+
+RATE_LIMIT_KEY_PREFIX: Final = "romm:metadata_rate_limit"
+
+
+@dataclass
+class RateLimiterStats:
+    requests: int = 0
+    throttled: int = 0
+    wait_time: float = 0.0
+    max_wait_time: float = 0.0
+    retry_afters: int = 0
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Parse a Retry-After header, given either in seconds or as an HTTP date
+
+    Returns
+        Seconds to wait before retrying, None if the header is missing or invalid
+    """
+    if not value:
+        return None
+
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class MetadataRateLimiter:
+    """Token bucket limiting the requests sent to a provider, shared by every
+    web and worker process through redis.
+
+    The bucket is stored as the time at which it will be full again (the
+    generic cell rate algorithm), so taking a token is a single atomic update.
+    Callers that find it empty reserve the next free token and sleep until
+    then, instead of polling. `Retry-After` responses push every reservation
+    back until the provider accepts requests again.
+    """
+
+    def __init__(self, provider: str, rate: float, burst: int = 1) -> None:
+        self.provider = provider
+        self.key = f"{RATE_LIMIT_KEY_PREFIX}:{provider}"
+        self.rate = rate
+        self.burst = burst
+        self.stats = RateLimiterStats()
+
+    async def _reserve(self, not_before: float = 0.0) -> float:
+        """Take a token from the bucket, or reserve the next one
+
+        Args:
+            not_before: seconds from now before which no token is handed out
+        Returns
+            Seconds to wait before the token can be used
+        """
+        interval = 1 / self.rate
+        tolerance = (self.burst - 1) * interval
+
+        async with async_cache.pipeline() as pipe:
+            while True:
+                try:
+                    await pipe.watch(self.key)
+                    # Use the redis clock, which every process agrees on
+                    seconds, microseconds = await pipe.time()
+                    now = seconds + microseconds / 1_000_000
+                    full_at = max(
+                        float(await pipe.get(self.key) or 0),
+                        now + not_before + tolerance if not_before else now,
+                    )
+                    wait = max(full_at - tolerance - now, 0.0)
+                    full_at += 0.0 if not_before else interval
+
+                    pipe.multi()
+                    pipe.set(
+                        self.key,
+                        repr(full_at),
+                        px=max(math.ceil((full_at - now) * 1000), 1),
+                    )
+                    await pipe.execute()
+                    return wait
+                except WatchError:
+                    # Another process took a token first
+                    continue
+
+    async def acquire(self) -> None:
+        """Wait until a request can be sent to the provider"""
+        if self.rate <= 0:
+            return
+
+        try:
+            wait = await self._reserve()
+        except RedisError as exc:
+            log.warning(f"Unable to rate limit the {self.provider} requests: {exc}")
+            return
+
+        self.stats.requests += 1
+        if wait > 0:
+            self.stats.throttled += 1
+            self.stats.wait_time += wait
+            self.stats.max_wait_time = max(self.stats.max_wait_time, wait)
+            await asyncio.sleep(wait)
+
+    async def retry_after(self, seconds: float) -> None:
+        """Hold every request to the provider back after it asked to retry later
+
+        The next tokens are only handed out once the delay is over, so callers
+        retry through `acquire` as usual.
+
+        Args:
+            seconds: seconds to wait, usually from the Retry-After header
+        """
+        self.stats.retry_afters += 1
+        log.warning(
+            f"{self.provider} rate limit exceeded, retrying in {seconds:.1f} seconds"
+        )
+
+        if self.rate > 0:
+            try:
+                await self._reserve(not_before=seconds)
+                return
+            except RedisError as exc:
+                log.warning(f"Unable to rate limit the {self.provider} requests: {exc}")
+
+        await asyncio.sleep(seconds)
+
+    def reset_stats(self) -> None:
+        self.stats = RateLimiterStats()
@@ -0,0 +1,136 @@
+import hashlib
+import json
+import time
+from contextvars import ContextVar
+from typing import Any, Final
+
+from config import (
+    METADATA_CACHE_ENABLED,
+    METADATA_CACHE_MAX_ENTRY_SIZE,
+    METADATA_CACHE_MAX_SIZE,
+)
+from handler.redis_handler import async_cache
+from logger.logger import log
+from redis.exceptions import RedisError
+
+METADATA_CACHE_KEY_PREFIX: Final = "romm:metadata"
+# Cached keys by expiry time, their sizes, and the total size of the cache
+METADATA_CACHE_EXPIRIES_KEY: Final = "romm:metadata_cache:expiries"
+METADATA_CACHE_SIZES_KEY: Final = "romm:metadata_cache:sizes"
+METADATA_CACHE_TOTAL_SIZE_KEY: Final = "romm:metadata_cache:total_size"
+# Number of entries removed at a time once the cache is over its total size
+METADATA_CACHE_EVICTION_BATCH_SIZE: Final = 100
+
+# Set to skip cached responses and refresh them, e.g. during complete rescans
+ctx_metadata_cache_bypass: ContextVar[bool] = ContextVar(
+    "metadata_cache_bypass", default=False
+)
+
+
+class MetadataResponseCache:
+    """Cache of metadata API responses, shared by every worker through redis.
+
+    Responses are keyed on the provider, the endpoint and the normalized query,
+    and expire after a TTL that depends on the endpoint. Responses larger than
+    `METADATA_CACHE_MAX_ENTRY_SIZE` aren't cached, and once the cache grows past
+    `METADATA_CACHE_MAX_SIZE` the entries closest to expiring are removed first.
+    """
+
+    def __init__(self, provider: str, ttls: dict[str, int], default_ttl: int) -> None:
+        self.provider = provider
+        self.ttls = ttls
+        self.default_ttl = default_ttl
+
+    @staticmethod
+    def _get_endpoint(url: str) -> str:
+        return url.split("?", 1)[0].rstrip("/").rsplit("/", 1)[-1]
+
+    def _build_key(self, url: str, query: str) -> str:
+        normalized_query = " ".join(query.split())
+        query_hash = hashlib.sha1(
+            f"{url.split('?', 1)[0]}\n{normalized_query}".encode(),
+            usedforsecurity=False,
+        ).hexdigest()
+        return f"{METADATA_CACHE_KEY_PREFIX}:{self.provider}:{self._get_endpoint(url)}:{query_hash}"
+
+    async def get(self, url: str, query: str) -> Any | None:
+        """Returns the cached response for a request, if any
+
+        Args:
+            url: url of the endpoint
+            query: query sent to the endpoint, without any credentials
+        """
+        if not METADATA_CACHE_ENABLED or ctx_metadata_cache_bypass.get():
+            return None
+
+        try:
+            cached_response = await async_cache.get(self._build_key(url, query))
+        except RedisError as exc:
+            log.warning(f"Unable to read the {self.provider} response cache: {exc}")
+            return None
+
+        return json.loads(cached_response) if cached_response else None
+
+    async def set(self, url: str, query: str, response: Any) -> None:
+        """Cache the response of a successful request
+
+        Args:
+            url: url of the endpoint
+            query: query sent to the endpoint, without any credentials
+            response: decoded JSON response
+        """
+        if not METADATA_CACHE_ENABLED:
+            return
+
+        serialized_response = json.dumps(response)
+        if len(serialized_response) > METADATA_CACHE_MAX_ENTRY_SIZE:
+            return
+
+        key = self._build_key(url, query)
+        ttl = self.ttls.get(self._get_endpoint(url), self.default_ttl)
+        try:
+            previous_size = await async_cache.hget(METADATA_CACHE_SIZES_KEY, key)
+            async with async_cache.pipeline() as pipe:
+                pipe.set(key, serialized_response, ex=ttl)
+                pipe.zadd(METADATA_CACHE_EXPIRIES_KEY, {key: time.time() + ttl})
+                pipe.hset(METADATA_CACHE_SIZES_KEY, key, len(serialized_response))
+                pipe.incrby(
+                    METADATA_CACHE_TOTAL_SIZE_KEY,
+                    len(serialized_response) - int(previous_size or 0),
+                )
+                *_, total_size = await pipe.execute()
+
+            if total_size > METADATA_CACHE_MAX_SIZE:
+                await self._evict(total_size)
+        except RedisError as exc:
+            log.warning(f"Unable to write the {self.provider} response cache: {exc}")
+
+    @staticmethod
+    async def _evict(total_size: int) -> None:
+        """Remove the entries closest to expiring until the cache fits in its size
+
+        Entries that already expired are still counted until they are removed
+        here, and as they have the lowest expiry times they go first.
+
+        Args:
+            total_size: current total size of the cache, in bytes
+        """
+        while total_size > METADATA_CACHE_MAX_SIZE:
+            # Popping is atomic, so each entry is only discounted once
+            evicted = await async_cache.zpopmin(
+                METADATA_CACHE_EXPIRIES_KEY, METADATA_CACHE_EVICTION_BATCH_SIZE
+            )
+            if not evicted:
+                return
+
+            keys = [key for key, _ in evicted]
+            async with async_cache.pipeline() as pipe:
+                pipe.hmget(METADATA_CACHE_SIZES_KEY, keys)
+                pipe.hdel(METADATA_CACHE_SIZES_KEY, *keys)
+                pipe.delete(*keys)
+                sizes, *_ = await pipe.execute()
+
+            total_size = await async_cache.incrby(
+                METADATA_CACHE_TOTAL_SIZE_KEY,
+                -sum(int(size) for size in sizes if size),
+            )
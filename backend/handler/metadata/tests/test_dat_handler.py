@@ -0,0 +1,228 @@
+import os
+
+import pytest
+from handler.metadata.dat_handler import DATHandler, parse_dat_file
+
+NO_INTRO_DAT = """<?xml version="1.0"?>
+<!DOCTYPE datafile PUBLIC "-//Logiqx//DTD ROM Management Datafile//EN" "http://www.logiqx.com/Dats/datafile.dtd">
+<datafile>
+    <header>
+        <name>Nintendo - Super Nintendo Entertainment System</name>
+        <description>Nintendo - Super Nintendo Entertainment System</description>
+    </header>
+    <game name="Super Mario World (USA)">
+        <description>Super Mario World (USA)</description>
+        <rom name="Super Mario World (USA).sfc" size="524288" crc="B19ED489" md5="cdd3c8c37322978ca8669b34bc89c804" sha1="6b47bb75d16514b6a476aa0c73a683a2a4c18765" serial="SNS-MW-USA"/>
+    </game>
+    <game name="Super Metroid (Japan, USA) (En,Ja)">
+        <description>Super Metroid (Japan, USA) (En,Ja)</description>
+        <rom name="Super Metroid (Japan, USA) (En,Ja).sfc" size="3145728" crc="d63ed5f8" md5="21f3e98df4780ee1c667b84e57d88675"/>
+    </game>
+</datafile>
+"""
+
+REDUMP_DAT = """<?xml version="1.0"?>
+<datafile>
+    <header><name>Sony - PlayStation</name></header>
+    <game name="Crash Bandicoot (USA)">
+        <category>Games</category>
+        <description>Crash Bandicoot (USA)</description>
+        <release name="Crash Bandicoot (USA)" region="USA"/>
+        <serial>SCUS-94900</serial>
+        <rom name="Crash Bandicoot (USA).cue" size="85" crc="0b9d5b8f"/>
+        <rom name="Crash Bandicoot (USA).bin" size="526325184" crc="e5f6d5a9" sha1="1a2c6f2e5fd9b0c8ce7e4d0e4a10b7c1a1b1c9d3"/>
+    </game>
+</datafile>
+"""
+
+MAME_DAT = """<?xml version="1.0"?>
+<datafile>
+    <header><name>MAME CHDs</name></header>
+    <machine name="area51">
+        <description>Area 51 (R3000)</description>
+        <disk name="area51" sha1="3b303bc37e206a6d7339352c869f050d04186f11"/>
+    </machine>
+</datafile>
+"""
+
+
+@pytest.fixture
+def dat_handler(tmp_path):
+    (tmp_path / "snes").mkdir()
+    (tmp_path / "snes" / "snes.dat").write_text(NO_INTRO_DAT)
+    (tmp_path / "psx").mkdir()
+    (tmp_path / "psx" / "psx.xml").write_text(REDUMP_DAT)
+    (tmp_path / "readme.txt").write_text("not a dat")
+    return DATHandler(str(tmp_path))
+
+
+def test_parse_dat_file(tmp_path):
+    dat_path = tmp_path / "snes.dat"
+    dat_path.write_text(NO_INTRO_DAT)
+
+    games = list(parse_dat_file(str(dat_path)))
+
+    assert [(dat_name, name, serial) for dat_name, name, _, serial, _ in games] == [
+        (
+            "Nintendo - Super Nintendo Entertainment System",
+            "Super Mario World (USA)",
+            "SNS-MW-USA",
+        ),
+        (
+            "Nintendo - Super Nintendo Entertainment System",
+            "Super Metroid (Japan, USA) (En,Ja)",
+            None,
+        ),
+    ]
+    assert [len(digest) for digest in games[0][4]] == [20, 16, 4]
+
+
+def test_parse_dat_file_disks(tmp_path):
+    dat_path = tmp_path / "mame.dat"
+    dat_path.write_text(MAME_DAT)
+
+    assert list(parse_dat_file(str(dat_path))) == [
+        (
+            "MAME CHDs",
+            "area51",
+            None,
+            None,
+            [bytes.fromhex("3b303bc37e206a6d7339352c869f050d04186f11")],
+        )
+    ]
+
+
+def test_get_game_by_hash(dat_handler):
+    dat_handler.update_index()
+
+    game = dat_handler.get_game(
+        "snes",
+        crc_hash="b19ed489",
+        md5_hash="cdd3c8c37322978ca8669b34bc89c804",
+        sha1_hash="6b47bb75d16514b6a476aa0c73a683a2a4c18765",
+    )
+    assert game == {
+        "dat_name": "Nintendo - Super Nintendo Entertainment System",
+        "name": "Super Mario World (USA)",
+        "title": "Super Mario World",
+        "region": None,
+        "serial": "SNS-MW-USA",
+    }
+
+    # The strongest hash known to the DAT is used
+    game = dat_handler.get_game(
+        "snes", crc_hash="ffffffff", md5_hash="21f3e98df4780ee1c667b84e57d88675"
+    )
+    assert game and game["title"] == "Super Metroid"
+
+    game = dat_handler.get_game("psx", crc_hash="0B9D5B8F", md5_hash="", sha1_hash="")
+    assert game and game["region"] == "USA" and game["serial"] == "SCUS-94900"
+
+    assert dat_handler.get_game("snes", crc_hash="ffffffff") is None
+    assert dat_handler.get_game("snes", crc_hash="", md5_hash="", sha1_hash="") is None
+
+
+def test_get_game_by_hash_of_platform(dat_handler, tmp_path):
+    (tmp_path / "mame.dat").write_text(MAME_DAT)
+    (tmp_path / "gb").mkdir()
+    (tmp_path / "gb" / "gb.dat").write_text(
+        NO_INTRO_DAT.replace("Super Mario World (USA)", "Wario Land (World)")
+    )
+    dat_handler.update_index()
+
+    # A CRC alone only identifies the roms of the platform of the DAT
+    assert dat_handler.get_game("psx", crc_hash="b19ed489") is None
+    assert dat_handler.get_game("n64", crc_hash="b19ed489") is None
+    game = dat_handler.get_game("gb", crc_hash="b19ed489")
+    assert game and game["title"] == "Wario Land"
+
+    # Stronger hashes are found in the DATs of the platform first
+    md5_hash = "cdd3c8c37322978ca8669b34bc89c804"
+    game = dat_handler.get_game("snes", md5_hash=md5_hash)
+    assert game and game["title"] == "Super Mario World"
+    game = dat_handler.get_game("gb", md5_hash=md5_hash)
+    assert game and game["title"] == "Wario Land"
+    assert dat_handler.get_game("n64", md5_hash=md5_hash) is None
+
+    # DATs at the root of the folder apply to every platform
+    sha1_hash = "3b303bc37e206a6d7339352c869f050d04186f11"
+    game = dat_handler.get_game("arcade", sha1_hash=sha1_hash)
+    assert game and game["dat_name"] == "MAME CHDs"
+
+
+def test_get_game_by_serial(dat_handler, tmp_path):
+    (tmp_path / "gba").mkdir()
+    (tmp_path / "gba" / "gba.dat").write_text(
+        NO_INTRO_DAT.replace(
+            'serial="SNS-MW-USA"', 'serial="AGB-BPEE-USA, AGB-BPEE-USA-1"'
+        ).replace("Super Mario World (USA)", "Pokemon - Emerald Version (USA, Europe)")
+    )
+    dat_handler.update_index()
+
+    game = dat_handler.get_game_by_serial("psx", "scus-94900")
+    assert game and game["title"] == "Crash Bandicoot"
+
+    # Cartridges are also found by the game code in their header
+    game = dat_handler.get_game_by_serial("gba", "BPEE")
+    assert game and game["title"] == "Pokemon - Emerald Version"
+    assert dat_handler.get_game_by_serial("gba", "AGB-BPEE-USA-1") == game
+
+    assert dat_handler.get_game_by_serial("gba", "MW") is None
+    assert dat_handler.get_game_by_serial("gba", " ") is None
+
+
+def test_get_game_by_serial_of_platform(dat_handler, tmp_path):
+    (tmp_path / "gba").mkdir()
+    (tmp_path / "gba" / "gba.dat").write_text(
+        NO_INTRO_DAT.replace('serial="SNS-MW-USA"', 'serial="AGB-AMKE-USA"')
+    )
+    (tmp_path / "n64").mkdir()
+    (tmp_path / "n64" / "n64.dat").write_text(
+        NO_INTRO_DAT.replace('serial="SNS-MW-USA"', 'serial="NUS-AMKE-USA"').replace(
+            "Super Mario World (USA)", "Mario Kart 64 (USA)"
+        )
+    )
+    (tmp_path / "ps2.dat").write_text(REDUMP_DAT.replace("SCUS-94900", "AMKE"))
+    dat_handler.update_index()
+
+    # Game codes shared by systems are only looked up in the DATs of the platform
+    game = dat_handler.get_game_by_serial("gba", "AMKE")
+    assert game and game["title"] == "Super Mario World"
+    game = dat_handler.get_game_by_serial("n64", "AMKE")
+    assert game and game["title"] == "Mario Kart 64"
+    assert dat_handler.get_game_by_serial("psx", "AMKE") is None
+    assert dat_handler.get_game_by_serial("snes", "AMKE") is None
+
+
+def test_update_index_when_dats_change(dat_handler, tmp_path):
+    assert dat_handler.get_game("snes", crc_hash="b19ed489") is None
+    assert dat_handler.is_stale()
+
+    dat_handler.update_index()
+    assert not dat_handler.is_stale()
+    assert dat_handler.get_game("snes", crc_hash="b19ed489") is not None
+
+    os.remove(tmp_path / "snes" / "snes.dat")
+    assert dat_handler.is_stale()
+
+    dat_handler.update_index()
+    assert dat_handler.get_game("snes", crc_hash="b19ed489") is None
+    assert dat_handler.get_game("psx", crc_hash="0b9d5b8f") is not None
+
+    os.remove(tmp_path / "psx" / "psx.xml")
+    dat_handler.update_index()
+    assert not os.path.exists(dat_handler.index_path)
+    assert dat_handler.get_game("psx", crc_hash="0b9d5b8f") is None
+
+
+def test_update_index_with_broken_dat(dat_handler, tmp_path):
+    (tmp_path / "broken.dat").write_text(
+        NO_INTRO_DAT.replace("</datafile>", "<game name=")
+    )
+
+    dat_handler.update_index()
+
+    # Games read before the error are still imported
+    assert dat_handler.get_game("snes", crc_hash="b19ed489") is not None
+    assert dat_handler.get_game("psx", crc_hash="0b9d5b8f") is not None
+    assert not dat_handler.is_stale()
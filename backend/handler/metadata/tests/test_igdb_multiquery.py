@@ -0,0 +1,74 @@
+import asyncio
+import re
+
+import httpx
+import pytest
+from handler.metadata.igdb_handler import IGDBBaseHandler
+from handler.metadata.igdb_multiquery import IGDBMultiQueryBatcher, ctx_igdb_multiquery
+from handler.metadata.response_cache import ctx_metadata_cache_bypass
+from utils.context import ctx_httpx_client, set_context_var
+
+SUBQUERY_REGEX = re.compile(r'query (\w+) "(\d+)" \{ .*?where id=(\d+);')
+
+
+async def test_batched_queries_are_fanned_out():
+    requests: list[httpx.Request] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        if not request.url.path.endswith("/multiquery"):
+            return httpx.Response(404)
+        return httpx.Response(
+            200,
+            json=[
+                {"name": name, "result": [{"id": int(game_id), "endpoint": endpoint}]}
+                for endpoint, name, game_id in SUBQUERY_REGEX.findall(
+                    request.content.decode()
+                )
+            ],
+        )
+
+    igdb_handler = IGDBBaseHandler()
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        async with (
+            set_context_var(ctx_httpx_client, client),
+            set_context_var(ctx_metadata_cache_bypass, True),
+            set_context_var(ctx_igdb_multiquery, True),
+        ):
+            results = await asyncio.gather(
+                *(
+                    igdb_handler._request(
+                        (
+                            igdb_handler.games_endpoint
+                            if game_id % 2
+                            else igdb_handler.search_endpoint
+                        ),
+                        data=f"fields name; where id={game_id};",
+                    )
+                    for game_id in range(12)
+                )
+            )
+
+    # A full batch of 10 queries, then the remaining 2
+    assert len(requests) == 2
+    assert results == [
+        [{"id": game_id, "endpoint": "games" if game_id % 2 else "search"}]
+        for game_id in range(12)
+    ]
+
+
+async def test_failed_batch():
+    async def send(_body: str) -> list | None:
+        return None
+
+    batcher = IGDBMultiQueryBatcher(send)
+    assert await asyncio.gather(
+        batcher.query("games", "fields name;"), batcher.query("search", "fields *;")
+    ) == [None, None]
+
+    async def fail(_body: str) -> list | None:
+        raise httpx.ConnectError("Unreachable")
+
+    batcher = IGDBMultiQueryBatcher(fail)
+    with pytest.raises(httpx.ConnectError):
+        await batcher.query("games", "fields name;")
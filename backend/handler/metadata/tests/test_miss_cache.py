@@ -0,0 +1,82 @@
+import httpx
+import pytest
+from handler.metadata import igdb_handler, miss_cache
+from handler.metadata.igdb_handler import IGDBBaseHandler
+from handler.metadata.miss_cache import (
+    METADATA_MISSES_KEY_PREFIX,
+    MetadataMissCache,
+    ctx_metadata_skip_known_misses,
+)
+from handler.metadata.response_cache import ctx_metadata_cache_bypass
+from handler.redis_handler import async_cache
+from utils.context import ctx_httpx_client, set_context_var
+
+
+@pytest.fixture(autouse=True)
+async def clear_miss_cache():
+    async for key in async_cache.scan_iter(f"{METADATA_MISSES_KEY_PREFIX}:*"):
+        await async_cache.delete(key)
+    yield
+    async for key in async_cache.scan_iter(f"{METADATA_MISSES_KEY_PREFIX}:*"):
+        await async_cache.delete(key)
+
+
+async def test_misses_back_off(monkeypatch):
+    now = 1_000_000.0
+    monkeypatch.setattr(miss_cache.time, "time", lambda: now)
+    monkeypatch.setattr(miss_cache, "METADATA_MISS_BACKOFF_BASE", 100)
+    monkeypatch.setattr(miss_cache, "METADATA_MISS_BACKOFF_MAX", 300)
+    cache = MetadataMissCache("igdb")
+
+    await cache.add_miss(4, "Homebrew Quest", "Homebrew Quest (PD).zip")
+    # Misses are only skipped when asked to
+    assert not await cache.is_known_miss(4, "homebrew  quest")
+
+    async with set_context_var(ctx_metadata_skip_known_misses, True):
+        assert await cache.is_known_miss(4, "homebrew  quest")
+        assert not await cache.is_known_miss(5, "Homebrew Quest")
+
+        # Each new miss doubles the backoff, up to the maximum
+        for backoff in (100, 200, 300):
+            now += backoff - 1
+            assert await cache.is_known_miss(4, "Homebrew Quest")
+            now += 1
+            assert not await cache.is_known_miss(4, "Homebrew Quest")
+            await cache.add_miss(4, "Homebrew Quest", "Homebrew Quest (PD).zip")
+
+        await cache.clear_file(4, "Homebrew Quest (PD).zip")
+        assert not await cache.is_known_miss(4, "Homebrew Quest")
+
+
+async def test_igdb_get_rom_skips_known_misses(monkeypatch):
+    monkeypatch.setattr(igdb_handler, "IGDB_API_ENABLED", True)
+    requests: list[httpx.Request] = []
+    status_code = 500
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return httpx.Response(status_code, json=[])
+
+    handler_igdb = IGDBBaseHandler()
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        async with (
+            set_context_var(ctx_httpx_client, client),
+            set_context_var(ctx_metadata_cache_bypass, True),
+            set_context_var(ctx_metadata_skip_known_misses, True),
+        ):
+            # Failed searches aren't recorded as misses
+            await handler_igdb.get_rom("Homebrew Quest (PD).zip", 4)
+            failed_requests = len(requests)
+            await handler_igdb.get_rom("Homebrew Quest (PD).zip", 4)
+            assert len(requests) == failed_requests * 2
+
+            status_code = 200
+            requests.clear()
+            rom = await handler_igdb.get_rom("Homebrew Quest (PD).zip", 4)
+            assert rom["igdb_id"] is None
+            assert requests
+
+            requests.clear()
+            rom = await handler_igdb.get_rom("Homebrew Quest (PD).zip", 4)
+            assert rom["igdb_id"] is None
+            assert not requests
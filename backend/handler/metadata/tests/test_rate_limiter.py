@@ -0,0 +1,57 @@
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import pytest
+from handler.metadata import rate_limiter
+from handler.metadata.rate_limiter import MetadataRateLimiter, parse_retry_after
+from handler.redis_handler import async_cache
+
+
+@pytest.fixture
+async def limiter(monkeypatch):
+    waits: list[float] = []
+
+    async def record_sleep(seconds: float) -> None:
+        waits.append(seconds)
+
+    monkeypatch.setattr(rate_limiter.asyncio, "sleep", record_sleep)
+    limiter = MetadataRateLimiter("test", rate=10, burst=2)
+    await async_cache.delete(limiter.key)
+    yield limiter, waits
+    await async_cache.delete(limiter.key)
+
+
+async def test_acquire_reserves_tokens(limiter):
+    limiter, waits = limiter
+
+    for _ in range(4):
+        await limiter.acquire()
+
+    # The burst goes through, then requests are spaced out by the rate
+    assert waits == [pytest.approx(0.1, abs=0.05), pytest.approx(0.2, abs=0.05)]
+    assert limiter.stats.requests == 4
+    assert limiter.stats.throttled == 2
+    assert limiter.stats.wait_time == pytest.approx(0.3, abs=0.1)
+    assert limiter.stats.max_wait_time == waits[-1]
+
+
+async def test_retry_after_holds_requests_back(limiter):
+    limiter, waits = limiter
+
+    await limiter.retry_after(5)
+    await limiter.acquire()
+
+    assert waits == [pytest.approx(5, abs=0.05)]
+    assert limiter.stats.retry_afters == 1
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("3") == 3
+    assert parse_retry_after("-1") == 0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("soon") is None
+
+    retry_at = datetime.now(timezone.utc) + timedelta(seconds=30)
+    assert parse_retry_after(format_datetime(retry_at, usegmt=True)) == pytest.approx(
+        30, abs=1.5
+    )
@@ -0,0 +1,103 @@
+import httpx
+import pytest
+from handler.metadata import response_cache
+from handler.metadata.igdb_handler import IGDBBaseHandler
+from handler.metadata.response_cache import (
+    METADATA_CACHE_EXPIRIES_KEY,
+    METADATA_CACHE_KEY_PREFIX,
+    METADATA_CACHE_SIZES_KEY,
+    METADATA_CACHE_TOTAL_SIZE_KEY,
+    ctx_metadata_cache_bypass,
+)
+from handler.redis_handler import async_cache
+from utils.context import ctx_httpx_client, set_context_var
+
+
+async def _clear_response_cache():
+    async for key in async_cache.scan_iter(f"{METADATA_CACHE_KEY_PREFIX}:*"):
+        await async_cache.delete(key)
+    await async_cache.delete(
+        METADATA_CACHE_EXPIRIES_KEY,
+        METADATA_CACHE_SIZES_KEY,
+        METADATA_CACHE_TOTAL_SIZE_KEY,
+    )
+
+
+@pytest.fixture(autouse=True)
+async def clear_response_cache():
+    await _clear_response_cache()
+    yield
+    await _clear_response_cache()
+
+
+async def test_igdb_request_is_cached():
+    requests: list[httpx.Request] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        if b"missing" in request.content:
+            return httpx.Response(404)
+        return httpx.Response(200, json=[{"id": 1, "name": "Paper Mario"}])
+
+    igdb_handler = IGDBBaseHandler()
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        async with set_context_var(ctx_httpx_client, client):
+            games = await igdb_handler._request(
+                igdb_handler.games_endpoint, data="fields name; where id=1;"
+            )
+            # Same endpoint and query, with different whitespace
+            cached_games = await igdb_handler._request(
+                igdb_handler.games_endpoint, data="fields name;  where id=1; "
+            )
+            assert games == cached_games == [{"id": 1, "name": "Paper Mario"}]
+            assert len(requests) == 1
+
+            async with set_context_var(ctx_metadata_cache_bypass, True):
+                await igdb_handler._request(
+                    igdb_handler.games_endpoint, data="fields name; where id=1;"
+                )
+            assert len(requests) == 2
+
+            # Failed requests are not cached
+            for _ in range(2):
+                assert (
+                    await igdb_handler._request(
+                        igdb_handler.games_endpoint, data="fields name; missing"
+                    )
+                    == []
+                )
+            assert len(requests) == 4
+
+
+async def test_large_responses_are_not_cached(monkeypatch):
+    monkeypatch.setattr(response_cache, "METADATA_CACHE_MAX_ENTRY_SIZE", 10)
+    cache = response_cache.MetadataResponseCache("igdb", ttls={}, default_ttl=60)
+
+    await cache.set("https://api.igdb.com/v4/games", "fields name;", [{"id": 1}] * 10)
+    assert await cache.get("https://api.igdb.com/v4/games", "fields name;") is None
+
+    await cache.set("https://api.igdb.com/v4/games", "fields *;", [])
+    assert await cache.get("https://api.igdb.com/v4/games", "fields *;") == []
+
+
+async def test_cache_is_bounded_in_size(monkeypatch):
+    monkeypatch.setattr(response_cache, "METADATA_CACHE_MAX_SIZE", 100)
+    monkeypatch.setattr(response_cache, "METADATA_CACHE_EVICTION_BATCH_SIZE", 1)
+    cache = response_cache.MetadataResponseCache(
+        "igdb", ttls={"search": 60}, default_ttl=3600
+    )
+    response = ["x" * 36]  # 40 bytes once serialized
+
+    await cache.set("https://api.igdb.com/v4/games", "fields name;", response)
+    await cache.set("https://api.igdb.com/v4/search", "fields name;", response)
+    # Overwriting an entry doesn't count it twice
+    await cache.set("https://api.igdb.com/v4/games", "fields name;", response)
+    assert int(await async_cache.get(METADATA_CACHE_TOTAL_SIZE_KEY)) == 80
+
+    # The entry closest to expiring is removed first
+    await cache.set("https://api.igdb.com/v4/games", "fields *;", response)
+    assert await cache.get("https://api.igdb.com/v4/search", "fields name;") is None
+    assert await cache.get("https://api.igdb.com/v4/games", "fields name;") == response
+    assert await cache.get("https://api.igdb.com/v4/games", "fields *;") == response
+    assert int(await async_cache.get(METADATA_CACHE_TOTAL_SIZE_KEY)) == 80
+    assert await async_cache.hlen(METADATA_CACHE_SIZES_KEY) == 2
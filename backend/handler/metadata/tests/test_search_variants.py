@@ -0,0 +1,108 @@
+import asyncio
+
+import httpx
+from handler.metadata.base_hander import MetadataHandler
+from handler.metadata.igdb_handler import IGDBBaseHandler
+from handler.metadata.response_cache import ctx_metadata_cache_bypass
+from utils.context import ctx_httpx_client, set_context_var
+
+
+async def test_resolve_first_match_keeps_precedence():
+    started: list[str] = []
+    running: list[str] = []
+    max_running = 0
+    cancelled: list[str] = []
+
+    def lookup(name: str, delay: float, result: str | None):
+        async def run() -> str | None:
+            nonlocal max_running
+            started.append(name)
+            running.append(name)
+            max_running = max(max_running, len(running))
+            try:
+                await asyncio.sleep(delay)
+                return result
+            except asyncio.CancelledError:
+                cancelled.append(name)
+                raise
+            finally:
+                running.remove(name)
+
+        return run
+
+    # The third lookup matches first, but the second one has precedence
+    result = await MetadataHandler._resolve_first_match(
+        [
+            lookup("first", 0.02, None),
+            lookup("second", 0.05, "second"),
+            lookup("third", 0.01, "third"),
+            lookup("fourth", 1, "fourth"),
+            lookup("fifth", 0.01, "fifth"),
+        ],
+        concurrency=3,
+    )
+
+    assert result == "second"
+    assert max_running == 3
+    # Lookups running after a match are cancelled, and the rest never start
+    assert started == ["first", "second", "third", "fourth"]
+    assert cancelled == ["fourth"]
+    assert not running
+
+
+async def test_resolve_first_match_without_match():
+    async def no_match() -> None:
+        return None
+
+    assert await MetadataHandler._resolve_first_match([no_match] * 5) is None
+    assert await MetadataHandler._resolve_first_match([]) is None
+
+
+async def test_resolve_first_match_runs_first_lookup_alone():
+    started: list[str] = []
+
+    def lookup(name: str, result: str | None):
+        async def run() -> str | None:
+            started.append(name)
+            return result
+
+        return run
+
+    result = await MetadataHandler._resolve_first_match(
+        [lookup("first", "first"), lookup("second", "second")], concurrency=3
+    )
+
+    assert result == "first"
+    assert started == ["first"]
+
+
+async def test_igdb_search_variants_requests():
+    requests: list[tuple[str, str]] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        body = request.content.decode()
+        requests.append((request.url.path.rsplit("/", 1)[-1], body))
+        if 'search "Super Mario 64"' in body:
+            return httpx.Response(
+                200,
+                json=[{"id": 1, "slug": "super-mario-64", "name": "Super Mario 64"}],
+            )
+        return httpx.Response(200, json=[])
+
+    igdb_handler = IGDBBaseHandler()
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        async with (
+            set_context_var(ctx_httpx_client, client),
+            set_context_var(ctx_metadata_cache_bypass, True),
+        ):
+            # An exact match costs a single request
+            rom = await igdb_handler._search_rom_variants("Super Mario 64", 4)
+            assert rom and rom["id"] == 1
+            assert len(requests) == 1
+
+            # The expanded search is sent once per term, not per category variant
+            requests.clear()
+            assert await igdb_handler._search_rom_variants("Zelda: Link", 4) is None
+            expanded_searches = [body for path, body in requests if path == "search"]
+            assert len(requests) == 7
+            assert len(expanded_searches) == len(set(expanded_searches)) == 3
@@ -0,0 +1,114 @@
+import httpx
+import pytest
+from handler.metadata import title_index
+from handler.metadata.base_hander import MetadataHandler
+from handler.metadata.igdb_handler import IGDBBaseHandler
+from handler.metadata.title_index import (
+    TITLE_INDEX_KEY_PREFIX,
+    MetadataTitleIndex,
+    TitleIndex,
+    title_numbers,
+)
+from handler.redis_handler import async_cache
+from utils.context import ctx_httpx_client, set_context_var
+
+
+@pytest.fixture(autouse=True)
+async def clear_title_index():
+    async for key in async_cache.scan_iter(f"{TITLE_INDEX_KEY_PREFIX}:*"):
+        await async_cache.delete(key)
+    yield
+    async for key in async_cache.scan_iter(f"{TITLE_INDEX_KEY_PREFIX}:*"):
+        await async_cache.delete(key)
+
+
+def test_title_index_match():
+    index = TitleIndex(MetadataHandler._normalize_exact_match)
+    index.add(1, ["Mario Kart 64"])
+    index.add(2, ["Super Mario 64", "Super Mario 64 DS"])
+    index.add(3, ["The Legend of Zelda: Ocarina of Time"])
+    index.add(4, ["Zelda 64"])
+    index.add(5, ["Tetris"])
+    index.add(6, ["Tetris"])
+
+    scores = index.search("Super Mario 64")
+    assert scores[2] == 1
+    assert 0 < scores[1] < 1
+
+    assert index.match("Super Mario 64", 0.9) == 2
+    assert index.match("Legend of Zelda - Ocarina of Time, The", 0.9) == 3
+    # Similar titles aren't close enough
+    assert index.match("Mario Kart", 0.9) is None
+    # Games with the same name are ambiguous
+    assert index.match("Tetris", 0.9) is None
+    assert index.match("", 0.9) is None
+
+
+@pytest.mark.parametrize(
+    "indexed_name,search_term",
+    [
+        ("Final Fantasy VIII", "Final Fantasy VII"),
+        ("Street Fighter Alpha 3", "Street Fighter Alpha 2"),
+        ("Tony Hawk's Pro Skater 2", "Tony Hawk's Pro Skater 3"),
+        ("Tony Hawk's Pro Skater 2", "Tony Hawk's Pro Skater"),
+    ],
+)
+def test_title_index_match_sequels(indexed_name, search_term):
+    index = TitleIndex(MetadataHandler._normalize_exact_match)
+    index.add(1, [indexed_name])
+
+    # Sequels score above the threshold, but are never matched to each other
+    assert index.search(search_term, 0.9)
+    assert index.match(search_term, 0.9) is None
+    assert index.match(indexed_name, 0.9) == 1
+
+
+def test_title_numbers():
+    assert title_numbers("Final Fantasy VII") == {7}
+    assert title_numbers("Mega Man X2") == {2}
+    assert title_numbers("Street Fighter II' Turbo") == {2}
+    assert title_numbers("Mario Kart: Double Dash!!") == frozenset()
+
+
+async def test_metadata_title_index(monkeypatch):
+    monkeypatch.setattr(title_index, "METADATA_LOCAL_MATCH_THRESHOLD", 0.9)
+    index = MetadataTitleIndex("igdb", MetadataHandler._normalize_exact_match)
+    await index.add_titles(4, {1: ["Mario Kart 64"]})
+
+    assert await index.match(4, "mario kart 64") == 1
+    assert await index.match(5, "mario kart 64") is None
+
+    # Titles added later are picked up by the loaded index, and stored
+    await index.add_titles(4, {2: ["Super Mario 64"], 1: ["Mario Kart"]})
+    assert await index.match(4, "Super Mario 64") == 2
+    other_index = MetadataTitleIndex("igdb", MetadataHandler._normalize_exact_match)
+    assert await other_index.match(4, "Mario Kart") == 1
+
+    monkeypatch.setattr(title_index, "METADATA_LOCAL_MATCH_THRESHOLD", 1.1)
+    assert await index.match(4, "Super Mario 64") is None
+
+
+async def test_igdb_get_rom_matches_locally(monkeypatch):
+    monkeypatch.setattr(title_index, "METADATA_LOCAL_MATCH_THRESHOLD", 0.9)
+    monkeypatch.setattr("handler.metadata.igdb_handler.IGDB_API_ENABLED", True)
+    requests: list[httpx.Request] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return httpx.Response(
+            200,
+            json=[
+                {"id": 1234, "slug": "homebrew-quest", "name": "Homebrew Quest"},
+            ],
+        )
+
+    igdb_handler = IGDBBaseHandler()
+    await igdb_handler.title_index.add_titles(4, {1234: ["Homebrew Quest"]})
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        async with set_context_var(ctx_httpx_client, client):
+            rom = await igdb_handler.get_rom("Homebrew Quest (PD).zip", 4)
+
+    assert rom["igdb_id"] == 1234
+    # Only the game is fetched, by id
+    assert len(requests) == 1
+    assert b"where id=1234;" in requests[0].content
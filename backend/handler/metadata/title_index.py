@@ -0,0 +1,214 @@
+import json
+import math
+import re
+import time
+from collections import defaultdict
+from collections.abc import Callable, Iterable, Mapping
+from itertools import chain
+from typing import Final
+
+from config import METADATA_LOCAL_MATCH_THRESHOLD
+from handler.redis_handler import async_cache
+from logger.logger import log
+from redis.exceptions import RedisError
+
+from .response_cache import ctx_metadata_cache_bypass
+
+TITLE_INDEX_KEY_PREFIX: Final = "romm:title_index"
+# Titles added by other processes are picked up after this long, in seconds
+TITLE_INDEX_RELOAD_INTERVAL: Final = 5 * 60
+
+_ROMAN_UNITS: Final = ("", "i", "ii", "iii", "iv", "v", "vi", "vii", "viii", "ix")
+# Roman numerals from 1 to 39, as found in game titles
+ROMAN_NUMERALS: Final = {
+    f"{tens}{units}": 10 * tens_idx + units_idx
+    for tens_idx, tens in enumerate(("", "x", "xx", "xxx"))
+    for units_idx, units in enumerate(_ROMAN_UNITS)
+    if tens or units
+}
+
+
+def title_trigrams(name: str) -> frozenset[str]:
+    """Split a normalized name into trigrams, padded to weigh its start and end"""
+    padded = f"  {name} "
+    return frozenset(padded[idx : idx + 3] for idx in range(len(padded) - 2))
+
+
+def title_numbers(name: str) -> frozenset[int]:
+    """Numbers of a raw name, in digits or roman numerals, telling sequels apart"""
+    numbers: set[int] = set()
+    for word in re.findall(r"[^\W_]+", name.lower()):
+        if word in ROMAN_NUMERALS:
+            numbers.add(ROMAN_NUMERALS[word])
+        else:
+            numbers.update(int(digits) for digits in re.findall(r"\d+", word))
+    return frozenset(numbers)
+
+
+class TitleIndex:
+    """Trigram postings over the normalized names of the games of a platform.
+
+    Names are scored against a search term with the Dice coefficient of their
+    trigrams, so 1 is an exact match of the normalized names. Names only differing
+    by a number score high, so a match also needs the same numbers in both names.
+    """
+
+    def __init__(self, normalize: Callable[[str], str]) -> None:
+        self.normalize = normalize
+        # Game id, trigrams and numbers of each indexed name
+        self.names: list[tuple[int, frozenset[str], frozenset[int]]] = []
+        self.postings: defaultdict[str, list[int]] = defaultdict(list)
+        self._indexed_names: set[tuple[int, str]] = set()
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def add(self, game_id: int, names: Iterable[str]) -> None:
+        for name in names:
+            normalized_name = self.normalize(name)
+            if not normalized_name or (game_id, normalized_name) in self._indexed_names:
+                continue
+
+            self._indexed_names.add((game_id, normalized_name))
+            trigrams = title_trigrams(normalized_name)
+            for trigram in trigrams:
+                self.postings[trigram].append(len(self.names))
+            self.names.append((game_id, trigrams, title_numbers(name)))
+
+    def search(
+        self, name: str, threshold: float = 0.0, same_numbers: bool = False
+    ) -> dict[int, float]:
+        """Score the games with a name close to the given one
+
+        Args:
+            name: name to look up
+            threshold: minimum similarity of the returned games
+            same_numbers: only score the names with the same numbers as the given one
+        Returns
+            Best similarity of each game, between 0 and 1
+        """
+        normalized_name = self.normalize(name)
+        if not normalized_name:
+            return {}
+
+        trigrams = title_trigrams(normalized_name)
+        numbers = title_numbers(name)
+        # Names sharing fewer trigrams can't reach the threshold, so only the names
+        # holding one of the rarest trigrams of the search term need to be scored
+        min_shared = math.ceil(len(trigrams) * threshold / (2 - threshold) - 1e-9)
+        rarest_trigrams = sorted(
+            trigrams, key=lambda trigram: len(self.postings.get(trigram, ()))
+        )[: len(trigrams) - min_shared + 1]
+        candidates = set(
+            chain.from_iterable(
+                self.postings.get(trigram, ()) for trigram in rarest_trigrams
+            )
+        )
+
+        scores: dict[int, float] = {}
+        for name_idx in candidates:
+            game_id, name_trigrams, name_numbers = self.names[name_idx]
+            if same_numbers and name_numbers != numbers:
+                continue
+
+            score = (
+                2 * len(trigrams & name_trigrams) / (len(trigrams) + len(name_trigrams))
+            )
+            if score >= threshold and score > scores.get(game_id, 0.0):
+                scores[game_id] = score
+        return scores
+
+    def match(self, name: str, threshold: float) -> int | None:
+        """Returns the game matching a name, only if no other game is as close"""
+        matches = self.search(name, threshold, same_numbers=True)
+        return next(iter(matches)) if len(matches) == 1 else None
+
+
+class MetadataTitleIndex:
+    """Local index of the titles of a provider games, to match roms without
+    searching the provider.
+
+    The names of each game are stored in a redis hash per platform, fed by the
+    matched roms and the games returned by previous searches. Each process
+    loads them into a `TitleIndex`, reloaded every `TITLE_INDEX_RELOAD_INTERVAL`.
+    A search term is only matched locally if a single game scores at least
+    `METADATA_LOCAL_MATCH_THRESHOLD`, anything ambiguous is left to the provider.
+    Complete rescans, which bypass the response cache, always search the provider.
+    """
+
+    def __init__(self, provider: str, normalize: Callable[[str], str]) -> None:
+        self.provider = provider
+        self.normalize = normalize
+        self._indexes: dict[int, tuple[float, TitleIndex]] = {}
+
+    def _build_key(self, platform_id: int) -> str:
+        return f"{TITLE_INDEX_KEY_PREFIX}:{self.provider}:{platform_id}"
+
+    async def _get_index(self, platform_id: int) -> TitleIndex:
+        loaded_at, index = self._indexes.get(platform_id, (0.0, None))
+        if index and time.monotonic() - loaded_at < TITLE_INDEX_RELOAD_INTERVAL:
+            return index
+
+        index = TitleIndex(self.normalize)
+        async for game_id, names in async_cache.hscan_iter(
+            self._build_key(platform_id)
+        ):
+            index.add(int(game_id), json.loads(names))
+
+        self._indexes[platform_id] = (time.monotonic(), index)
+        return index
+
+    async def add_titles(
+        self, platform_id: int, titles: Mapping[int, Iterable[str]]
+    ) -> None:
+        """Add the names of games of a platform to the index
+
+        Args:
+            platform_id: provider id of the platform
+            titles: names of each game, by provider id
+        """
+        game_names = {
+            game_id: [name for name in names if name]
+            for game_id, names in titles.items()
+        }
+        if not game_names:
+            return
+
+        key = self._build_key(platform_id)
+        try:
+            stored_titles = await async_cache.hmget(key, list(game_names))
+            new_titles: dict[int, str] = {}
+            for (game_id, names), stored_names in zip(
+                game_names.items(), stored_titles, strict=True
+            ):
+                stored_names = json.loads(stored_names) if stored_names else []
+                merged_names = list(dict.fromkeys([*stored_names, *names]))
+                if len(merged_names) > len(stored_names):
+                    new_titles[game_id] = json.dumps(merged_names)
+
+            if new_titles:
+                await async_cache.hset(key, mapping=new_titles)
+        except RedisError as exc:
+            log.warning(f"Unable to write the {self.provider} title index: {exc}")
+
+        _loaded_at, index = self._indexes.get(platform_id, (0.0, None))
+        if index:
+            for game_id, names in game_names.items():
+                index.add(game_id, names)
+
+    async def match(self, platform_id: int, search_term: str) -> int | None:
+        """Match a search term to a single game of the platform
+
+        Returns
+            Provider id of the game, None if there's no confident match
+        """
+        if METADATA_LOCAL_MATCH_THRESHOLD > 1 or ctx_metadata_cache_bypass.get():
+            return None
+
+        try:
+            index = await self._get_index(platform_id)
+        except RedisError as exc:
+            log.warning(f"Unable to read the {self.provider} title index: {exc}")
+            return None
+
+        return index.match(search_term, METADATA_LOCAL_MATCH_THRESHOLD)
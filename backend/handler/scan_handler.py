@@ -1,14 +1,27 @@
 import asyncio
 import zlib
+from dataclasses import dataclass, field
 from enum import Enum
+from pathlib import Path
 from typing import Any
 
 import emoji
+from config import LIBRARY_BASE_PATH, SCAN_DISC_FINGERPRINTS, SCAN_ROM_HEADERS
 from config.config_manager import config_manager as cm
 from handler.database import db_platform_handler
-from handler.filesystem import fs_asset_handler, fs_firmware_handler, fs_rom_handler
-from handler.filesystem.roms_handler import FSRom
-from handler.metadata import meta_igdb_handler, meta_moby_handler
+from handler.filesystem import (
+    fs_asset_handler,
+    fs_firmware_handler,
+    fs_hash_cache_handler,
+    fs_rom_handler,
+)
+from handler.filesystem.hash_cache_handler import (
+    FIRMWARE_HASHES_CACHE_KEY,
+    ROM_HASHES_CACHE_KEY,
+)
+from handler.filesystem.roms_handler import DISC_IMAGE_EXTENSIONS, FSRom
+from handler.hashing_handler import hashing_handler
+from handler.metadata import meta_dat_handler, meta_igdb_handler, meta_moby_handler
 from handler.metadata.igdb_handler import IGDBPlatform, IGDBRom
 from handler.metadata.moby_handler import MobyGamesPlatform, MobyGamesRom
 from logger.formatter import BLUE, RED
@@ -17,8 +30,10 @@ from logger.logger import log
 from models.assets import Save, Screenshot, State
 from models.firmware import Firmware
 from models.platform import Platform
-from models.rom import Rom
+from models.rom import Rom, RomFile
 from models.user import User
+from py7zr.exceptions import Bad7zFile
+from utils.rom_headers import ROM_HEADER_READERS, RomHeader
 
 NON_HASHABLE_PLATFORMS = frozenset(
     (
@@ -59,6 +74,54 @@ class ScanType(Enum):
     PARTIAL = "partial"
     COMPLETE = "complete"
     HASHES = "hashes"
+    DELTA = "delta"
+
+
+@dataclass
+class RomFilesDelta:
+    added: list[str] = field(default_factory=list)
+    removed: list[str] = field(default_factory=list)
+    resized: list[str] = field(default_factory=list)
+    touched: list[str] = field(default_factory=list)
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.removed or self.resized or self.touched)
+
+    def __str__(self) -> str:
+        return ", ".join(
+            f"{change} {', '.join(files)}"
+            for change, files in self.__dict__.items()
+            if files
+        )
+
+
+def get_rom_files_delta(
+    stored_files: list[RomFile] | None, fs_files: list[RomFile]
+) -> RomFilesDelta:
+    """Compare the files stored for a rom against the files found in the filesystem
+
+    Args:
+        stored_files: files stored in the database for the rom
+        fs_files: files found in the filesystem for the rom
+    Returns
+        Files added, removed, resized or touched since the rom was last scanned
+    """
+    stored_files_map = {file["filename"]: file for file in stored_files or []}
+    fs_files_map = {file["filename"]: file for file in fs_files}
+
+    delta = RomFilesDelta(
+        added=sorted(fs_files_map.keys() - stored_files_map.keys()),
+        removed=sorted(stored_files_map.keys() - fs_files_map.keys()),
+    )
+    for filename in sorted(fs_files_map.keys() & stored_files_map.keys()):
+        stored_file = stored_files_map[filename]
+        fs_file = fs_files_map[filename]
+        if stored_file["size"] != fs_file["size"]:
+            delta.resized.append(filename)
+        elif stored_file.get("last_modified") != fs_file["last_modified"]:
+            delta.touched.append(filename)
+
+    return delta
 
 
 async def _get_main_platform_igdb_id(platform: Platform):
@@ -150,10 +213,188 @@ async def scan_platform(
     return Platform(**platform_attrs)
 
 
+def _get_cached_hashes(
+    cache_key: str, file_path: str, force_rehash: bool = False
+) -> tuple[list, dict[str, str] | None]:
+    """Look up the hashes of a file in the hash cache
+
+    Args:
+        cache_key: hash cache where the file hashes are stored
+        file_path: absolute path to the file
+        force_rehash: ignore the cached hashes so they are calculated again
+    Returns
+        Identity of the file, and its cached hashes if they are still valid
+    """
+    identity = fs_hash_cache_handler.get_file_identity(file_path)
+    if force_rehash:
+        return identity, None
+
+    return identity, fs_hash_cache_handler.get_hashes(cache_key, file_path, identity)
+
+
+def should_hash_rom(scan_type: ScanType, rom: Rom | None) -> bool:
+    # Calculating hashes is expensive, so we only do it if necessary
+    return (
+        not rom
+        or scan_type == ScanType.COMPLETE
+        or scan_type == ScanType.HASHES
+        or scan_type == ScanType.DELTA
+    )
+
+
+async def get_rom_hashes(
+    platform: Platform,
+    file_name: str,
+    force_rehash: bool = False,
+    fast_identify: bool = False,
+    full_hashes: bool = False,
+) -> dict[str, str]:
+    """Get the hashes of a rom, calculating them in the hashing workers on a cache miss
+
+    Args:
+        platform: platform where the rom belongs
+        file_name: name of the rom file or multi-part rom folder
+        force_rehash: ignore the hash cache and read the file again
+        fast_identify: only read the crc32 stored in zip and 7zip roms, and defer
+            calculating their md5 and sha1 hashes, and those of disc images
+        full_hashes: hash the whole contents of disc images, even if their
+            fingerprint shows they didn't change since they were last hashed
+    """
+    # Skip hashing games for platforms that don't have a hash database
+    if platform.slug in NON_HASHABLE_PLATFORMS:
+        return {"crc_hash": "", "md5_hash": "", "sha1_hash": ""}
+
+    roms_path = fs_rom_handler.get_roms_fs_structure(platform.fs_slug)
+    file_path = f"{LIBRARY_BASE_PATH}/{roms_path}/{file_name}"
+
+    identity, rom_hashes = _get_cached_hashes(
+        ROM_HASHES_CACHE_KEY, file_path, force_rehash
+    )
+    if rom_hashes:
+        return rom_hashes
+
+    fingerprint = None
+    if (
+        SCAN_DISC_FINGERPRINTS
+        and Path(file_name).suffix.lower() in DISC_IMAGE_EXTENSIONS
+    ):
+        fingerprint = await hashing_handler.get_rom_fingerprint(file_name, roms_path)
+
+    if fingerprint and not full_hashes:
+        # A touched image whose contents didn't change keeps its hashes
+        rom_hashes = (
+            fs_hash_cache_handler.get_fingerprint_hashes(
+                ROM_HASHES_CACHE_KEY, file_path, fingerprint["key"]
+            )
+            if not force_rehash
+            else None
+        )
+        if rom_hashes:
+            fs_hash_cache_handler.set_hashes(
+                ROM_HASHES_CACHE_KEY,
+                file_path,
+                identity,
+                rom_hashes,
+                fingerprint["key"],
+            )
+            return rom_hashes
+
+        if fast_identify:
+            fs_hash_cache_handler.defer_rom_hashes(file_path, platform.id, file_name)
+            return {"crc_hash": "", "md5_hash": "", "sha1_hash": ""}
+
+    if fast_identify:
+        rom_hashes = await hashing_handler.get_rom_fast_hashes(file_name, roms_path)
+        if rom_hashes:
+            # Partial hashes are not cached, the full ones are once calculated
+            fs_hash_cache_handler.defer_rom_hashes(file_path, platform.id, file_name)
+            return rom_hashes
+
+    try:
+        rom_hashes = await hashing_handler.get_rom_hashes(file_name, roms_path)
+    except (zlib.error, Bad7zFile) as e:
+        # Return empty hashes if calculating them fails for corrupted files
+        log.error(
+            f"Hashes of {file_name} couldn't be calculated: {hl(str(e), color=RED)}"
+        )
+        return {"crc_hash": "", "md5_hash": "", "sha1_hash": ""}
+
+    fs_hash_cache_handler.set_hashes(
+        ROM_HASHES_CACHE_KEY,
+        file_path,
+        identity,
+        rom_hashes,
+        fingerprint["key"] if fingerprint else None,
+    )
+
+    return rom_hashes
+
+
+async def get_rom_header(fs_rom: FSRom, roms_path: str) -> RomHeader | None:
+    """Read the internal title and serial of a rom in the hashing workers
+
+    Args:
+        fs_rom: rom file or multi-part rom folder
+        roms_path: path to the roms folder of the platform
+    """
+    if not SCAN_ROM_HEADERS:
+        return None
+
+    file_names = (
+        [file["filename"] for file in fs_rom["files"]]
+        if fs_rom.get("multi", False)
+        else [fs_rom["file_name"]]
+    )
+    if not any(
+        Path(file_name).suffix.lower() in ROM_HEADER_READERS for file_name in file_names
+    ):
+        return None
+
+    return await hashing_handler.get_rom_header(fs_rom["file_name"], roms_path)
+
+
+def _get_stored_rom_hashes(rom: Rom | None) -> dict[str, str]:
+    if not rom:
+        return {}
+
+    return {
+        "crc_hash": rom.crc_hash or "",
+        "md5_hash": rom.md5_hash or "",
+        "sha1_hash": rom.sha1_hash or "",
+    }
+
+
+async def get_firmware_hashes(
+    platform: Platform, file_name: str, force_rehash: bool = False
+) -> dict[str, str]:
+    """Get the hashes of a firmware file, calculating them in the hashing workers on a cache miss
+
+    Args:
+        platform: platform where the firmware belongs
+        file_name: name of the firmware file
+        force_rehash: ignore the hash cache and read the file again
+    """
+    firmware_path = fs_firmware_handler.get_firmware_fs_structure(platform.fs_slug)
+    file_path = f"{LIBRARY_BASE_PATH}/{firmware_path}/{file_name}"
+
+    identity, file_hashes = _get_cached_hashes(
+        FIRMWARE_HASHES_CACHE_KEY, file_path, force_rehash
+    )
+    if file_hashes:
+        return file_hashes
+
+    file_hashes = await hashing_handler.get_firmware_hashes(firmware_path, file_name)
+    fs_hash_cache_handler.set_hashes(
+        FIRMWARE_HASHES_CACHE_KEY, file_path, identity, file_hashes
+    )
+    return file_hashes
+
+
 def scan_firmware(
     platform: Platform,
     file_name: str,
     firmware: Firmware | None = None,
+    file_hashes: dict[str, str] | None = None,
 ) -> Firmware:
     firmware_path = fs_firmware_handler.get_firmware_fs_structure(platform.fs_slug)
 
@@ -185,10 +426,11 @@ def scan_firmware(
         }
     )
 
-    file_hashes = fs_firmware_handler.calculate_file_hashes(
-        firmware_path=firmware_path,
-        file_name=file_name,
-    )
+    if file_hashes is None:
+        file_hashes = fs_firmware_handler.calculate_file_hashes(
+            firmware_path=firmware_path,
+            file_name=file_name,
+        )
 
     firmware_attrs.update(**file_hashes)
 
@@ -201,6 +443,8 @@ async def scan_rom(
     scan_type: ScanType,
     rom: Rom | None = None,
     metadata_sources: list[str] | None = None,
+    rom_hashes: dict[str, str] | None = None,
+    force_rehash: bool = False,
 ) -> Rom:
     if not metadata_sources:
         metadata_sources = ["igdb", "moby"]
@@ -224,7 +468,7 @@ async def scan_rom(
     }
 
     # Update properties from existing rom if not a complete rescan
-    if rom and scan_type != ScanType.COMPLETE:
+    if rom and scan_type not in {ScanType.COMPLETE, ScanType.DELTA}:
         rom_attrs.update(
             {
                 "igdb_id": rom.igdb_id,
@@ -268,28 +512,54 @@ async def scan_rom(
         }
     )
 
-    # Calculating hashes is expensive, so we only do it if necessary
-    if not rom or scan_type == ScanType.COMPLETE or scan_type == ScanType.HASHES:
-        # Skip hashing games for platforms that don't have a hash database
-        if platform.slug in NON_HASHABLE_PLATFORMS:
-            rom_attrs.update({"crc_hash": "", "md5_hash": "", "sha1_hash": ""})
-        else:
-            try:
-                rom_hashes = fs_rom_handler.get_rom_hashes(
-                    rom_attrs["file_name"], roms_path
-                )
-                rom_attrs.update(**rom_hashes)
-            except zlib.error as e:
-                # Return empty hashes if calculating them fails for corrupted files
-                log.error(
-                    f"Hashes of {rom_attrs['file_name']} couldn't be calculated: {hl(str(e), color=RED)}"
-                )
-                rom_attrs.update({"crc_hash": "", "md5_hash": "", "sha1_hash": ""})
+    if should_hash_rom(scan_type, rom):
+        if rom_hashes is None:
+            rom_hashes = await get_rom_hashes(
+                platform,
+                rom_attrs["file_name"],
+                force_rehash=force_rehash,
+                full_hashes=scan_type == ScanType.HASHES,
+            )
+        rom_attrs.update(**rom_hashes)
+    elif rom and get_rom_files_delta(rom.files, fs_rom["files"]):
+        # Changed files keep their stored size and mtime until the rom is rehashed
+        rom_attrs["files"] = rom.files
+
+    # Serials read from the rom header identify it even if the file was renamed
+    rom_header = await get_rom_header(fs_rom, roms_path)
+    rom_serial = rom_header.get("serial") if rom_header else None
+
+    # Canonical title, regions and serial of the rom from the local DAT files
+    dat_game = meta_dat_handler.get_game(
+        platform.fs_slug, **(rom_hashes or _get_stored_rom_hashes(rom))
+    )
+    # CHD images are listed in MAME DATs by the sha1 of their data, not of the file
+    if not dat_game and rom_header and rom_header.get("sha1"):
+        dat_game = meta_dat_handler.get_game(
+            platform.fs_slug, sha1_hash=rom_header["sha1"]
+        )
+    if not dat_game and rom_serial:
+        dat_game = meta_dat_handler.get_game_by_serial(platform.fs_slug, rom_serial)
+    if dat_game:
+        dat_regs, dat_rev, dat_langs, _ = fs_rom_handler.parse_tags(dat_game["name"])
+        if dat_game.get("region") and not dat_regs:
+            dat_regs = [dat_game["region"]]
+        rom_attrs.update(
+            {
+                "regions": dat_regs or rom_attrs["regions"],
+                "revision": dat_rev or rom_attrs["revision"],
+                "languages": dat_langs or rom_attrs["languages"],
+            }
+        )
+        if rom_attrs["name"] == rom_attrs["file_name"]:
+            rom_attrs["name"] = dat_game["title"]
 
     # If no metadata scan is required
     if scan_type == ScanType.HASHES:
         return Rom(**rom_attrs)
 
+    serial = rom_serial or (dat_game.get("serial") if dat_game else None)
+
     async def fetch_igdb_rom():
         if (
             "igdb" in metadata_sources
@@ -297,13 +567,17 @@ async def scan_rom(
             and (
                 not rom
                 or scan_type == ScanType.COMPLETE
+                or scan_type == ScanType.DELTA
                 or (scan_type == ScanType.PARTIAL and not rom.igdb_id)
                 or (scan_type == ScanType.UNIDENTIFIED and not rom.igdb_id)
             )
         ):
             main_platform_igdb_id = await _get_main_platform_igdb_id(platform)
             return await meta_igdb_handler.get_rom(
-                rom_attrs["file_name"], main_platform_igdb_id
+                rom_attrs["file_name"],
+                main_platform_igdb_id,
+                title=dat_game["title"] if dat_game else None,
+                serial=serial,
             )
 
         return IGDBRom(igdb_id=None)
@@ -315,12 +589,16 @@ async def scan_rom(
             and (
                 not rom
                 or scan_type == ScanType.COMPLETE
+                or scan_type == ScanType.DELTA
                 or (scan_type == ScanType.PARTIAL and not rom.moby_id)
                 or (scan_type == ScanType.UNIDENTIFIED and not rom.moby_id)
             )
         ):
             return await meta_moby_handler.get_rom(
-                rom_attrs["file_name"], platform_moby_id=platform.moby_id
+                rom_attrs["file_name"],
+                platform_moby_id=platform.moby_id,
+                title=dat_game["title"] if dat_game else None,
+                serial=serial,
             )
 
         return MobyGamesRom(moby_id=None)
@@ -1,6 +1,7 @@
 from handler.auth import auth_handler
 from handler.database import (
     db_platform_handler,
+    db_resource_handler,
     db_rom_handler,
     db_save_handler,
     db_screenshot_handler,
@@ -69,6 +70,149 @@ def test_roms(rom: Rom, platform: Platform):
     assert len(roms) == 0
 
 
+def test_purge_roms_in_batches(rom: Rom, platform: Platform, monkeypatch):
+    monkeypatch.setattr("handler.database.base_handler.PURGE_BATCH_SIZE", 1)
+    db_rom_handler.add_rom(
+        Rom(
+            platform_id=platform.id,
+            name="test_rom_2",
+            slug="test_rom_slug_2",
+            file_name="test_rom_2.zip",
+            file_name_no_tags="test_rom_2",
+            file_name_no_ext="test_rom_2",
+            file_extension="zip",
+            file_path=f"{platform.slug}/roms",
+            file_size_bytes=1000.0,
+        )
+    )
+
+    purged_roms = db_rom_handler.purge_roms(
+        platform.id, ["missing.zip", rom.file_name, "other.zip"]
+    )
+
+    assert [r.file_name for r in purged_roms] == ["test_rom_2.zip"]
+    roms = db_rom_handler.get_roms(platform_id=platform.id)
+    assert [r.id for r in roms] == [rom.id]
+
+
+def test_upsert_roms(rom: Rom, platform: Platform):
+    rom_ids = db_rom_handler.upsert_roms(
+        [
+            Rom(
+                id=rom.id,
+                platform_id=rom.platform_id,
+                name="test_rom_updated",
+                file_name=rom.file_name,
+            ),
+            Rom(
+                platform_id=rom.platform_id,
+                name="test_rom_2",
+                slug="test_rom_slug_2",
+                file_name="test_rom_2",
+                file_name_no_tags="test_rom_2",
+                file_name_no_ext="test_rom_2",
+                file_extension="zip",
+                file_path=f"{platform.slug}/roms",
+                file_size_bytes=1000.0,
+            ),
+        ]
+    )
+    assert rom_ids[0] == rom.id
+    assert rom_ids[1] is not None
+
+    db_rom_handler.update_roms([{"id": rom_ids[1], "path_cover_s": "cover.png"}])
+
+    roms = db_rom_handler.get_roms_by_ids(rom_ids)
+    assert [r.id for r in roms] == rom_ids
+    assert roms[0].name == "test_rom_updated"
+    assert roms[0].file_path == rom.file_path
+    assert roms[1].file_name == "test_rom_2"
+    assert roms[1].path_cover_s == "cover.png"
+
+
+def test_upsert_deleted_rom(rom: Rom, platform: Platform):
+    db_rom_handler.delete_rom(rom.id)
+
+    # A rom deleted since it was scanned is stored again
+    rom_ids = db_rom_handler.upsert_roms(
+        [
+            Rom(
+                id=rom.id,
+                platform_id=rom.platform_id,
+                name=rom.name,
+                slug=rom.slug,
+                file_name=rom.file_name,
+                file_name_no_tags=rom.file_name_no_tags,
+                file_name_no_ext=rom.file_name_no_ext,
+                file_extension=rom.file_extension,
+                file_path=rom.file_path,
+                file_size_bytes=rom.file_size_bytes,
+            )
+        ]
+    )
+
+    roms = db_rom_handler.get_roms(platform_id=platform.id)
+    assert [r.id for r in roms] == rom_ids
+    assert roms[0].file_name == rom.file_name
+
+
+def test_unreferenced_resources(rom: Rom):
+    db_rom_handler.update_rom(
+        rom.id,
+        {
+            "path_cover_s": "store/ab/ab01_small.png",
+            "path_cover_l": "store/ab/ab01.png",
+            "path_screenshots": ["store/cd/cd01.jpg"],
+        },
+    )
+
+    assert db_resource_handler.get_unreferenced_resources(
+        [
+            "store/ab/ab01_small.png",
+            "store/ab/ab01.png",
+            "store/cd/cd01.jpg",
+            "store/ef/ef01.jpg",
+        ]
+    ) == {"store/ef/ef01.jpg"}
+
+
+def test_deleted_platform_resources(rom: Rom, platform: Platform):
+    db_rom_handler.update_rom(
+        rom.id,
+        {
+            "path_cover_s": "store/ab/ab01_small.png",
+            "path_cover_l": "store/ab/ab01.png",
+            "path_screenshots": ["store/cd/cd01.jpg"],
+        },
+    )
+
+    deleted_platform = db_platform_handler.delete_platform(platform.id)
+    assert [
+        (r.path_cover_s, r.path_cover_l, r.path_screenshots)
+        for r in deleted_platform.roms
+    ] == [("store/ab/ab01_small.png", "store/ab/ab01.png", ["store/cd/cd01.jpg"])]
+    assert db_rom_handler.get_rom(rom.id) is None
+
+
+def test_purged_platforms_resources(rom: Rom, platform: Platform):
+    db_rom_handler.update_rom(rom.id, {"path_screenshots": ["store/cd/cd01.jpg"]})
+
+    purged_platforms = db_platform_handler.purge_platforms(["other_platform_slug"])
+    assert [p.id for p in purged_platforms] == [platform.id]
+    assert [r.path_screenshots for r in purged_platforms[0].roms] == [
+        ["store/cd/cd01.jpg"]
+    ]
+
+
+def test_matched_rom_titles(rom: Rom, platform: Platform):
+    assert db_rom_handler.get_matched_rom_titles(platform.id) == []
+
+    db_rom_handler.update_rom(rom.id, {"igdb_id": 1234})
+    assert db_rom_handler.get_matched_rom_titles(platform.id) == [
+        (1234, None, "test_rom")
+    ]
+
+
 def test_utils(rom: Rom, platform: Platform):
     roms = db_rom_handler.get_roms(platform_id=platform.id)
     assert (
@@ -0,0 +1,29 @@
+from io import BytesIO
+
+from handler.image_handler import ImageHandler
+from PIL import Image
+
+
+async def test_store_artwork(tmp_path):
+    content = BytesIO()
+    Image.new("RGB", (600, 1200)).save(content, format="PNG")
+
+    image_handler = ImageHandler(max_workers=1, max_pending=1)
+    try:
+        await image_handler.store_artwork(
+            content.getvalue(),
+            cover_path=str(tmp_path / "big.png"),
+            small_cover_path=str(tmp_path / "small.png"),
+        )
+        await image_handler.store_small_cover(
+            str(tmp_path / "big.png"), str(tmp_path / "resized.png")
+        )
+    finally:
+        image_handler.shutdown()
+
+    with Image.open(tmp_path / "big.png") as img:
+        assert img.size == (600, 1200)
+    with Image.open(tmp_path / "small.png") as img:
+        assert img.size == (120, 240)
+    with Image.open(tmp_path / "resized.png") as img:
+        assert img.size == (120, 240)
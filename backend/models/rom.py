@@ -137,7 +137,7 @@ class Rom(BaseModel):
         screenshots = [s.download_path for s in self.screenshots]
         if self.path_screenshots:
             screenshots += [
-                f"{FRONTEND_RESOURCES_PATH}/{s}" for s in self.path_screenshots
+                f"{FRONTEND_RESOURCES_PATH}/{s}" for s in self.path_screenshots if s
             ]
         return screenshots
 
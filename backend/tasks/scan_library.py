@@ -22,7 +22,7 @@ class ScanLibraryTask(PeriodicTask):
 
         log.info("Scheduled library scan started...")
         await scan_platforms([], scan_type=ScanType.UNIDENTIFIED)
-        log.info("Scheduled library scan done")
+        log.info("Scheduled library scan queued")
 
 
 scan_library_task = ScanLibraryTask()
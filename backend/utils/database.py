@@ -1,3 +1,4 @@
+import json
 from typing import Any
 
 import sqlalchemy as sa
@@ -28,7 +29,7 @@ def json_array_contains_value(
         return sa.type_coerce(column, sa_pg.JSONB).contains(
             func.cast(value, sa_pg.JSONB)
         )
-    return func.json_contains(column, value)
+    return func.json_contains(column, json.dumps(value))
 
 
 def safe_float(value: Any, default: float = 0.0) -> float:
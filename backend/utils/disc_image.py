@@ -0,0 +1,169 @@
+import re
+import struct
+from typing import BinaryIO, Final
+
+CHD_MAGIC: Final = b"MComprHD"
+# Offset of the sha1 of the raw data plus metadata in the header of each CHD version
+CHD_SHA1_OFFSETS: Final = {3: 80, 4: 48, 5: 84}
+
+ISO_SECTOR_SIZE: Final = 2048
+ISO_PVD_LBA: Final = 16
+ISO_PVD_MAGIC: Final = b"\x01CD001"
+# Size of each sector and offset of its user data: plain 2048 byte sectors, and raw
+# 2352 byte sectors of mode 1 and mode 2 (XA) discs
+ISO_SECTOR_LAYOUTS: Final = ((2048, 0), (2352, 16), (2352, 24))
+# Directories and files are only read up to this size
+ISO_MAX_READ_SIZE: Final = 1024 * 1024
+# Executable booted by PlayStation discs, e.g. BOOT2 = cdrom0:\SLUS_200.62;1
+SYSTEM_CNF_BOOT_REGEX: Final = re.compile(
+    r"^\s*BOOT2?\s*=\s*cdrom0?:\\*([^;\s]+)", re.IGNORECASE | re.MULTILINE
+)
+
+
+def read_chd_sha1(f: BinaryIO) -> str | None:
+    """Read the sha1 of the data of a CHD file from its header
+
+    Args:
+        f: CHD file opened in binary mode
+    Returns
+        sha1 of the uncompressed data and metadata, or None if it's not a CHD file
+    """
+    f.seek(0)
+    header = f.read(124)
+    if not header.startswith(CHD_MAGIC) or len(header) < 16:
+        return None
+
+    version = struct.unpack(">I", header[12:16])[0]
+    sha1_offset = CHD_SHA1_OFFSETS.get(version)
+    if sha1_offset is None or len(header) < sha1_offset + 20:
+        return None
+
+    sha1 = header[sha1_offset : sha1_offset + 20]
+    return sha1.hex() if any(sha1) else None
+
+
+class ISOImage:
+    """Read the ISO 9660 filesystem of a disc image, dumped with plain or raw sectors.
+
+    Only the sectors that are needed are read, so no read depends on the size of
+    the image.
+    """
+
+    def __init__(self, f: BinaryIO, sector_size: int, data_offset: int) -> None:
+        self.f = f
+        self.sector_size = sector_size
+        self.data_offset = data_offset
+
+    @classmethod
+    def open(cls, f: BinaryIO) -> "ISOImage | None":
+        """Detect the sector layout of a disc image from its primary volume descriptor
+
+        Args:
+            f: disc image opened in binary mode
+        Returns
+            ISO image, or None if no ISO 9660 filesystem was found
+        """
+        for sector_size, data_offset in ISO_SECTOR_LAYOUTS:
+            image = cls(f, sector_size, data_offset)
+            if image.read_sectors(ISO_PVD_LBA, 1).startswith(ISO_PVD_MAGIC):
+                return image
+
+        return None
+
+    def read_sectors(self, lba: int, count: int) -> bytes:
+        if self.sector_size == ISO_SECTOR_SIZE:
+            self.f.seek(lba * ISO_SECTOR_SIZE)
+            return self.f.read(count * ISO_SECTOR_SIZE)
+
+        data = bytearray()
+        for sector in range(lba, lba + count):
+            self.f.seek(sector * self.sector_size + self.data_offset)
+            chunk = self.f.read(ISO_SECTOR_SIZE)
+            data += chunk
+            if len(chunk) < ISO_SECTOR_SIZE:
+                break
+
+        return bytes(data)
+
+    def read_extent(self, lba: int, size: int) -> bytes:
+        size = min(size, ISO_MAX_READ_SIZE)
+        sectors = -(-size // ISO_SECTOR_SIZE)
+        return self.read_sectors(lba, sectors)[:size]
+
+    def read_pvd(self) -> bytes:
+        return self.read_sectors(ISO_PVD_LBA, 1)
+
+    def _list_directory(self, lba: int, size: int) -> dict[str, tuple[int, int, bool]]:
+        """List the entries of a directory by name, with their extent, size and type"""
+        data = self.read_extent(lba, size)
+        entries = {}
+        pos = 0
+        while pos < len(data):
+            record_length = data[pos]
+            # Records don't cross sector boundaries, the rest of the sector is padding
+            if record_length == 0:
+                pos = (pos // ISO_SECTOR_SIZE + 1) * ISO_SECTOR_SIZE
+                continue
+
+            record = data[pos : pos + record_length]
+            pos += record_length
+            if len(record) < 33:
+                break
+
+            name_length = record[32]
+            name = record[33 : 33 + name_length]
+            # Skip the entries for the directory itself and its parent
+            if name in (b"\x00", b"\x01"):
+                continue
+
+            entry_name = name.decode("ascii", errors="replace").split(";")[0].upper()
+            entries[entry_name] = (
+                struct.unpack("<I", record[2:6])[0],
+                struct.unpack("<I", record[10:14])[0],
+                bool(record[25] & 0x02),
+            )
+
+        return entries
+
+    def read_file(self, path: str, max_size: int = ISO_MAX_READ_SIZE) -> bytes | None:
+        """Read the start of a file of the disc
+
+        Args:
+            path: path of the file from the root of the disc, case insensitive
+            max_size: maximum number of bytes read
+        Returns
+            contents of the file up to max_size, or None if it wasn't found
+        """
+        root_record = self.read_pvd()[156:190]
+        if len(root_record) < 34:
+            return None
+
+        lba = struct.unpack("<I", root_record[2:6])[0]
+        size = struct.unpack("<I", root_record[10:14])[0]
+        is_directory = True
+
+        for part in path.replace("\\", "/").strip("/").upper().split("/"):
+            if not is_directory:
+                return None
+
+            entry = self._list_directory(lba, size).get(part.split(";")[0])
+            if entry is None:
+                return None
+
+            lba, size, is_directory = entry
+
+        if is_directory:
+            return None
+
+        return self.read_extent(lba, min(size, max_size))
+
+    def get_boot_file_path(self) -> str | None:
+        """Read the path of the executable booted by a PlayStation disc from SYSTEM.CNF"""
+        system_cnf = self.read_file("SYSTEM.CNF", max_size=4096)
+        if not system_cnf:
+            return None
+
+        match = SYSTEM_CNF_BOOT_REGEX.search(
+            system_cnf.decode("ascii", errors="replace")
+        )
+        return match.group(1) if match else None
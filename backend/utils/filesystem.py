@@ -35,6 +35,31 @@ def iter_directories(path: str, recursive: bool = False) -> Iterator[tuple[Path,
             break
 
 
+def scan_directory(path: str) -> tuple[list[os.DirEntry], list[os.DirEntry]]:
+    """List the files and directories in a directory in a single pass.
+
+    The entries keep the file type and stat results fetched while listing, so
+    callers can reuse them instead of querying the filesystem again.
+    Returns a tuple with the file entries and the directory entries.
+    """
+    files: list[os.DirEntry] = []
+    directories: list[os.DirEntry] = []
+
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+                (directories if is_dir else files).append(entry)
+    except OSError:
+        # Behave like os.walk, which ignores unreadable directories
+        pass
+
+    return files, directories
+
+
 INVALID_CHARS_HYPHENS = re.compile(r"[\\/:|]")
 INVALUD_CHARS_EMPTY = re.compile(r'[*?"<>]')
 
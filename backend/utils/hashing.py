@@ -1,2 +1,59 @@
+CRC32_POLYNOMIAL = 0xEDB88320
+
+
 def crc32_to_hex(value: int) -> str:
     return (value & 0xFFFFFFFF).to_bytes(4, byteorder="big").hex()
+
+
+def _gf2_matrix_times(matrix: list[int], vector: int) -> int:
+    total = 0
+    index = 0
+    while vector:
+        if vector & 1:
+            total ^= matrix[index]
+        vector >>= 1
+        index += 1
+    return total
+
+
+def _gf2_matrix_square(matrix: list[int]) -> list[int]:
+    return [_gf2_matrix_times(matrix, matrix[n]) for n in range(32)]
+
+
+def crc32_combine(crc1: int, crc2: int, length2: int) -> int:
+    """Combine the crc32 of two blocks into the crc32 of their concatenation.
+
+    Port of zlib's `crc32_combine`, which is not exposed by the zlib module.
+
+    Args:
+        crc1: crc32 of the first block
+        crc2: crc32 of the second block
+        length2: length in bytes of the second block
+    Returns
+        crc32 of the first block followed by the second one
+    """
+    if length2 <= 0:
+        return crc1
+
+    # Operator for one zero bit, then squared into operators for two and four zero bits
+    odd = [CRC32_POLYNOMIAL] + [1 << n for n in range(31)]
+    even = _gf2_matrix_square(odd)
+    odd = _gf2_matrix_square(even)
+
+    # Apply length2 zero bytes to crc1, squaring the operator for each bit of length2
+    while True:
+        even = _gf2_matrix_square(odd)
+        if length2 & 1:
+            crc1 = _gf2_matrix_times(even, crc1)
+        length2 >>= 1
+        if not length2:
+            break
+
+        odd = _gf2_matrix_square(even)
+        if length2 & 1:
+            crc1 = _gf2_matrix_times(odd, crc1)
+        length2 >>= 1
+        if not length2:
+            break
+
+    return crc1 ^ crc2
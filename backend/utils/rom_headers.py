@@ -0,0 +1,267 @@
+import re
+import struct
+from collections.abc import Callable
+from typing import BinaryIO, Final, TypedDict
+
+from utils.disc_image import ISOImage, read_chd_sha1
+
+# PlayStation boot files are named after the serial, e.g. SLUS_200.62 for SLUS-20062
+PLAYSTATION_BOOT_FILE_REGEX: Final = re.compile(
+    r"([A-Z]{4})[_-](\d{3})\.?(\d{2})", re.IGNORECASE
+)
+# Switch tickets are named after their rights ID, which starts with the title ID
+SWITCH_TICKET_REGEX: Final = re.compile(
+    r"^(0100[0-9A-F]{12})[0-9A-F]{16}\.tik$", re.IGNORECASE
+)
+N64_BYTE_ORDERS: Final = {
+    b"\x80\x37\x12\x40": 0,  # Big endian (.z64)
+    b"\x37\x80\x40\x12": 2,  # Byte swapped (.v64)
+    b"\x40\x12\x37\x80": 4,  # Little endian (.n64)
+}
+# Offset of the header of LoROM, HiROM and ExHiROM cartridges, after the game code
+SNES_HEADER_OFFSETS: Final = (0x7FB0, 0xFFB0, 0x40FFB0)
+# Entries read from the file table of Switch containers
+SWITCH_MAX_FILES: Final = 1024
+SWITCH_MAX_STRING_TABLE_SIZE: Final = 1024 * 64
+
+
+class RomHeader(TypedDict, total=False):
+    title: str
+    serial: str
+    # Sha1 of the data of CHD images, which MAME DATs list them by
+    sha1: str
+
+
+def _decode_text(data: bytes) -> str:
+    text = data.split(b"\x00")[0].decode("ascii", errors="ignore")
+    return " ".join(text.split())
+
+
+def _is_game_code(code: str) -> bool:
+    return len(code) == 4 and code.isalnum() and code.isupper()
+
+
+def _read_at(f: BinaryIO, offset: int, size: int) -> bytes:
+    f.seek(offset)
+    return f.read(size)
+
+
+def _build_header(title: str, serial: str) -> RomHeader | None:
+    rom_header = RomHeader()
+    if title:
+        rom_header["title"] = title
+    if serial:
+        rom_header["serial"] = serial
+
+    return rom_header or None
+
+
+def read_gba_header(f: BinaryIO) -> RomHeader | None:
+    header = _read_at(f, 0xA0, 0x1E)
+    if len(header) < 0x1E or header[0x12] != 0x96:
+        return None
+
+    # Complement check of the header, verified by the BIOS on boot
+    if (-sum(header[:0x1D]) - 0x19) & 0xFF != header[0x1D]:
+        return None
+
+    code = _decode_text(header[0x0C:0x10])
+    return _build_header(
+        _decode_text(header[0x00:0x0C]), code if _is_game_code(code) else ""
+    )
+
+
+def read_n64_header(f: BinaryIO) -> RomHeader | None:
+    header = _read_at(f, 0, 0x40)
+    word_size = N64_BYTE_ORDERS.get(header[:4])
+    if word_size is None or len(header) < 0x40:
+        return None
+
+    # Swap the header to big endian
+    if word_size:
+        header = b"".join(
+            header[idx : idx + word_size][::-1]
+            for idx in range(0, len(header), word_size)
+        )
+
+    code = _decode_text(header[0x3B:0x3F])
+    return _build_header(
+        _decode_text(header[0x20:0x34]), code if _is_game_code(code) else ""
+    )
+
+
+def read_snes_header(f: BinaryIO) -> RomHeader | None:
+    file_size = f.seek(0, 2)
+    # Dumps made with copiers have an extra 512 byte header
+    copier_offset = 0x200 if file_size % 0x400 == 0x200 else 0
+
+    for header_offset in SNES_HEADER_OFFSETS:
+        header = _read_at(f, header_offset + copier_offset, 0x30)
+        if len(header) < 0x30:
+            continue
+
+        checksum_complement, checksum = struct.unpack("<HH", header[0x2C:0x30])
+        if checksum_complement ^ checksum != 0xFFFF:
+            continue
+
+        # Only cartridges with the extended header have a game code
+        code = _decode_text(header[0x02:0x06]) if header[0x2A] == 0x33 else ""
+        return _build_header(
+            _decode_text(header[0x10:0x25]), code if _is_game_code(code) else ""
+        )
+
+    return None
+
+
+def read_genesis_header(f: BinaryIO) -> RomHeader | None:
+    header = _read_at(f, 0x100, 0x90)
+    if len(header) < 0x90 or b"SEGA" not in header[:0x10]:
+        return None
+
+    # The overseas title is the one in english
+    title = _decode_text(header[0x50:0x80]) or _decode_text(header[0x20:0x50])
+    return _build_header(title, _decode_text(header[0x80:0x8E]))
+
+
+def read_playstation_header(f: BinaryIO) -> RomHeader | None:
+    iso_image = ISOImage.open(f)
+    boot_file_path = iso_image.get_boot_file_path() if iso_image else None
+    if not boot_file_path:
+        return None
+
+    match = PLAYSTATION_BOOT_FILE_REGEX.search(boot_file_path)
+    if not match:
+        return None
+
+    prefix, number1, number2 = match.groups()
+    return RomHeader(serial=f"{prefix.upper()}-{number1}{number2}")
+
+
+def _read_partition_file_names(
+    f: BinaryIO, offset: int, magic: bytes, entry_size: int
+) -> tuple[list[tuple[str, int]], int] | None:
+    """Read the file names of a PFS0 or HFS0 partition, with the offset of each file
+
+    Returns
+        names and offsets of the files, and the size of the partition header
+    """
+    header = _read_at(f, offset, 0x10)
+    if len(header) < 0x10 or header[:4] != magic:
+        return None
+
+    files_count, string_table_size = struct.unpack("<II", header[4:12])
+    if (
+        files_count > SWITCH_MAX_FILES
+        or string_table_size > SWITCH_MAX_STRING_TABLE_SIZE
+    ):
+        return None
+
+    entries = f.read(files_count * entry_size)
+    string_table = f.read(string_table_size)
+    if len(entries) < files_count * entry_size:
+        return None
+
+    files = []
+    for idx in range(files_count):
+        entry = entries[idx * entry_size : (idx + 1) * entry_size]
+        file_offset, _, name_offset = struct.unpack("<QQI", entry[:20])
+        name = string_table[name_offset:].split(b"\x00")[0].decode("ascii", "ignore")
+        files.append((name, file_offset))
+
+    return files, 0x10 + files_count * entry_size + string_table_size
+
+
+def _find_switch_title_id(file_names: list[str]) -> RomHeader | None:
+    for file_name in file_names:
+        match = SWITCH_TICKET_REGEX.match(file_name)
+        if match:
+            return RomHeader(serial=match.group(1).upper())
+
+    return None
+
+
+def read_nsp_header(f: BinaryIO) -> RomHeader | None:
+    partition = _read_partition_file_names(f, 0, b"PFS0", 0x18)
+    if not partition:
+        return None
+
+    files, _ = partition
+    return _find_switch_title_id([name for name, _ in files])
+
+
+def read_xci_header(f: BinaryIO) -> RomHeader | None:
+    # Some dumps start with the 0x1000 bytes long key area of the cartridge
+    for start in (0, 0x1000):
+        header = _read_at(f, start + 0x100, 0x40)
+        if header[:4] == b"HEAD":
+            break
+    else:
+        return None
+
+    root_offset = start + struct.unpack("<Q", header[0x30:0x38])[0]
+    root = _read_partition_file_names(f, root_offset, b"HFS0", 0x40)
+    if not root:
+        return None
+
+    # Only tickets in the partitions of the cartridge hold the title ID unencrypted
+    root_files, root_header_size = root
+    file_names: list[str] = []
+    for _, partition_offset in root_files:
+        partition = _read_partition_file_names(
+            f, root_offset + root_header_size + partition_offset, b"HFS0", 0x40
+        )
+        if partition:
+            file_names.extend(name for name, _ in partition[0])
+
+    return _find_switch_title_id(file_names)
+
+
+def read_chd_header(f: BinaryIO) -> RomHeader | None:
+    sha1 = read_chd_sha1(f)
+    return RomHeader(sha1=sha1) if sha1 else None
+
+
+ROM_HEADER_READERS: Final[
+    dict[str, tuple[Callable[[BinaryIO], RomHeader | None], ...]]
+] = {
+    ".agb": (read_gba_header,),
+    ".gba": (read_gba_header,),
+    ".n64": (read_n64_header,),
+    ".v64": (read_n64_header,),
+    ".z64": (read_n64_header,),
+    ".fig": (read_snes_header,),
+    ".sfc": (read_snes_header,),
+    ".smc": (read_snes_header,),
+    ".swc": (read_snes_header,),
+    ".gen": (read_genesis_header,),
+    ".md": (read_genesis_header,),
+    ".bin": (read_genesis_header, read_playstation_header),
+    ".chd": (read_chd_header,),
+    ".img": (read_playstation_header,),
+    ".iso": (read_playstation_header,),
+    ".nsp": (read_nsp_header,),
+    ".nsz": (read_nsp_header,),
+    ".xci": (read_xci_header,),
+    ".xcz": (read_xci_header,),
+}
+
+
+def read_rom_header(f: BinaryIO, extension: str) -> RomHeader | None:
+    """Read the internal title and serial of a rom from its header, or the sha1
+    of the data of a CHD image
+
+    Only a few KB are read from offsets known for each format, whatever the size
+    of the rom.
+
+    Args:
+        f: rom file opened in binary mode
+        extension: extension of the rom file, with its leading dot
+    Returns
+        internal title and serial of the rom, if a header was found
+    """
+    for reader in ROM_HEADER_READERS.get(extension.lower(), ()):
+        rom_header = reader(f)
+        if rom_header:
+            return rom_header
+
+    return None
@@ -0,0 +1,94 @@
+import hashlib
+import struct
+from io import BytesIO
+
+import pytest
+from utils.disc_image import ISOImage, read_chd_sha1
+
+SYSTEM_CNF = b"BOOT2 = cdrom0:\\SLUS_200.62;1\r\nVER = 1.00\r\nVMODE = NTSC\r\n"
+BOOT_FILE = b"\x7fELF" + bytes(range(256)) * 20
+
+
+def _directory_record(name: bytes, lba: int, size: int, is_directory: bool) -> bytes:
+    record = bytearray(33 + len(name) + (len(name) + 1) % 2)
+    record[0] = len(record)
+    record[2:10] = struct.pack("<I", lba) + struct.pack(">I", lba)
+    record[10:18] = struct.pack("<I", size) + struct.pack(">I", size)
+    record[25] = 0x02 if is_directory else 0x00
+    record[32] = len(name)
+    record[33 : 33 + len(name)] = name
+    return bytes(record)
+
+
+def build_iso(files: dict[str, bytes], sector_size: int = 2048, data_offset: int = 0):
+    """Build a disc image with the given files in the root directory"""
+    sectors: dict[int, bytes] = {}
+    records = [
+        _directory_record(b"\x00", 18, 2048, True),
+        _directory_record(b"\x01", 18, 2048, True),
+    ]
+    lba = 20
+    for name, contents in files.items():
+        records.append(
+            _directory_record(f"{name};1".encode(), lba, len(contents), False)
+        )
+        for offset in range(0, len(contents), 2048):
+            sectors[lba] = contents[offset : offset + 2048]
+            lba += 1
+
+    pvd = bytearray(2048)
+    pvd[0:7] = b"\x01CD001\x01"
+    pvd[40:72] = b"TEST_DISC".ljust(32)
+    pvd[156:190] = _directory_record(b"\x00", 18, 2048, True)
+    sectors[16] = bytes(pvd)
+    sectors[18] = b"".join(records)
+
+    image = bytearray()
+    for sector in range(lba + 1):
+        data = sectors.get(sector, b"").ljust(2048, b"\x00")
+        header = bytes([sector % 256]) * data_offset
+        image += (header + data).ljust(sector_size, b"\xff")
+
+    return bytes(image)
+
+
+@pytest.mark.parametrize("sector_size,data_offset", [(2048, 0), (2352, 16), (2352, 24)])
+def test_iso_image_read_file(sector_size, data_offset):
+    image = build_iso(
+        {"SYSTEM.CNF": SYSTEM_CNF, "SLUS_200.62": BOOT_FILE},
+        sector_size=sector_size,
+        data_offset=data_offset,
+    )
+
+    iso_image = ISOImage.open(BytesIO(image))
+
+    assert iso_image is not None
+    assert iso_image.read_pvd()[40:49] == b"TEST_DISC"
+    assert iso_image.read_file("system.cnf") == SYSTEM_CNF
+    assert iso_image.read_file("\\SLUS_200.62;1") == BOOT_FILE
+    assert iso_image.read_file("SLUS_200.62", max_size=100) == BOOT_FILE[:100]
+    assert iso_image.read_file("MISSING.ELF") is None
+    assert iso_image.get_boot_file_path() == "SLUS_200.62"
+
+
+def test_iso_image_without_filesystem():
+    assert ISOImage.open(BytesIO(bytes(2048 * 20))) is None
+    assert ISOImage.open(BytesIO(b"")) is None
+
+
+@pytest.mark.parametrize("version,sha1_offset", [(3, 80), (4, 48), (5, 84)])
+def test_read_chd_sha1(version, sha1_offset):
+    sha1 = hashlib.sha1(b"romm").digest()
+    header = bytearray(124)
+    header[0:16] = b"MComprHD" + struct.pack(">II", 124, version)
+    header[sha1_offset : sha1_offset + 20] = sha1
+
+    assert read_chd_sha1(BytesIO(bytes(header))) == sha1.hex()
+
+
+def test_read_chd_sha1_invalid():
+    assert read_chd_sha1(BytesIO(b"not a chd file")) is None
+    assert read_chd_sha1(BytesIO(b"MComprHD" + struct.pack(">II", 124, 2))) is None
+    # A zeroed digest was never calculated
+    header = b"MComprHD" + struct.pack(">II", 124, 5)
+    assert read_chd_sha1(BytesIO(header.ljust(124, b"\x00"))) is None
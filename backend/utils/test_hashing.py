@@ -0,0 +1,21 @@
+import binascii
+import os
+
+import pytest
+from utils.hashing import crc32_combine, crc32_to_hex
+
+
+def test_crc32_to_hex():
+    assert crc32_to_hex(binascii.crc32(b"romm")) == f"{binascii.crc32(b'romm'):08x}"
+
+
+@pytest.mark.parametrize(
+    "length1,length2", [(0, 0), (0, 10), (10, 0), (1, 1), (100, 4096), (5000, 1)]
+)
+def test_crc32_combine(length1, length2):
+    block1 = os.urandom(length1)
+    block2 = os.urandom(length2)
+
+    assert crc32_combine(
+        binascii.crc32(block1), binascii.crc32(block2), length2
+    ) == binascii.crc32(block1 + block2)
@@ -0,0 +1,182 @@
+import struct
+from io import BytesIO
+
+import pytest
+from utils.rom_headers import (
+    read_chd_header,
+    read_gba_header,
+    read_genesis_header,
+    read_n64_header,
+    read_nsp_header,
+    read_playstation_header,
+    read_rom_header,
+    read_snes_header,
+    read_xci_header,
+)
+from utils.test_disc_image import BOOT_FILE, SYSTEM_CNF, build_iso
+
+TICKET_NAME = "0100152000022000000000000000000b.tik"
+
+
+def _build_gba_rom() -> bytes:
+    rom = bytearray(0x200)
+    rom[0xA0:0xAC] = b"POKEMON EMER"
+    rom[0xAC:0xB0] = b"BPEE"
+    rom[0xB0:0xB2] = b"01"
+    rom[0xB2] = 0x96
+    rom[0xBD] = (-sum(rom[0xA0:0xBD]) - 0x19) & 0xFF
+    return bytes(rom)
+
+
+def _build_n64_rom() -> bytes:
+    rom = bytearray(0x1000)
+    rom[0:4] = b"\x80\x37\x12\x40"
+    rom[0x20:0x34] = b"SUPER MARIO 64".ljust(20)
+    rom[0x3B:0x3F] = b"NSME"
+    return bytes(rom)
+
+
+def _build_snes_rom(header_offset: int, size: int, game_code: bytes = b"") -> bytes:
+    rom = bytearray(size)
+    header = bytearray(0x30)
+    header[0x02:0x06] = game_code.ljust(4)
+    header[0x10:0x25] = b"SUPER MARIOWORLD".ljust(21)
+    header[0x2A] = 0x33 if game_code else 0x01
+    header[0x2C:0x30] = struct.pack("<HH", 0x5F25, 0xA0DA)
+    rom[header_offset : header_offset + 0x30] = header
+    return bytes(rom)
+
+
+def _build_partition(magic: bytes, entry_size: int, files: dict[str, bytes]) -> bytes:
+    string_table = b"".join(name.encode() + b"\x00" for name in files)
+    entries = bytearray()
+    data = bytearray()
+    name_offset = 0
+    for name, contents in files.items():
+        entry = struct.pack("<QQI", len(data), len(contents), name_offset)
+        entries += entry.ljust(entry_size, b"\x00")
+        name_offset += len(name) + 1
+        data += contents
+
+    header = magic + struct.pack("<III", len(files), len(string_table), 0)
+    return header + bytes(entries) + string_table + bytes(data)
+
+
+def test_read_gba_header():
+    assert read_gba_header(BytesIO(_build_gba_rom())) == {
+        "title": "POKEMON EMER",
+        "serial": "BPEE",
+    }
+
+    # A header with a wrong complement check is not a GBA header
+    rom = bytearray(_build_gba_rom())
+    rom[0xBD] ^= 0xFF
+    assert read_gba_header(BytesIO(bytes(rom))) is None
+    assert read_gba_header(BytesIO(b"")) is None
+
+
+@pytest.mark.parametrize("word_size", [0, 2, 4])
+def test_read_n64_header(word_size):
+    rom = _build_n64_rom()
+    if word_size:
+        rom = b"".join(
+            rom[idx : idx + word_size][::-1] for idx in range(0, len(rom), word_size)
+        )
+
+    assert read_n64_header(BytesIO(rom)) == {
+        "title": "SUPER MARIO 64",
+        "serial": "NSME",
+    }
+
+
+@pytest.mark.parametrize(
+    "header_offset,size",
+    [(0x7FB0, 0x80000), (0xFFB0, 0x80000), (0x7FB0 + 0x200, 0x80200)],
+)
+def test_read_snes_header(header_offset, size):
+    rom = _build_snes_rom(header_offset, size)
+
+    assert read_snes_header(BytesIO(rom)) == {"title": "SUPER MARIOWORLD"}
+
+
+def test_read_snes_header_game_code():
+    rom = _build_snes_rom(0xFFB0, 0x100000, game_code=b"ARWE")
+
+    assert read_snes_header(BytesIO(rom)) == {
+        "title": "SUPER MARIOWORLD",
+        "serial": "ARWE",
+    }
+    assert read_snes_header(BytesIO(bytes(0x80000))) is None
+
+
+def test_read_genesis_header():
+    rom = bytearray(0x200)
+    rom[0x100:0x110] = b"SEGA MEGA DRIVE "
+    rom[0x120:0x150] = b"SONIC THE               HEDGEHOG".ljust(48)
+    rom[0x150:0x180] = b"SONIC THE HEDGEHOG".ljust(48)
+    rom[0x180:0x18E] = b"GM 00001009-00"
+
+    assert read_genesis_header(BytesIO(bytes(rom))) == {
+        "title": "SONIC THE HEDGEHOG",
+        "serial": "GM 00001009-00",
+    }
+    assert read_genesis_header(BytesIO(bytes(0x200))) is None
+
+
+def test_read_playstation_header():
+    image = build_iso(
+        {"SYSTEM.CNF": SYSTEM_CNF, "SLUS_200.62": BOOT_FILE},
+        sector_size=2352,
+        data_offset=24,
+    )
+
+    assert read_playstation_header(BytesIO(image)) == {"serial": "SLUS-20062"}
+    assert read_playstation_header(BytesIO(build_iso({"README.TXT": b"?"}))) is None
+
+
+def test_read_nsp_header():
+    nsp = _build_partition(
+        b"PFS0",
+        0x18,
+        {"1f8a3e2c.nca": b"\x00" * 64, TICKET_NAME: b"\x00" * 64},
+    )
+
+    assert read_nsp_header(BytesIO(nsp)) == {"serial": "0100152000022000"}
+    assert read_nsp_header(BytesIO(_build_partition(b"PFS0", 0x18, {}))) is None
+    assert read_nsp_header(BytesIO(b"PFS0" + struct.pack("<II", 1 << 20, 0))) is None
+
+
+@pytest.mark.parametrize("key_area_size", [0, 0x1000])
+def test_read_xci_header(key_area_size):
+    secure = _build_partition(b"HFS0", 0x40, {TICKET_NAME: b"\x00" * 64})
+    update = _build_partition(b"HFS0", 0x40, {"update.nca": b"\x00" * 64})
+    root = _build_partition(b"HFS0", 0x40, {"update": update, "secure": secure})
+
+    header = bytearray(0x200)
+    header[0x100:0x104] = b"HEAD"
+    header[0x130:0x138] = struct.pack("<Q", len(header))
+    xci = bytes(key_area_size) + bytes(header) + root
+
+    assert read_xci_header(BytesIO(xci)) == {"serial": "0100152000022000"}
+    assert read_xci_header(BytesIO(bytes(0x2000))) is None
+
+
+def test_read_chd_header():
+    header = bytearray(124)
+    header[0:16] = b"MComprHD" + (124).to_bytes(4, "big") + (5).to_bytes(4, "big")
+    header[84:104] = bytes(range(20))
+
+    assert read_chd_header(BytesIO(bytes(header))) == {"sha1": bytes(range(20)).hex()}
+    assert read_chd_header(BytesIO(bytes(124))) is None
+
+
+def test_read_rom_header():
+    assert read_rom_header(BytesIO(_build_gba_rom()), ".GBA") == {
+        "title": "POKEMON EMER",
+        "serial": "BPEE",
+    }
+    # Files with unknown extensions are not read
+    assert read_rom_header(BytesIO(_build_gba_rom()), ".zip") is None
+    # Both Genesis and PlayStation dumps use the .bin extension
+    image = build_iso({"SYSTEM.CNF": SYSTEM_CNF, "SLUS_200.62": BOOT_FILE})
+    assert read_rom_header(BytesIO(image), ".bin") == {"serial": "SLUS-20062"}
@@ -17,6 +17,10 @@ export default defineStore("scanning", {
       scanned_roms: 0,
       added_roms: 0,
       metadata_roms: 0,
+      delta_new_roms: 0,
+      delta_changed_roms: 0,
+      delta_unchanged_roms: 0,
+      delta_removed_roms: 0,
     },
   }),
 